@@ -1,4 +1,9 @@
+import lib.cachePrewarmer
+import lib.configWatcher
 import lib.mainWindow
+import lib.metrics
+import lib.phrasePrefetcher
+import lib.speculativeSynthesizer
 import lib.ttsEngine
 import lib.globalHotkeyManager
 
@@ -6,10 +11,50 @@ if __name__ == '__main__':
     config = lib.ttsEngine.Config("./config/sound_model.json",
                                   "./config/fixed_collocation.json",
                                   "./config/word_replacement.json")
+    # 按配置导出每条语音的分阶段耗时
+    lib.metrics.registry.configure(config)
     hotkey_manager = lib.globalHotkeyManager.GlobalHotkeyManager(config, './config/shortcut_key.json')
     hotkey_manager.start()
+    # 后台预先合成所有快捷键和缩写词的语音，配置重新加载后自动重新预热
+    prewarmer = lib.cachePrewarmer.CachePrewarmer(
+        config, lambda: lib.cachePrewarmer.collect_prewarm_texts(config, hotkey_manager))
+    prewarmer.attach(config, hotkey_manager)
+    # 按使用频率在后台保持常用短语的缓存，更换音色后立即重新合成
+    prefetcher = None
+    if config.PREFETCH_TOP_PHRASES:
+        prefetcher = lib.phrasePrefetcher.PhrasePrefetcher.from_config(config)
+        prefetcher.attach(config)
+        lib.metrics.registry.add_provider('phrase_prefetch', prefetcher.stats)
+    # 修改配置文件后自动重新加载，并处理因此过期的缓存
+    watcher = None
+    if config.CONFIG_WATCH:
+        watcher = lib.configWatcher.ConfigWatcher.from_config(
+            config, hotkey_manager, lambda: lib.cachePrewarmer.collect_prewarm_texts(config, hotkey_manager))
+    # 可选：输入停顿后在后台推测合成，按回车时直接播放
+    speculator = None
+    if config.SPECULATIVE_SYNTHESIS:
+        speculator = lib.speculativeSynthesizer.SpeculativeSynthesizer.from_config(config)
+        lib.metrics.registry.add_provider('speculation', speculator.stats)
     root = lib.mainWindow.DraggableWindow()  # 使用可拖拽的窗口类
-    app = lib.mainWindow.TTSApp(root, hotkey_manager, lib.ttsEngine.text_to_speech, config)  # 创建应用
+    app = lib.mainWindow.TTSApp(root, hotkey_manager, lib.ttsEngine.text_to_speech, config,
+                                speculator=speculator, debounce_ms=config.SPECULATIVE_DEBOUNCE_MS)  # 创建应用
+
+    def start_background():
+        # 窗口显示之后再在后台加载播放和网络模块、初始化音频设备、建立连接，并开始预热
+        lib.ttsEngine.warm_up(config)
+        prewarmer.start()
+        if prefetcher is not None:
+            prefetcher.start()
+        if watcher is not None:
+            watcher.start()
+
+    root.after_idle(start_background)
     root.mainloop()
+    if watcher is not None:
+        watcher.stop()
     hotkey_manager.stop()
-    lib.ttsEngine.cleanup_pygame()
+    prewarmer.shutdown()
+    if prefetcher is not None:
+        prefetcher.shutdown()
+    lib.metrics.registry.close()
+    lib.ttsEngine.cleanup_tts_engine()
@@ -0,0 +1,31 @@
+"""
+验证 TTSClient 在多次合成之间复用连接。
+
+用法: python -m benchmark.connectionReuse
+"""
+import time
+
+from benchmark.stubTtsServer import StubTTSServer
+from lib.ttsClient import TTSClient
+
+CALLS = 50
+
+
+def main():
+    server = StubTTSServer().start()
+    client = TTSClient(server.base_url + '/tts/v1')
+    try:
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            client.synthesize('<speak>test</speak>', {'Content-Type': 'application/ssml+xml'})
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+        server.stop()
+
+    print(f'requests: {server.requests}, connections: {server.connections}, '
+          f'avg latency: {elapsed / CALLS * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+对冲请求与故障切换的基准：启动两个本地桩服务器模拟主服务和（延迟是主服务 --mirror-factor 倍的）镜像，
+二者都有按比例出现的长尾延迟。通过 BackendRouter 先发出 --warmup 个请求积累延迟统计（不计入结果），
+再以 --concurrency 个线程连续发出 --requests 个合成请求，比较：
+    - single: 只使用主服务；
+    - hedged: 主服务加镜像，超过主服务最近延迟的 p95 时向镜像对冲；
+    - outage: 同上，但主服务在测量进行到一半时开始全部返回 503。
+输出每种情况的 p50/p95/p99 延迟、错误数，以及两个服务实际收到的请求数（对冲带来的额外负载）。
+
+用法: python -m benchmark.hedging [--requests 400] [--warmup 50] [--concurrency 4] [--latency 0.05]
+                                  [--mirror-factor 2] [--tail-rate 0.02] [--tail-latency 1.0]
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmark.stubTtsServer import StubTTSServer
+from lib.metrics import RollingHistogram
+from lib.synthesisBackends import BackendRouter
+from lib.ttsClient import TTSClient, TTSClientError
+
+SSML = '<speak>hedging benchmark</speak>'
+HEADERS = {'Content-Type': 'application/ssml+xml'}
+
+
+def measure(router, requests, concurrency, on_half=None):
+    histogram = RollingHistogram(window=requests)
+    errors = 0
+    issued = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal errors, issued
+        while True:
+            with lock:
+                if issued >= requests:
+                    return
+                issued += 1
+                if issued == requests // 2 and on_half is not None:
+                    on_half()
+            start = time.perf_counter()
+            try:
+                router.synthesize(SSML, HEADERS)
+            except TTSClientError:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                histogram.observe((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(histogram.summary(), errors=errors)
+
+
+def run_case(name, args, mirror, outage=False):
+    primary_server = StubTTSServer(latency=args.latency, tail_rate=args.tail_rate, tail_latency=args.tail_latency,
+                                   seed=1).start()
+    mirror_server = StubTTSServer(latency=args.latency * args.mirror_factor, tail_rate=args.tail_rate,
+                                  tail_latency=args.tail_latency, seed=2).start()
+    backends = [('primary', TTSClient(primary_server.base_url + '/tts/v1', max_retries=0))]
+    if mirror:
+        backends.append(('mirror', TTSClient(mirror_server.base_url + '/tts/v1', max_retries=0)))
+    router = BackendRouter(backends)
+
+    def fail_primary():
+        primary_server.error_rate = 1.0
+
+    try:
+        measure(router, args.warmup, args.concurrency)
+        result = measure(router, args.requests, args.concurrency, fail_primary if outage else None)
+        result['router'] = router.stats()
+        result['server_requests'] = {'primary': primary_server.stats()['requests'],
+                                     'mirror': mirror_server.stats()['requests']}
+    finally:
+        router.close()
+        primary_server.stop()
+        mirror_server.stop()
+    return name, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hedged request benchmark')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--warmup', type=int, default=50, help='requests sent before measuring')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub server synthesis latency (s)')
+    parser.add_argument('--mirror-factor', type=float, default=2.0, help='mirror latency relative to primary')
+    parser.add_argument('--tail-rate', type=float, default=0.02, help='fraction of slow responses')
+    parser.add_argument('--tail-latency', type=float, default=1.0, help='extra latency of slow responses (s)')
+    args = parser.parse_args()
+
+    results = dict([
+        run_case('single', args, mirror=False),
+        run_case('hedged', args, mirror=True),
+        run_case('outage', args, mirror=True, outage=True),
+    ])
+    results['parameters'] = vars(args)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+模拟比赛中连续狂按快捷键：在 --duration 秒内随机按下 --presses 次 --hotkeys 个不同的快捷键
+（每条语音约 --clip-seconds 秒），比较不加限制的播放队列与启用排队策略后的结果：
+    - played / dropped: 实际播放和按原因丢弃的语音数；
+    - max_staleness_ms: 语音开始播放时距离按下快捷键最久的时间；
+    - tail_s: 最后一次按键之后还要播放多久才安静下来。
+
+启用策略时使用与 GlobalHotkeyManager 相同的令牌桶限速、HOTKEY_TTL，并把第一个快捷键设为 latest-wins。
+使用 SDL 的 dummy 音频驱动，不需要真实的声卡。
+用法: python -m benchmark.hotkeyBurst [--presses 30] [--duration 3] [--ttl 2] [--max-depth 4]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from lib.metrics import RollingHistogram
+from lib.playbackEngine import PlaybackEngine
+from lib.soundCache import SoundCache
+from lib.synthesisBackends import SILENT_MP3_FRAME
+from lib.tokenBucket import TokenBucket
+
+# 每个 MP3 帧约 26 ms
+FRAME_SECONDS = 0.026
+
+
+def run(paths, presses, policies, args):
+    engine = PlaybackEngine(SoundCache(), max_depth=args.max_depth if policies else 0,
+                            coalesce=policies)
+    engine.start()
+    engine.wait_ready(5.0)
+    for path in paths:
+        engine.preload(path)
+    bucket = TokenBucket(args.rate, args.burst) if policies else None
+
+    items = []
+    rate_limited = 0
+    start = time.monotonic()
+    for offset, index in presses:
+        delay = start + offset - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if bucket is not None and not bucket.try_take():
+            rate_limited += 1
+            continue
+        pressed = time.monotonic()
+        ticket = None
+        if policies:
+            ticket = engine.ticket('hotkey:0' if index == 0 else None, args.ttl)
+        items.append((pressed, engine.enqueue(paths[index], ticket=ticket)))
+    last_press = time.monotonic()
+    for _, item in items:
+        item.wait(120)
+    while not engine.is_idle():
+        time.sleep(0.01)
+    tail = time.monotonic() - last_press
+
+    # 被合并的按键返回之前的请求，从它第一次被按下算起
+    first_press = {}
+    for pressed, item in items:
+        first_press.setdefault(id(item), (pressed, item))
+    staleness = RollingHistogram(window=len(first_press) or 1)
+    for pressed, item in first_press.values():
+        if item.started_at is not None and item.dropped is None:
+            staleness.observe((item.started_at - pressed) * 1000)
+    stats = engine.stats()
+    engine.stop()
+    dropped = dict(stats['dropped'])
+    if rate_limited:
+        dropped['rate_limited'] = rate_limited
+    summary = staleness.summary()
+    return {
+        'presses': len(presses),
+        'played': stats['started'],
+        'dropped': dropped,
+        'staleness_ms': summary,
+        'max_staleness_ms': summary.get('max'),
+        'tail_s': round(tail, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hotkey burst playback queue benchmark')
+    parser.add_argument('--presses', type=int, default=30)
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds over which the presses happen')
+    parser.add_argument('--hotkeys', type=int, default=4)
+    parser.add_argument('--clip-seconds', type=float, default=1.0)
+    parser.add_argument('--ttl', type=float, default=2.0)
+    parser.add_argument('--max-depth', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=5.0)
+    parser.add_argument('--burst', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    presses = sorted((rng.uniform(0, args.duration), rng.randrange(args.hotkeys)) for _ in range(args.presses))
+    frames = max(1, round(args.clip_seconds / FRAME_SECONDS))
+    with tempfile.TemporaryDirectory(prefix='tts-hotkey-burst-') as directory:
+        paths = []
+        for index in range(args.hotkeys):
+            path = Path(directory) / f'hotkey{index}.mp3'
+            path.write_bytes(SILENT_MP3_FRAME * frames)
+            paths.append(path)
+        result = {
+            'unbounded': run(paths, presses, False, args),
+            'policies': run(paths, presses, True, args),
+            'parameters': vars(args),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
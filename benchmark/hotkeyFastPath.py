@@ -0,0 +1,108 @@
+"""
+测量从按下快捷键到语音加入播放队列（PlaybackEngine.enqueue 被调用）的时间，对比：
+    - full_path: 改动之前的流程，text_to_speech 提交到合成线程池，再规范化、计算缓存键、查缓存后加入播放队列；
+    - fast_path: GlobalHotkeyManager 加载快捷键时预先准备好的 PreparedSpeech，按下时直接加入播放队列。
+callback_ms 是快捷键回调本身占用的时间（pynput 的回调线程被阻塞的时间）。
+
+快捷键文本取自 config/shortcut_key.json，规则文件沿用 config/ 中的；快捷键语音事先合成进缓存，
+使用本地桩服务器和 SDL 的 dummy 音频驱动，不需要网络和声卡。
+用法: python -m benchmark.hotkeyFastPath [--samples 200]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from benchmark.stubTtsServer import StubTTSServer
+from benchmark.suite import hotkey_texts, make_config, wait_prepared
+from lib import ttsEngine
+from lib.metrics import RollingHistogram, Trace
+from lib.synthesisBackends import SILENT_MP3_FRAME
+from lib.synthesisExecutor import SynthesisExecutor
+
+
+def measure(engine, hotkeys, samples, press):
+    """press(key_str, text, trace) 模拟一次按键；返回按键到 enqueue 和回调耗时的分布。"""
+    enqueued = threading.Event()
+    enqueued_at = [0.0]
+    original = engine.enqueue
+
+    def enqueue(*args, **kwargs):
+        if not enqueued.is_set():
+            enqueued_at[0] = time.perf_counter()
+            enqueued.set()
+        return original(*args, **kwargs)
+
+    engine.enqueue = enqueue
+    to_enqueue = RollingHistogram(window=samples)
+    callback = RollingHistogram(window=samples)
+    try:
+        for i in range(samples):
+            key_str, text = hotkeys[i % len(hotkeys)]
+            while not engine.is_idle():
+                time.sleep(0.002)
+            enqueued.clear()
+            start = time.perf_counter()
+            press(key_str, text, Trace('hotkey', key_str))
+            callback.observe((time.perf_counter() - start) * 1000)
+            if not enqueued.wait(10.0):
+                raise RuntimeError(f'{key_str} was never enqueued')
+            to_enqueue.observe((enqueued_at[0] - start) * 1000)
+    finally:
+        del engine.enqueue
+    return {'press_to_enqueue_ms': to_enqueue.summary(), 'callback_ms': callback.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hotkey press-to-enqueue latency benchmark')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--hotkeys', type=int, default=8)
+    parser.add_argument('--frames', type=int, default=2, help='MP3 frames per clip (~26 ms each)')
+    args = parser.parse_args()
+    args.streaming = args.chunking = False
+
+    server = StubTTSServer(audio=SILENT_MP3_FRAME * args.frames, latency=0.0).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='tts-hotkey-fast-path-') as directory:
+            config = make_config(directory, server.base_url, args)
+            config.HOTKEY_TTL = 0
+            config.PLAYBACK_COALESCE = False
+            hotkeys = hotkey_texts(args.hotkeys)
+            for _, text in hotkeys:
+                for part in ttsEngine.utterance_parts(ttsEngine.normalize_text(text, config), config):
+                    ttsEngine.synthesize_to_cache(part, config)
+            engine = ttsEngine.get_playback_engine(config)
+            engine.wait_ready(5.0)
+            prepared = {key_str: ttsEngine.PreparedSpeech(text, config) for key_str, text in hotkeys}
+            ttsEngine.preload_prepared(list(prepared.values()))
+            wait_prepared(prepared.values())
+
+            def full_path(key_str, text, trace):
+                ttsEngine.text_to_speech(text, config, SynthesisExecutor.HOTKEY, trace, config.HOTKEY_TTL)
+
+            def fast_path(key_str, text, trace):
+                if not ttsEngine.speak_prepared(prepared[key_str], SynthesisExecutor.HOTKEY, trace,
+                                                config.HOTKEY_TTL):
+                    raise RuntimeError(f'{key_str} is not ready')
+
+            # 先各跑一轮，排除第一次解码和线程启动的影响
+            measure(engine, hotkeys, len(hotkeys), full_path)
+            measure(engine, hotkeys, len(hotkeys), fast_path)
+            result = {
+                'full_path': measure(engine, hotkeys, args.samples, full_path),
+                'fast_path': measure(engine, hotkeys, args.samples, fast_path),
+                'parameters': vars(args),
+            }
+            ttsEngine.cleanup_tts_engine()
+    finally:
+        server.stop()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
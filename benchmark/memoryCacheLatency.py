@@ -0,0 +1,59 @@
+"""
+比较从磁盘加载 MP3 播放与从内存缓存播放的延迟（按下快捷键到开始出声）。
+
+使用 SDL 的 dummy 音频驱动，不需要真实的声卡。
+用法: python -m benchmark.memoryCacheLatency
+"""
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from benchmark.stubTtsServer import SILENT_MP3_FRAME
+from lib.soundCache import SoundCache
+
+ROUNDS = 200
+# 约 2 秒的音频，接近一条快捷键语音的长度
+CLIP = SILENT_MP3_FRAME * 77
+
+
+def measure(play):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        play()
+        samples.append((time.perf_counter() - start) * 1000)
+        pygame.mixer.stop()
+        pygame.mixer.music.stop()
+    return statistics.median(samples), sorted(samples)[int(ROUNDS * 0.95)]
+
+
+def main():
+    pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'clip.mp3')
+        with open(path, 'wb') as f:
+            f.write(CLIP)
+
+        def play_from_disk():
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.play()
+
+        cache = SoundCache()
+        cache.load(path)
+
+        def play_from_memory():
+            cache.load(path).play()
+
+        for name, play in (('disk (music.load)', play_from_disk), ('memory (SoundCache)', play_from_memory)):
+            p50, p95 = measure(play)
+            print(f'{name:20s} p50 {p50:.3f} ms  p95 {p95:.3f} ms')
+    pygame.mixer.quit()
+
+
+if __name__ == '__main__':
+    main()
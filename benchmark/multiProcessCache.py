@@ -0,0 +1,159 @@
+"""
+多进程共用缓存目录的压力测试：启动一个本地桩服务器，再启动 --processes 个子进程打开同一个缓存目录，
+每个进程用 --threads 个线程以不同的顺序对同一组 --texts 条文本调用 synthesize_to_cache，
+同时用一个读取线程不断读取已经存在的缓存文件（与播放时把“文件存在”当作“可以播放”相同），
+检查读到的 MP3 是否完整。
+
+开始之前先运行一个进程取得第一条文本的锁后直接退出（模拟合成途中崩溃），其余进程必须回收这把过期的锁。
+
+结果：
+    - upstream_requests: 桩服务器实际收到的合成请求数，duplicates 为超出文本数的部分（应为 0）；
+    - corrupt_reads: 读到不完整 MP3 的次数（应为 0）；
+    - recovered_locks: 回收的过期锁数。
+
+用法: python -m benchmark.multiProcessCache [--processes 4] [--threads 4] [--texts 50] [--latency 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFIG_DIR = ROOT / 'config'
+
+
+def texts(count):
+    return [f'多进程测试第{i}条' for i in range(count)]
+
+
+def load_config(directory):
+    from lib import ttsEngine
+    return ttsEngine.Config(str(Path(directory) / 'sound_model.json'), str(CONFIG_DIR / 'fixed_collocation.json'),
+                            str(CONFIG_DIR / 'word_replacement.json'))
+
+
+def crash_child(directory, count):
+    """取得第一条文本的锁后不释放就退出。"""
+    from lib import ttsEngine
+    config = load_config(directory)
+    key = ttsEngine.get_cache_key(ttsEngine.normalize_text(texts(count)[0], config), config)
+    ttsEngine.get_key_locks(config).acquire(key)
+    print(json.dumps({'crashed_holding': key}), flush=True)
+    os._exit(1)
+
+
+def worker_child(directory, count, threads, seed):
+    from lib import ttsEngine
+    from lib.audioCache import is_complete_mp3
+    config = load_config(directory)
+    cache = ttsEngine.get_audio_cache(config)
+    keys = [ttsEngine.get_cache_key(ttsEngine.normalize_text(text, config), config) for text in texts(count)]
+    reads = corrupt = 0
+    done = threading.Event()
+
+    def reader():
+        nonlocal reads, corrupt
+        while not done.is_set():
+            for key in keys:
+                try:
+                    audio_bytes = cache.path_for(key).read_bytes()
+                except OSError:
+                    continue
+                reads += 1
+                if not is_complete_mp3(audio_bytes):
+                    corrupt += 1
+
+    def synthesizer(i):
+        order = list(zip(texts(count), keys))
+        random.Random(seed * 100 + i).shuffle(order)
+        for text, key in order:
+            ttsEngine.synthesize_to_cache(ttsEngine.normalize_text(text, config), config, key)
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    workers = [threading.Thread(target=synthesizer, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    done.set()
+    reader_thread.join()
+    missing = sum(1 for key in keys if key not in cache)
+    print(json.dumps({'reads': reads, 'corrupt': corrupt, 'missing': missing,
+                      'locks': ttsEngine.get_key_locks(config).stats()}), flush=True)
+    ttsEngine.cleanup_tts_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process shared cache stress test')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--texts', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub server synthesis latency (s)')
+    parser.add_argument('--frames', type=int, default=2000, help='silent MP3 frames per response')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--crash', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        if args.crash:
+            crash_child(args.child, args.texts)
+        else:
+            worker_child(args.child, args.texts, args.threads, args.seed)
+        return
+
+    from benchmark.stubTtsServer import StubTTSServer
+    from lib.synthesisBackends import SILENT_MP3_FRAME
+
+    server = StubTTSServer(audio=SILENT_MP3_FRAME * args.frames, latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='tts-multiprocess-') as directory:
+            with open(CONFIG_DIR / 'sound_model.json', encoding='utf-8') as f:
+                data = json.load(f)
+            data.update({'BASE_URL': server.base_url, 'STORED_FILEPATH': str(Path(directory) / 'cache'),
+                         'MAX_RETRIES': 0})
+            with open(Path(directory) / 'sound_model.json', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+
+            base = [sys.executable, '-m', 'benchmark.multiProcessCache', '--child', directory,
+                    '--texts', str(args.texts), '--threads', str(args.threads)]
+            subprocess.run(base + ['--crash'], cwd=ROOT, capture_output=True, timeout=60)
+
+            start = time.monotonic()
+            children = [subprocess.Popen(base + ['--seed', str(i)], cwd=ROOT, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, text=True)
+                        for i in range(args.processes)]
+            reports = []
+            for child in children:
+                stdout, _ = child.communicate(timeout=600)
+                lines = [line for line in stdout.splitlines() if line.startswith('{')]
+                reports.append(json.loads(lines[-1]) if lines else {'error': f'exit code {child.returncode}'})
+            elapsed = time.monotonic() - start
+    finally:
+        server.stop()
+
+    upstream = server.stats()['requests']
+    result = {
+        'upstream_requests': upstream,
+        'unique_texts': args.texts,
+        'duplicates': upstream - args.texts,
+        'reads': sum(report.get('reads', 0) for report in reports),
+        'corrupt_reads': sum(report.get('corrupt', 0) for report in reports),
+        'missing': sum(report.get('missing', 0) for report in reports),
+        'lock_waits': sum(report.get('locks', {}).get('waited', 0) for report in reports),
+        'recovered_locks': sum(report.get('locks', {}).get('recovered', 0) for report in reports),
+        'elapsed_s': round(elapsed, 3),
+        'processes': reports,
+        'parameters': vars(args),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
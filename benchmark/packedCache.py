@@ -0,0 +1,104 @@
+"""
+比较每条语音一个文件的 AudioCache 与单文件打包的 PackedAudioCache：
+    - 写入 N 条缓存后的磁盘占用（按实际分配的块统计）和文件数；
+    - 随机查找并读出一条音频（lookup + load）的延迟，分别统计冷启动后第一次打开缓存和稳定状态。
+
+用法: python -m benchmark.packedCache [--entries 100000] [--directory /path/on/target/disk]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmark.stubTtsServer import SILENT_MP3_FRAME
+from lib.audioCache import AudioCache
+from lib.metrics import RollingHistogram
+from lib.packedAudioCache import PackedAudioCache
+
+LOOKUPS = 20000
+
+
+def footprint(directory):
+    """返回 (文件数, 逻辑字节数, 实际占用字节数)。"""
+    files = logical = allocated = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files += 1
+            logical += stat.st_size
+            allocated += getattr(stat, 'st_blocks', 0) * 512 or stat.st_size
+    return files, logical, allocated
+
+
+def clip(i):
+    # 与实际的短语音相近：3～12 KB
+    return SILENT_MP3_FRAME * (30 + i % 90)
+
+
+def fill(cache, entries):
+    start = time.perf_counter()
+    for i in range(entries):
+        cache.put(f'{i:032x}', clip(i))
+    return time.perf_counter() - start
+
+
+def load_files(cache, key):
+    path = cache.get(key)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_pack(cache, key):
+    # 播放时交给 pygame 的是 clip.open()，这里同样通过文件对象读出全部数据
+    return cache.get(key).open().read()
+
+
+def measure(cache, load, keys):
+    histogram = RollingHistogram(window=len(keys))
+    for key in keys:
+        start = time.perf_counter()
+        load(cache, key)
+        histogram.observe((time.perf_counter() - start) * 1e6)
+    return histogram.summary()
+
+
+def run(name, factory, load, directory, entries, rng):
+    cache = factory(directory)
+    fill_seconds = fill(cache, entries)
+    cache.close()
+    files, logical, allocated = footprint(directory)
+
+    # 重新打开，模拟程序重启后的第一次查找
+    start = time.perf_counter()
+    cache = factory(directory)
+    open_ms = (time.perf_counter() - start) * 1000
+    keys = [f'{rng.randrange(entries):032x}' for _ in range(LOOKUPS)]
+    first = measure(cache, load, keys[:1000])
+    steady = measure(cache, load, keys)
+    cache.close()
+
+    print(f'{name}: fill {fill_seconds:.1f} s, open {open_ms:.0f} ms, {files} files, '
+          f'{logical / 2 ** 20:.1f} MiB data, {allocated / 2 ** 20:.1f} MiB on disk')
+    print(f'    lookup+load first 1000: p50 {first["p50"]:.1f} us, p99 {first["p99"]:.1f} us')
+    print(f'    lookup+load steady:     p50 {steady["p50"]:.1f} us, p99 {steady["p99"]:.1f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Files vs packed audio cache')
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--directory', help='parent directory for the test caches (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='tts-pack-bench-', dir=args.directory)
+    try:
+        run('files', AudioCache, load_files, os.path.join(root, 'files'), args.entries, random.Random(1))
+        run('pack', lambda d: PackedAudioCache(d, import_existing=False), load_pack, os.path.join(root, 'pack'),
+            args.entries, random.Random(1))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
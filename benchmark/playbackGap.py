@@ -0,0 +1,122 @@
+"""
+比较旧的轮询式播放线程与事件驱动的 PlaybackEngine：
+    - 连续播放多段音频时片段之间的空白时间；
+    - 空闲时（以及旧版 play_mp3_file 等待文件时）的 CPU 占用。
+
+使用 SDL 的 dummy 音频驱动，不需要真实的声卡。
+用法: python -m benchmark.playbackGap
+"""
+import io
+import os
+import queue
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from benchmark.stubTtsServer import SILENT_MP3_FRAME
+from lib.playbackEngine import PlaybackEngine
+from lib.soundCache import SoundCache
+
+CLIPS = 5
+# 约 0.5 秒的音频
+CLIP = SILENT_MP3_FRAME * 19
+IDLE_SECONDS = 2.0
+
+
+def legacy_worker(playback_queue, stop):
+    """改动之前的播放线程：music.load 后每 100 ms 轮询一次 get_busy()。"""
+    while not stop.is_set():
+        try:
+            path = playback_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        pygame.mixer.music.load(path)
+        pygame.mixer.music.play()
+        while pygame.mixer.music.get_busy() and not stop.is_set():
+            time.sleep(0.1)
+        playback_queue.task_done()
+
+
+def dead_air(is_busy, total_clips_seconds):
+    """以 1 ms 的间隔采样，统计从开始出声到全部播放完之间没有声音的总时长（毫秒）。"""
+    started = False
+    silent = 0.0
+    deadline = time.monotonic() + total_clips_seconds + 2.0
+    last = time.monotonic()
+    played = 0.0
+    while time.monotonic() < deadline:
+        time.sleep(0.001)
+        now = time.monotonic()
+        busy = is_busy()
+        if busy:
+            started = True
+            played += now - last
+        elif started:
+            if played >= total_clips_seconds - 0.05:
+                break
+            silent += now - last
+        last = now
+    return silent * 1000
+
+
+def cpu_percent(seconds):
+    start_cpu, start = time.process_time(), time.monotonic()
+    time.sleep(seconds)
+    return (time.process_time() - start_cpu) / (time.monotonic() - start) * 100
+
+
+def main():
+    pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+    clip_seconds = pygame.mixer.Sound(file=io.BytesIO(CLIP)).get_length()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(CLIPS):
+            path = os.path.join(directory, f'clip{i}.mp3')
+            with open(path, 'wb') as f:
+                f.write(CLIP)
+            paths.append(path)
+
+        # 旧版播放线程
+        playback_queue, stop = queue.Queue(), threading.Event()
+        threading.Thread(target=legacy_worker, args=(playback_queue, stop), daemon=True).start()
+        legacy_idle = cpu_percent(IDLE_SECONDS)
+        for path in paths:
+            playback_queue.put(path)
+        legacy_gap = dead_air(pygame.mixer.music.get_busy, clip_seconds * CLIPS)
+        stop.set()
+
+        # 旧版 play_mp3_file 等待文件出现时的忙等
+        missing = os.path.join(directory, 'missing.mp3')
+        spin_stop = threading.Event()
+
+        def spin():
+            while not os.path.exists(missing) and not spin_stop.is_set():
+                pass
+        threading.Thread(target=spin, daemon=True).start()
+        legacy_wait = cpu_percent(IDLE_SECONDS)
+        spin_stop.set()
+
+        # 事件驱动的播放引擎
+        engine = PlaybackEngine(SoundCache())
+        engine.start()
+        engine.enqueue(paths[0]).wait()  # 先完成 mixer 初始化和解码缓存
+        engine_idle = cpu_percent(IDLE_SECONDS)
+        for path in paths:
+            engine.enqueue(path)
+        engine_gap = dead_air(pygame.mixer.Channel(0).get_busy, clip_seconds * CLIPS)
+        engine.stop()
+
+    gaps = CLIPS - 1
+    print(f'{"":28s} {"gap/clip (ms)":>14} {"idle CPU (%)":>13}')
+    print(f'{"legacy worker":28s} {legacy_gap / gaps:>14.1f} {legacy_idle:>13.1f}')
+    print(f'{"legacy play_mp3_file wait":28s} {"-":>14} {legacy_wait:>13.1f}')
+    print(f'{"PlaybackEngine":28s} {engine_gap / gaps:>14.1f} {engine_idle:>13.1f}')
+    pygame.mixer.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+启动耗时基准：每次测量都启动一个新的 Python 进程，按 app.py 的顺序导入模块、加载配置并创建窗口，
+然后在窗口显示 --delay 秒后播放一条语音（模拟用户第一次按回车或快捷键）。测量项目：
+    - window: 从创建进程到窗口显示（Tk 完成第一次绘制）的时间；
+    - first_sound: 从创建进程到第一条语音开始出声的时间。
+分别在窗口显示后调用 ttsEngine.warm_up()（与 app.py 相同）和不预热两种情况下测量。
+
+语音来自本地桩服务器，使用 SDL 的 dummy 音频驱动，不需要网络和声卡；--cached 时第一条语音预先写入缓存，
+只测本地的启动开销。没有图形界面的环境下不创建窗口，只测 first_sound。
+
+用法: python -m benchmark.startup [--runs 5] [--delay 0.5] [--latency 0.1] [--cached]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFIG_DIR = ROOT / 'config'
+TEXT = '启动后的第一条语音'
+
+
+def child(directory, delay, warm_up):
+    """在子进程中运行：与 app.py 相同的启动顺序，把各个时刻（time.monotonic）写到标准输出。"""
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import tkinter as tk
+    import lib.cachePrewarmer  # noqa: F401
+    import lib.metrics
+    import lib.ttsEngine
+    try:
+        import lib.mainWindow  # noqa: F401  win32gui 和 pynput 只在 Windows 上可用
+    except ImportError:
+        pass
+    from lib.metrics import Trace
+
+    directory = Path(directory)
+    config = lib.ttsEngine.Config(str(directory / 'sound_model.json'),
+                                  str(CONFIG_DIR / 'fixed_collocation.json'),
+                                  str(CONFIG_DIR / 'word_replacement.json'))
+    lib.metrics.registry.configure(config)
+    root = None
+    try:
+        root = tk.Tk()
+        root.update()
+        print(f'window {time.monotonic()}', flush=True)
+    except tk.TclError:
+        print('window none', flush=True)
+    if warm_up:
+        lib.ttsEngine.warm_up(config)
+
+    deadline = time.monotonic() + delay
+    while time.monotonic() < deadline:
+        if root is not None:
+            root.update()
+        time.sleep(0.005)
+
+    started = time.monotonic()
+    trace = Trace('interactive')
+    lib.ttsEngine.text_to_speech(TEXT, config, trace=trace)
+    while trace.total is None and time.monotonic() < started + 30:
+        if root is not None:
+            root.update()
+        time.sleep(0.001)
+    if trace.total is None or 'error' in trace.attrs:
+        print('sound none', flush=True)
+    else:
+        print(f'sound {started + trace.total / 1000}', flush=True)
+    lib.ttsEngine.cleanup_tts_engine()
+
+
+def run_once(directory, delay, warm_up):
+    args = [sys.executable, '-m', 'benchmark.startup', '--child', str(directory), '--delay', str(delay)]
+    if not warm_up:
+        args.append('--no-warm-up')
+    start = time.monotonic()
+    result = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    marks = {}
+    for line in result.stdout.splitlines():
+        name, _, value = line.partition(' ')
+        if name in ('window', 'sound'):
+            marks[name] = None if value == 'none' else (float(value) - start) * 1000
+    return marks
+
+
+def summarize(samples):
+    samples = sorted(sample for sample in samples if sample is not None)
+    if not samples:
+        return None
+    return {'min': samples[0], 'median': samples[len(samples) // 2], 'max': samples[-1], 'runs': len(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.5, help='seconds between window shown and first utterance')
+    parser.add_argument('--latency', type=float, default=0.1, help='stub server synthesis latency (s)')
+    parser.add_argument('--cached', action='store_true', help='put the first utterance in the cache beforehand')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--no-warm-up', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.delay, not args.no_warm_up)
+        return
+
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    from benchmark.stubTtsServer import StubTTSServer
+    from lib import ttsEngine
+
+    server = StubTTSServer(latency=args.latency).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='tts-startup-') as directory:
+            directory = Path(directory)
+            with open(CONFIG_DIR / 'sound_model.json', encoding='utf-8') as f:
+                data = json.load(f)
+            data.update({'BASE_URL': server.base_url, 'STORED_FILEPATH': str(directory / 'cache')})
+            with open(directory / 'sound_model.json', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            config = ttsEngine.Config(str(directory / 'sound_model.json'),
+                                      str(CONFIG_DIR / 'fixed_collocation.json'),
+                                      str(CONFIG_DIR / 'word_replacement.json'))
+
+            for warm_up in (True, False):
+                windows, sounds = [], []
+                for _ in range(args.runs):
+                    cache = ttsEngine.get_audio_cache(config)
+                    key = ttsEngine.get_cache_key(ttsEngine.normalize_text(TEXT, config), config)
+                    if args.cached:
+                        ttsEngine.synthesize_to_cache(ttsEngine.normalize_text(TEXT, config), config, key)
+                    else:
+                        cache.discard(key)
+                    # 子进程会打开同一个缓存目录，先关闭本进程中的索引
+                    ttsEngine.cleanup_tts_engine()
+                    marks = run_once(directory, args.delay, warm_up)
+                    windows.append(marks.get('window'))
+                    sounds.append(marks.get('sound'))
+                results['warm_up' if warm_up else 'no_warm_up'] = {
+                    'window_ms': summarize(windows),
+                    'first_sound_ms': summarize(sounds),
+                }
+    finally:
+        server.stop()
+    results['parameters'] = vars(args)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+本地的 TTS 桩服务器，实现与 /tts/v1 相同的接口，用于在不访问真实服务的情况下测试和压测。
+
+每个 TCP 连接对应一个 handler 实例，因此可以通过 connections 与 requests 两个计数
+判断客户端是否复用了连接。可以模拟服务端合成耗时（latency）、按比例出现的长尾延迟（tail_rate、tail_latency）、
+下行带宽（bytes_per_second）和按比例随机返回 503 的错误率（error_rate）。
+
+用法: python -m benchmark.stubTtsServer [--port 8000] [--latency 0.2] [--tail-rate 0.02] [--tail-latency 2]
+                                        [--bytes-per-second 6000] [--error-rate 0.05]
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.synthesisBackends import SILENT_MP3_FRAME
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        with server.lock:
+            server.requests += 1
+            failed = server.error_rate and server.random.random() < server.error_rate
+            if failed:
+                server.errors += 1
+            latency = server.latency
+            if server.tail_rate and server.random.random() < server.tail_rate:
+                latency += server.tail_latency
+        if self.path != server.path:
+            self._send(404, b'Not Found', 'text/plain')
+            return
+        if latency:
+            time.sleep(latency)
+        if failed:
+            self._send(503, b'Service Unavailable', 'text/plain')
+            return
+        self._send(200, server.audio, 'audio/mpeg')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        rate = self.server.bytes_per_second
+        if not rate or status != 200:
+            self.wfile.write(body)
+            return
+        # 按带宽分块发送，客户端可以边收边播
+        chunk = max(1, rate // 50)
+        start = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            self.wfile.flush()
+            delay = start + (offset + chunk) / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTTSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, audio=SILENT_MP3_FRAME * 20, latency=0.0,
+                 bytes_per_second=0, error_rate=0.0, seed=None, path='/tts/v1', tail_rate=0.0, tail_latency=0.0):
+        """
+        Args:
+            audio (bytes): 每次合成返回的音频。
+            latency (float): 收到请求后等待多少秒再返回响应头，模拟服务端合成耗时。
+            bytes_per_second (int): 响应体的发送速率，0 表示不限速。
+            error_rate (float): 返回 503 的请求比例。
+            seed (int): 错误注入使用的随机数种子，便于复现。
+            path (str): 接受合成请求的路径，其他路径返回 404。
+            tail_rate (float): 出现长尾延迟的请求比例。
+            tail_latency (float): 长尾请求额外等待的秒数。
+        """
+        super().__init__((host, port), _StubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.audio = audio
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.path = path
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+    def stats(self):
+        with self.lock:
+            return {'connections': self.connections, 'requests': self.requests, 'errors': self.errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub TTS server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--tail-latency', type=float, default=0.0)
+    parser.add_argument('--bytes-per-second', type=int, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    server = StubTTSServer(args.host, args.port, latency=args.latency, bytes_per_second=args.bytes_per_second,
+                           error_rate=args.error_rate, seed=args.seed, tail_rate=args.tail_rate,
+                           tail_latency=args.tail_latency)
+    print(f'Stub TTS server listening on {server.base_url}/tts/v1')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+端到端的性能基准：启动本地桩服务器，用 SDL 的 dummy 音频驱动无声运行完整的合成和播放流程，
+不需要网络和声卡。测量项目：
+    - cold_miss: 缓存未命中时从调用 text_to_speech 到开始出声的时间；
+    - warm_hit: 同样的文本再次播放（命中缓存）时到开始出声的时间；
+    - hotkey_to_sound: 从按下快捷键（与 GlobalHotkeyManager._on_hotkey_triggered 相同的调用）到开始出声的时间，
+      快捷键语音已预热；
+    - normalization: 使用 config/ 中的规则时文本规范化的吞吐；
+    - throughput: 多个客户端并发请求不同文本时合成流水线的持续吞吐、延迟和错误率。
+
+结果以 JSON 输出，包含参数、环境和提交号，便于在版本之间对比。
+
+用法: python -m benchmark.suite [--output results.json] [--latency 0.1] [--bytes-per-second 0]
+                                [--error-rate 0] [--concurrency 8] [--duration 5] [--streaming]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from benchmark.stubTtsServer import SILENT_MP3_FRAME, StubTTSServer
+from lib import ttsEngine
+from lib.metrics import RollingHistogram, Trace, registry
+from lib.synthesisExecutor import SynthesisExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFIG_DIR = ROOT / 'config'
+TRACE_TIMEOUT = 30.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end TTS benchmark')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--latency', type=float, default=0.1, help='stub server synthesis latency (s)')
+    parser.add_argument('--bytes-per-second', type=int, default=0, help='stub server bandwidth, 0 = unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub responses that are 503')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=4, help='MP3 frames per clip (~26 ms each)')
+    parser.add_argument('--samples', type=int, default=20, help='utterances per latency measurement')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of sustained load')
+    parser.add_argument('--normalize-calls', type=int, default=20000)
+    parser.add_argument('--streaming', action='store_true', help='enable STREAMING in the config')
+    parser.add_argument('--chunking', action='store_true', help='enable CHUNKING in the config')
+    return parser.parse_args(argv)
+
+
+def make_config(directory, base_url, args):
+    """在临时目录中生成指向桩服务器的 sound_model.json，规则文件沿用 config/ 中的。"""
+    with open(CONFIG_DIR / 'sound_model.json', encoding='utf-8') as f:
+        data = json.load(f)
+    data.update({
+        'BASE_URL': base_url,
+        'STORED_FILEPATH': str(Path(directory) / 'cache'),
+        'STREAMING': args.streaming,
+        'CHUNKING': args.chunking,
+    })
+    model_path = Path(directory) / 'sound_model.json'
+    with open(model_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return ttsEngine.Config(str(model_path),
+                            str(CONFIG_DIR / 'fixed_collocation.json'),
+                            str(CONFIG_DIR / 'word_replacement.json'))
+
+
+def summarize(samples, errors=0):
+    histogram = RollingHistogram(window=max(1, len(samples)))
+    for sample in samples:
+        histogram.observe(sample)
+    result = histogram.summary()
+    result['errors'] = errors
+    return result
+
+
+def wait_idle(timeout=TRACE_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not ttsEngine.get_playback_engine().is_idle() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def wait_trace(trace, timeout=TRACE_TIMEOUT):
+    """等待 trace 结束，返回到开始出声的毫秒数；出错或超时返回 None。"""
+    deadline = time.monotonic() + timeout
+    while trace.total is None:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.001)
+    return None if 'error' in trace.attrs else trace.total
+
+
+def measure_speech(texts, config, source, priority=SynthesisExecutor.INTERACTIVE):
+    """逐条播放 texts，每条都等上一条播放完，返回到开始出声的延迟统计。"""
+    samples, errors = [], 0
+    for text in texts:
+        wait_idle()
+        trace = Trace(source, text)
+        ttsEngine.text_to_speech(text, config, priority, trace)
+        total = wait_trace(trace)
+        if total is None:
+            errors += 1
+        else:
+            samples.append(total)
+    wait_idle()
+    return summarize(samples, errors)
+
+
+def wait_prepared(items, timeout=TRACE_TIMEOUT):
+    """等待 preload_prepared() 在后台查好各 PreparedSpeech 的播放来源。"""
+    deadline = time.monotonic() + timeout
+    while not all(prepared.ready for prepared in items) and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def hotkey_texts(count):
+    with open(CONFIG_DIR / 'shortcut_key.json', encoding='utf-8') as f:
+        data = json.load(f)
+    shortcuts = [(item['key'], item['text']) for item in data if item.get('key') and item.get('text')]
+    shortcuts = shortcuts or [('<ctrl>+a', '快捷键')]
+    return [shortcuts[i % len(shortcuts)] for i in range(count)]
+
+
+def measure_hotkey(config, count):
+    # 与 GlobalHotkeyManager 一样先预热快捷键语音，测量的是稳定状态下按键到出声的时间
+    hotkeys = hotkey_texts(count)
+    for _, text in hotkeys:
+        for part in ttsEngine.utterance_parts(ttsEngine.normalize_text(text, config), config):
+            ttsEngine.synthesize_to_cache(part, config)
+    # 与 GlobalHotkeyManager 一样在加载快捷键时预先准备好，并在后台查好播放来源
+    prepared = {key_str: ttsEngine.PreparedSpeech(text, config) for key_str, text in hotkeys}
+    ttsEngine.preload_prepared(list(prepared.values()))
+    wait_prepared(prepared.values())
+    samples, errors = [], 0
+    for key_str, text in hotkeys:
+        wait_idle()
+        # 与 _on_hotkey_triggered 相同：从按键时开始计时，语音已在缓存中时直接加入播放队列
+        trace = Trace('hotkey', key_str)
+        if not ttsEngine.speak_prepared(prepared[key_str], SynthesisExecutor.HOTKEY, trace):
+            ttsEngine.text_to_speech(text, config, SynthesisExecutor.HOTKEY, trace)
+        total = wait_trace(trace)
+        if total is None:
+            errors += 1
+        else:
+            samples.append(total)
+    wait_idle()
+    return summarize(samples, errors)
+
+
+def measure_normalization(config, calls):
+    befores = [collocation['before'] for collocation in config.FIXED_COLLOCATION]
+    befores += [replacement['before'] for replacement in config.WORD_REPLACEMENT if not replacement['re']]
+    befores = befores or ['text']
+    texts = [f'第{i}句 {befores[i % len(befores)]} 和 {befores[(i * 7) % len(befores)]}。' for i in range(calls)]
+    texts += befores
+    normalizer = config.NORMALIZER
+    start = time.perf_counter()
+    for text in texts:
+        normalizer.normalize(text)
+    elapsed = time.perf_counter() - start
+    return {
+        'calls': len(texts),
+        'rules': len(config.WORD_REPLACEMENT) + len(config.FIXED_COLLOCATION),
+        'us_per_call': round(elapsed / len(texts) * 1e6, 3),
+        'calls_per_second': round(len(texts) / elapsed, 1),
+    }
+
+
+def measure_throughput(config, concurrency, duration):
+    """concurrency 个客户端各自循环请求新文本并等待合成完成（闭环负载），持续 duration 秒。"""
+    cache = ttsEngine.get_audio_cache(config)
+    lock = threading.Lock()
+    samples, errors = [], [0]
+    counter = iter(range(10 ** 9))
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            with lock:
+                text = f'吞吐测试 {next(counter)}'
+            start = time.perf_counter()
+            try:
+                ttsEngine.synthesize_async(text, config).result(TRACE_TIMEOUT)
+                ok = ttsEngine.get_cache_key(text, config) in cache
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    samples.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    total = len(samples) + errors[0]
+    return {
+        'concurrency': concurrency,
+        'workers': config.SYNTHESIS_WORKERS,
+        'seconds': round(elapsed, 3),
+        'requests': total,
+        'requests_per_second': round(len(samples) / elapsed, 2),
+        'error_rate': round(errors[0] / total, 4) if total else 0.0,
+        'latency': summarize(samples, errors[0]),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    server = StubTTSServer(audio=SILENT_MP3_FRAME * args.frames, latency=args.latency,
+                           bytes_per_second=args.bytes_per_second, error_rate=args.error_rate,
+                           seed=args.seed).start()
+    directory = tempfile.mkdtemp(prefix='tts-bench-')
+    try:
+        config = make_config(directory, server.base_url, args)
+        stamp = int(time.time())
+        cold_texts = [f'冷启动测试 {stamp} {i}' for i in range(args.samples)]
+        results = {
+            'cold_miss': measure_speech(cold_texts, config, 'cold_miss'),
+            'warm_hit': measure_speech(cold_texts, config, 'warm_hit'),
+            'hotkey_to_sound': measure_hotkey(config, args.samples),
+            'normalization': measure_normalization(config, args.normalize_calls),
+            'throughput': measure_throughput(config, args.concurrency, args.duration),
+        }
+        return {
+            'version': 1,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'parameters': vars(args),
+            'results': results,
+            'stages': registry.snapshot()['latency'],
+            'stub': server.stats(),
+        }
+    finally:
+        ttsEngine.cleanup_tts_engine()
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 引擎的日志输出到 stderr，stdout 只留结果
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
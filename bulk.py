@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+
+import lib.bulkSynthesizer
+import lib.ttsEngine
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='把语料文件中的文本批量预先合成进缓存')
+    parser.add_argument('corpus', help='语料文件：每行一条文本的文本文件，或每行一个 {"text": ...} 对象的 .jsonl 文件')
+    parser.add_argument('--concurrency', type=int, help='同时进行的合成请求数，默认使用 SYNTHESIS_WORKERS')
+    parser.add_argument('--rate', type=float, default=0.0, help='每秒最多发出的合成请求数，0 表示不限速')
+    parser.add_argument('--burst', type=int, default=1, help='允许连续发出的请求数')
+    parser.add_argument('--voice', help='覆盖 sound_model.json 中的 VOICE（为其他音色准备语音包）')
+    parser.add_argument('--checkpoint', help='进度文件，默认为语料文件名加 .progress.json')
+    parser.add_argument('--restart', action='store_true', help='忽略已有的进度，从头开始')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出汇总信息')
+    args = parser.parse_args()
+
+    config = lib.ttsEngine.Config("./config/sound_model.json",
+                                  "./config/fixed_collocation.json",
+                                  "./config/word_replacement.json")
+    if args.voice is not None:
+        config.VOICE = args.voice
+    bulk = lib.bulkSynthesizer.BulkSynthesizer(config, args.corpus, args.checkpoint,
+                                               args.concurrency or config.SYNTHESIS_WORKERS, args.rate, args.burst)
+    try:
+        summary = bulk.run(restart=args.restart)
+    finally:
+        lib.ttsEngine.cleanup_tts_engine()
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        latency = summary['latency_ms']
+        print(f"{summary['lines']} lines: {summary['skipped']} skipped (checkpoint), "
+              f"{summary['cached']} already cached, {summary['synthesized']} synthesized, {summary['failed']} failed")
+        print(f"{summary['elapsed_s']:.1f} s, {summary['throughput']:.2f} synthesized/s, "
+              f"latency p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms")
+        for failure in summary['failures']:
+            print(f"  line {failure['line']}: {failure['text']!r}: {failure['error']}")
+        if summary['interrupted']:
+            print(f"Interrupted, run again to resume from {bulk.checkpoint_path}")
+    sys.exit(1 if summary['failed'] or summary['interrupted'] else 0)
@@ -0,0 +1,411 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from lib.audioStream import parse_mp3_frame_header, skip_id3_tag
+
+
+def is_complete_mp3(audio_bytes):
+    """
+    检查 MP3 数据是否完整：能从头到尾按帧解析，且最后一帧没有被截断。
+
+    Returns:
+        bool: 数据完整返回 True。
+    """
+    offset = skip_id3_tag(audio_bytes)
+    if offset is None:
+        return False
+    frames = 0
+    while offset < len(audio_bytes):
+        header = parse_mp3_frame_header(audio_bytes, offset)
+        if header is None:
+            # 末尾可能带有 ID3v1 或 APE 标签
+            return frames > 0 and _is_tail_tag(audio_bytes, offset)
+        offset += header[0]
+        frames += 1
+    return frames > 0 and offset == len(audio_bytes)
+
+
+def _is_tail_tag(audio_bytes, offset):
+    if audio_bytes[offset:offset + 3] == b'TAG':
+        return len(audio_bytes) - offset == 128
+    return audio_bytes[offset:offset + 8] == b'APETAGEX'
+
+
+class AudioCache:
+    """
+    带索引的音频缓存。
+
+    音频文件仍然以 {key}.mp3 的形式存放在缓存目录中，另外在 index.sqlite3 中记录每个条目的
+    大小、最后访问时间和命中次数。索引在启动时整体载入内存，查找时不再扫描目录，
+    只对命中的文件做一次 stat 校验大小；超出容量上限时按 LRU 或 LFU 淘汰到上限的 90%，
+    避免每写入一条就淘汰一次。
+
+    命中时的访问时间和命中次数先记在内存中，攒够 FLUSH_BATCH 条或每隔 FLUSH_INTERVAL 秒（以及 close() 时）
+    批量写回索引，查找路径上不必每次都提交一次 sqlite 事务。
+
+    多个进程可以共用同一个缓存目录：文件通过临时文件加重命名原子写入，
+    内存索引中没有的键会再查一次共享的 sqlite 索引，从而看到其他进程写入的条目。
+    查过的缺失键在共享索引被其他进程修改之前不再重复查询，是否被修改最多每 ADOPT_INTERVAL 秒检查一次。
+    """
+
+    INDEX_NAME = 'index.sqlite3'
+    FLUSH_BATCH = 256
+    FLUSH_INTERVAL = 5.0
+    ADOPT_INTERVAL = 0.2
+
+    def __init__(self, directory, max_bytes=0, max_entries=0, policy='lru'):
+        """
+        Args:
+            directory (str): 缓存目录。
+            max_bytes (int): 缓存总字节数上限，0 表示不限制。
+            max_entries (int): 缓存条目数上限，0 表示不限制。
+            policy (str): 淘汰策略，"lru"（最久未使用）或 "lfu"（最少使用）。
+        """
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown cache eviction policy: {policy}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.corrupted = 0
+
+        self._lock = threading.RLock()
+        self._entries = {}  # {key: [size, last_access, hit_count]}
+        self._total_bytes = 0
+        self._derived = {}  # {key: size}，依附于条目的派生数据，见 attach_derived()
+        self._derived_bytes = 0
+        self._on_remove = None
+        self._dirty = {}  # {key: entry}，访问时间还没有写回索引的条目
+        self._flushed_at = time.monotonic()
+        self._absent = set()  # 在共享索引中查过、不存在的键
+        self._index_version = None  # 查询 _absent 时共享索引的 data_version
+        self._version_checked_at = 0.0
+
+        index_path = self.directory / self.INDEX_NAME
+        is_new = not index_path.exists()
+        self._db = sqlite3.connect(str(index_path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                         'last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)')
+        if is_new:
+            # 第一次使用索引：把旧版本留下的 md5 命名文件导入索引
+            self._import_directory()
+        for key, size, last_access, hits in self._db.execute('SELECT key, size, last_access, hits FROM entries'):
+            self._entries[key] = [size, last_access, hits]
+            self._total_bytes += size
+        self._evict()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 Config 对象创建缓存。"""
+        return cls(config.STORED_FILEPATH, config.CACHE_MAX_BYTES, config.CACHE_MAX_ENTRIES, config.CACHE_POLICY)
+
+    def path_for(self, key):
+        """返回缓存键对应的文件路径（不保证文件存在）。"""
+        return self.directory / f'{key}.mp3'
+
+    def source_for(self, key):
+        """返回可以交给播放引擎的音频来源，即 path_for(key)。"""
+        return self.path_for(key)
+
+    def _import_directory(self):
+        rows = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.mp3'):
+                    stat = entry.stat()
+                    rows.append((entry.name[:-4], stat.st_size, stat.st_mtime, 0))
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', rows)
+        if rows:
+            print(f"Imported {len(rows)} existing cache files into index.")
+
+    def get(self, key):
+        """
+        查找缓存。
+
+        命中时会更新访问时间和命中次数，并检查文件大小与索引记录一致，
+        文件丢失或被截断的条目会被删除并视为未命中。
+
+        Returns:
+            Path: 命中时返回文件路径，否则返回 None。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._adopt(key):
+                entry = self._entries[key]
+            if entry is None:
+                self.misses += 1
+                return None
+            path = self.path_for(key)
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = -1
+            if size != entry[0]:
+                print(f"Cache entry {key} is missing or truncated, dropping it.")
+                self.corrupted += 1
+                self.misses += 1
+                self._remove(key)
+                return None
+
+            self.hits += 1
+            entry[1] = time.time()
+            entry[2] += 1
+            self._touch(key, entry)
+            return path
+
+    def read(self, key):
+        """
+        Returns:
+            bytes: 命中时返回音频数据（计入命中统计），否则返回 None。
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def discard(self, key):
+        """删除一条缓存，条目不存在时什么也不做。"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def attach_derived(self, sizes, on_remove=None):
+        """
+        登记依附于缓存条目的派生数据（例如后处理结果），替换之前登记的全部派生数据。
+        派生数据的大小计入 max_bytes；条目被删除或淘汰时调用 on_remove(key)，由调用方删除对应的派生数据。
+
+        Args:
+            sizes (dict): {缓存键: 字节数}，不在缓存中的键被忽略。
+            on_remove (callable): 条目被删除时的回调，在持有缓存锁时调用，不能再访问缓存。
+        """
+        with self._lock:
+            self._derived = {key: size for key, size in sizes.items() if key in self._entries}
+            self._derived_bytes = sum(self._derived.values())
+            self._on_remove = on_remove
+            self._evict()
+
+    def add_derived(self, key, size):
+        """
+        登记一条派生数据。
+
+        Returns:
+            bool: 条目已经不在缓存中时返回 False，调用方应删除这条派生数据。
+        """
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._derived_bytes += size - self._derived.get(key, 0)
+            self._derived[key] = size
+            self._evict(protect=key)
+            return True
+
+    def __contains__(self, key):
+        """只检查索引，不更新统计信息。"""
+        with self._lock:
+            return key in self._entries or self._adopt(key)
+
+    def check(self, key):
+        """
+        与 key in cache 相同，但内存索引中没有时总是查询共享索引，不使用查过的缺失键。
+        用于取得按键锁之后复查其他进程是否刚好写完。
+        """
+        with self._lock:
+            if key in self._entries:
+                return True
+            self._absent.discard(key)
+            return self._adopt(key)
+
+    def _touch(self, key, entry):
+        """记下命中后的访问时间，按批量或间隔写回索引。调用方持有 self._lock。"""
+        self._dirty[key] = entry
+        if len(self._dirty) >= self.FLUSH_BATCH or time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self._flush()
+
+    def flush(self):
+        """把内存中的访问时间和命中次数写回索引。"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._dirty:
+            with self._db:
+                self._db.executemany('UPDATE entries SET last_access = ?, hits = ? WHERE key = ?',
+                                     [(entry[1], entry[2], key) for key, entry in self._dirty.items()])
+            self._dirty.clear()
+        self._flushed_at = time.monotonic()
+
+    def _adopt(self, key):
+        """把其他进程写入共享索引、但还不在内存索引中的条目载入内存。调用方持有 self._lock。"""
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.ADOPT_INTERVAL:
+            # data_version 只在其他连接提交修改后变化
+            version = self._db.execute('PRAGMA data_version').fetchone()[0]
+            self._version_checked_at = now
+            if version != self._index_version:
+                self._index_version = version
+                self._absent.clear()
+        if key in self._absent:
+            return False
+        row = self._db.execute('SELECT size, last_access, hits FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            if len(self._absent) >= 10000:
+                self._absent.clear()
+            self._absent.add(key)
+            return False
+        try:
+            if os.stat(self.path_for(key)).st_size != row[0]:
+                return False
+        except OSError:
+            return False
+        self._entries[key] = list(row)
+        self._total_bytes += row[0]
+        return True
+
+    def put(self, key, audio_bytes):
+        """
+        写入一条缓存。数据先写到临时文件再重命名，不会留下半截文件。
+
+        Returns:
+            Path: 写入成功返回文件路径；数据不完整时不写入并返回 None。
+        """
+        if not audio_bytes or not is_complete_mp3(audio_bytes):
+            print(f"Refusing to cache incomplete audio for {key}.")
+            return None
+        path = self.path_for(key)
+        temp_path = path.with_name(path.name + f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(audio_bytes)
+        os.replace(temp_path, path)
+        self._add(key, len(audio_bytes))
+        return path
+
+    def commit_file(self, key, temp_path):
+        """
+        把已经写好的临时文件（例如流式下载的结果）登记为缓存条目。
+
+        Returns:
+            Path: 成功返回正式的缓存文件路径；文件不完整时删除临时文件并返回 None。
+        """
+        with open(temp_path, 'rb') as f:
+            audio_bytes = f.read()
+        if not is_complete_mp3(audio_bytes):
+            print(f"Refusing to cache incomplete audio for {key}.")
+            os.remove(temp_path)
+            return None
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        self._add(key, len(audio_bytes))
+        return path
+
+    def _add(self, key, size):
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._total_bytes -= old[0]
+            now = time.time()
+            hits = old[2] if old is not None else 0
+            self._dirty.pop(key, None)
+            self._entries[key] = [size, now, hits]
+            self._total_bytes += size
+            with self._db:
+                self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (key, size, now, hits))
+            self._evict(protect=key)
+
+    def _remove(self, key):
+        self._dirty.pop(key, None)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+        with self._db:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+        size = self._derived.pop(key, None)
+        if size is not None:
+            self._derived_bytes -= size
+            if self._on_remove is not None:
+                self._on_remove(key)
+
+    def _over_limit(self, ratio=1.0):
+        return ((self.max_bytes and self._total_bytes + self._derived_bytes > self.max_bytes * ratio) or
+                (self.max_entries and len(self._entries) > self.max_entries * ratio))
+
+    def _evict(self, protect=None):
+        """淘汰条目直到满足容量上限。protect 指定的条目（刚写入的）不会被淘汰。"""
+        with self._lock:
+            if not self._over_limit():
+                return
+            if self.policy == 'lfu':
+                order = sorted(self._entries, key=lambda k: (self._entries[k][2], self._entries[k][1]))
+            else:
+                order = sorted(self._entries, key=lambda k: self._entries[k][1])
+            for key in order:
+                if not self._over_limit(0.9):
+                    break
+                if key == protect:
+                    continue
+                self._remove(key)
+                self.evictions += 1
+
+    def verify(self):
+        """
+        完整检查所有缓存条目，删除丢失、大小不符或无法完整解析的文件。
+
+        Returns:
+            int: 删除的条目数。
+        """
+        removed = 0
+        with self._lock:
+            for key in list(self._entries):
+                path = self.path_for(key)
+                try:
+                    audio_bytes = path.read_bytes()
+                except OSError:
+                    audio_bytes = b''
+                if len(audio_bytes) != self._entries[key][0] or not is_complete_mp3(audio_bytes):
+                    self._remove(key)
+                    removed += 1
+            self.corrupted += removed
+        return removed
+
+    def stats(self):
+        """
+        返回缓存统计信息。
+
+        Returns:
+            dict: 包含 entries、bytes、derived_bytes（派生数据的字节数）、hits、misses、hit_rate、evictions、corrupted。
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'derived_bytes': self._derived_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'corrupted': self.corrupted,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
@@ -0,0 +1,240 @@
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+import wave
+from pathlib import Path
+
+from lib.metrics import registry
+
+# 导入 numpy 失败的原因；失败一次之后不再尝试，后处理随之停用
+_numpy_error = None
+
+
+def numpy_available():
+    """numpy 是否可用。第一次调用时导入，导入失败时打印一次原因。"""
+    global _numpy_error
+    if _numpy_error is not None:
+        return False
+    try:
+        importlib.import_module('numpy')
+    except ImportError as e:
+        _numpy_error = e
+        print(f"Post-processing disabled, numpy is not available: {e}")
+        return False
+    return True
+
+
+def process_samples(samples, frequency, threshold_db=-45.0, target_db=-20.0, max_gain_db=12.0,
+                    window_ms=10, lead_pad_ms=10, tail_pad_ms=60):
+    """
+    去掉首尾的静音并把响度调整到目标电平。
+
+    以 window_ms 为窗口计算 RMS，高于 threshold_db 的窗口视为有声音；保留第一个到最后一个有声窗口之间的部分，
+    前后各留一点余量，避免切掉字头和尾音。响度按有声窗口的 RMS（近似门限响度）调整到 target_db，
+    增益限制在 ±max_gain_db 以内，并保证峰值不削波。
+
+    Args:
+        samples (numpy.ndarray): int16 采样，形状为 (采样数,) 或 (采样数, 声道数)。
+        frequency (int): 采样率。
+        threshold_db (float): 静音门限（dBFS）。
+        target_db (float): 目标 RMS 电平（dBFS）。
+        max_gain_db (float): 最大增益或衰减（dB）。
+
+    Returns:
+        tuple: (处理后的 int16 采样, 去掉的开头静音毫秒数, 去掉的结尾静音毫秒数, 增益 dB)。
+               整段都是静音时原样返回。
+    """
+    import numpy as np
+
+    x = samples.astype(np.float32) / 32768.0
+    if x.ndim == 1:
+        x = x[:, None]
+    window = max(1, frequency * window_ms // 1000)
+    count = len(x) // window
+    if count == 0:
+        return samples, 0.0, 0.0, 0.0
+    rms = np.sqrt(np.square(x[:count * window].reshape(count, window, x.shape[1])).mean(axis=(1, 2)))
+    loud = rms > 10 ** (threshold_db / 20)
+    if not loud.any():
+        return samples, 0.0, 0.0, 0.0
+
+    first = int(np.argmax(loud))
+    last = count - 1 - int(np.argmax(loud[::-1]))
+    start = max(0, first * window - frequency * lead_pad_ms // 1000)
+    end = min(len(x), (last + 1) * window + frequency * tail_pad_ms // 1000)
+    y = x[start:end]
+
+    level = float(np.sqrt(np.mean(np.square(rms[loud]))))
+    gain_db = min(max(target_db - 20 * np.log10(level), -max_gain_db), max_gain_db)
+    peak = float(np.abs(y).max())
+    if peak > 0:
+        gain_db = min(gain_db, 20 * np.log10(0.99 / peak))
+    y = np.clip(y * 10 ** (gain_db / 20), -1.0, 1.0)
+    out = (y * 32767).astype(np.int16)
+    if samples.ndim == 1:
+        out = out[:, 0]
+    return out, start * 1000 / frequency, (len(x) - end) * 1000 / frequency, float(gain_db)
+
+
+class AudioPostProcessor:
+    """
+    合成结果的后处理：去掉首尾静音、统一响度，结果以 WAV（PCM）形式保存在缓存目录的 processed 子目录中。
+
+    每条语音只在合成后（或第一次播放后在后台）解码并处理一次，之后直接播放处理过的 WAV，
+    既去掉了开头的静音延迟，也省去了 MP3 解码。解码借用播放引擎的 pygame mixer，
+    输出与 mixer 相同的采样率和声道数。
+    文件名带有处理参数的摘要，参数变化后路径随之变化（内存中按路径缓存的 Sound 不会播放旧的结果），旧的结果会被清空。
+    attach() 之后结果的大小计入音频缓存的容量上限，对应的缓存条目被淘汰时一起删除。
+    需要 numpy。
+    """
+
+    DIRECTORY_NAME = 'processed'
+
+    def __init__(self, directory, threshold_db=-45.0, target_db=-20.0, max_gain_db=12.0):
+        """
+        Args:
+            directory (str): 缓存目录，结果保存在其中的 processed 子目录。
+            threshold_db (float): 静音门限（dBFS）。
+            target_db (float): 目标 RMS 电平（dBFS）。
+            max_gain_db (float): 最大增益或衰减（dB）。
+        """
+        self.directory = Path(directory) / self.DIRECTORY_NAME
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.threshold_db = threshold_db
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.processed = 0
+        self.failed = 0
+        self.cache = None
+        self._lock = threading.Lock()
+
+        settings = {'threshold_db': threshold_db, 'target_db': target_db, 'max_gain_db': max_gain_db}
+        self.tag = hashlib.md5(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+        # {缓存键: WAV 字节数}，get() 只查这张表，不访问磁盘
+        self._sizes = {}
+        suffix = f'.{self.tag}.wav'
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(suffix):
+                    self._sizes[entry.name[:-len(suffix)]] = entry.stat().st_size
+                elif entry.name.endswith('.wav'):
+                    # 其他参数下的结果
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 Config 对象创建后处理器。"""
+        return cls(config.STORED_FILEPATH, config.SILENCE_THRESHOLD_DB, config.LOUDNESS_TARGET_DB,
+                   config.LOUDNESS_MAX_GAIN_DB)
+
+    def path_for(self, key):
+        return self.directory / f'{key}.{self.tag}.wav'
+
+    def get(self, key):
+        """
+        Returns:
+            Path: 已处理过时返回 WAV 文件路径，否则返回 None。
+        """
+        with self._lock:
+            return self.path_for(key) if key in self._sizes else None
+
+    def attach(self, cache):
+        """
+        把结果登记到音频缓存：大小计入缓存的容量上限，缓存条目被删除或淘汰时一起删除。
+        对应的缓存条目已经不存在的结果现在删除。
+
+        Returns:
+            int: 删除的结果数。
+        """
+        with self._lock:
+            keys = list(self._sizes)
+        removed = 0
+        for key in keys:
+            if key not in cache:
+                self.discard(key)
+                removed += 1
+        with self._lock:
+            sizes = dict(self._sizes)
+        cache.attach_derived(sizes, self.discard)
+        self.cache = cache
+        return removed
+
+    def discard(self, key):
+        """删除一条结果，不存在时什么也不做。"""
+        with self._lock:
+            if self._sizes.pop(key, None) is None:
+                return
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def process(self, key, source):
+        """
+        解码 source 并处理，结果写入 path_for(key)。需要 pygame mixer 已经初始化。
+
+        Args:
+            key (str): 缓存键。
+            source: 缓存条目的播放来源（文件路径或 PackedClip）。
+
+        Returns:
+            Path: 成功时返回 WAV 文件路径，失败或 numpy 不可用时返回 None。
+        """
+        if not numpy_available():
+            return None
+        import pygame
+        import pygame.sndarray
+
+        start = time.perf_counter()
+        try:
+            frequency, _, channels = pygame.mixer.get_init()
+            if hasattr(source, 'open'):
+                sound = pygame.mixer.Sound(file=source.open())
+            else:
+                sound = pygame.mixer.Sound(source)
+            samples = pygame.sndarray.array(sound)
+            out, lead_ms, tail_ms, gain_db = process_samples(samples, frequency, self.threshold_db,
+                                                             self.target_db, self.max_gain_db)
+            path = self.path_for(key)
+            temp_path = path.with_name(path.name + f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            with wave.open(str(temp_path), 'wb') as f:
+                f.setnchannels(channels)
+                f.setsampwidth(2)
+                f.setframerate(frequency)
+                f.writeframes(out.tobytes())
+            os.replace(temp_path, path)
+            size = path.stat().st_size
+        except (pygame.error, ImportError, OSError, ValueError) as e:
+            print(f"Post-processing failed for {key}: {e}")
+            with self._lock:
+                self.failed += 1
+            return None
+
+        with self._lock:
+            self._sizes[key] = size
+        if self.cache is not None and not self.cache.add_derived(key, size):
+            # 处理期间缓存条目已被淘汰
+            self.discard(key)
+            return None
+
+        cost_ms = (time.perf_counter() - start) * 1000
+        seconds = len(samples) / frequency
+        with self._lock:
+            self.processed += 1
+        registry.observe('postprocess.leading_silence_ms', lead_ms)
+        registry.observe('postprocess.trailing_silence_ms', tail_ms)
+        registry.observe('postprocess.gain_db', gain_db)
+        if seconds > 0:
+            registry.observe('postprocess.cost_ms_per_audio_s', cost_ms / seconds)
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {'processed': self.processed, 'failed': self.failed, 'files': len(self._sizes),
+                    'bytes': sum(self._sizes.values())}
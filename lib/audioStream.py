@@ -0,0 +1,212 @@
+import re
+import threading
+import time
+
+# Layer III 比特率表 (kbps)，按 MPEG 版本区分
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+# 采样率表，键为 header 中的版本位: 3=MPEG1, 2=MPEG2, 0=MPEG2.5
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mixer_settings_for(output_format, buffer=512):
+    """
+    根据 TTS 服务的输出格式（如 "audio-24khz-48kbitrate-mono-mp3"）选择 pygame mixer 的参数，
+    让 mixer 与音频的采样率和声道数一致，播放时不必逐段重采样。
+
+    Returns:
+        tuple: pygame.mixer.init 的 (frequency, size, channels, buffer)；无法识别时为 (22050, -16, 2, buffer)。
+    """
+    match = re.search(r'(\d+)(khz|hz)', output_format.lower())
+    if match is None:
+        return 22050, -16, 2, buffer
+    frequency = int(match.group(1))
+    if match.group(2) == 'khz':
+        # 22khz、44khz 实际是 22050、44100 Hz
+        frequency = {22: 22050, 44: 44100}.get(frequency, frequency * 1000)
+    channels = 2 if 'stereo' in output_format.lower() else 1
+    return frequency, -16, channels, buffer
+
+
+def parse_mp3_frame_header(buf, offset):
+    """
+    解析 offset 处的 MP3 (Layer III) 帧头。
+
+    Returns:
+        tuple: (帧长度字节数, 帧时长毫秒)，如果 offset 处不是合法的帧头则返回 None。
+    """
+    if offset + 4 > len(buf):
+        return None
+    b0, b1, b2 = buf[offset], buf[offset + 1], buf[offset + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        bitrate = _BITRATES_V1[bitrate_index] * 1000
+        samples = 1152
+    else:
+        bitrate = _BITRATES_V2[bitrate_index] * 1000
+        samples = 576
+    length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples * 1000 / sample_rate
+
+
+def mp3_main_data_begin(buf, offset):
+    """
+    读取 offset 处 MP3 (Layer III) 帧的 main_data_begin，即这一帧的主数据从前面的帧（比特储存器）中借用了多少字节。
+    只有为 0 的帧才能单独解码，从它前面切开不会丢失数据。
+
+    Returns:
+        int: main_data_begin；数据不足时返回 None。
+    """
+    side = offset + 4 if buf[offset + 1] & 0x01 else offset + 6  # 有 CRC 时跳过 2 字节校验
+    if side + 2 > len(buf):
+        return None
+    if (buf[offset + 1] >> 3) & 0x03 == 3:
+        return (buf[side] << 1) | (buf[side + 1] >> 7)  # MPEG1: 9 位
+    return buf[side]  # MPEG2/2.5: 8 位
+
+
+def skip_id3_tag(buf):
+    """返回跳过开头 ID3v2 标签后的偏移；数据不足以判断时返回 None。"""
+    if len(buf) < 10:
+        return None if buf[:3] == b'ID3'[:len(buf)] else 0
+    if buf[:3] != b'ID3':
+        return 0
+    size = (buf[6] << 21) | (buf[7] << 14) | (buf[8] << 7) | buf[9]
+    return 10 + size
+
+
+class AudioStream:
+    """
+    边下载边播放的音频流。
+
+    下载线程通过 feed() 写入数据，播放线程通过 next_segment() 取出按帧边界切好的 MP3 片段。
+    每个片段单独解码，因此只在 main_data_begin 为 0 的帧前面切开，否则下一段的第一帧缺少比特储存器中的数据，
+    衔接处会有爆音。第一个片段要等缓冲的音频时长达到 prebuffer_ms 才会交给播放器，之后的片段有多少给多少。
+    """
+
+    def __init__(self, name, prebuffer_ms=300):
+        self.name = name
+        self.prebuffer_ms = prebuffer_ms
+        self.done = False
+        self.failed = False
+        # 计时（time.monotonic），用于统计首字节时间与首次出声时间
+        self.started_at = time.monotonic()
+        self.first_byte_at = None
+        self.first_sound_at = None
+
+        self._buffer = bytearray()
+        self._scan_offset = None  # 下一个待解析帧的位置，None 表示还未跳过 ID3 标签
+        self._frames_ms = 0.0  # _scan_offset 之前的完整帧的总时长
+        self._ready_end = 0  # 可以切开的位置：之后的帧不依赖之前的数据
+        self._ready_ms = 0.0  # _ready_end 之前的音频时长
+        self._consumed = 0  # 已交给播放器的位置
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return f'AudioStream({self.name})'
+
+    def feed(self, chunk):
+        """写入一段下载到的数据。"""
+        with self._cond:
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+            self._buffer += chunk
+            self._scan_frames()
+            self._cond.notify_all()
+
+    def finish(self):
+        """下载完成。剩余的不完整数据也一并交给播放器。"""
+        with self._cond:
+            self.done = True
+            self._ready_end = len(self._buffer)
+            self._cond.notify_all()
+
+    def fail(self):
+        """下载失败。"""
+        with self._cond:
+            self.failed = True
+            self.done = True
+            self._cond.notify_all()
+
+    def _scan_frames(self):
+        buf = self._buffer
+        if self._scan_offset is None:
+            self._scan_offset = skip_id3_tag(buf)
+            if self._scan_offset is None:
+                return
+        offset = self._scan_offset
+        while True:
+            header = parse_mp3_frame_header(buf, offset)
+            if header is None:
+                # 不是帧头：可能数据还不够，也可能是垃圾字节，逐字节寻找下一个同步字
+                if offset + 4 > len(buf):
+                    break
+                offset += 1
+                continue
+            main_data_begin = mp3_main_data_begin(buf, offset)
+            if main_data_begin is None:
+                break
+            if main_data_begin == 0:
+                self._ready_end = offset
+                self._ready_ms = self._frames_ms
+            length, duration = header
+            if offset + length > len(buf):
+                break
+            offset += length
+            self._frames_ms += duration
+        self._scan_offset = offset
+
+    def next_segment(self, timeout=None):
+        """
+        取出下一段可以播放的 MP3 数据。
+
+        Args:
+            timeout (float): 最长等待时间（秒），None 表示一直等待。
+
+        Returns:
+            bytes: 下一段数据；等待超时返回 b''；流已结束（或失败）且没有剩余数据时返回 None。
+        """
+        with self._cond:
+            def ready():
+                if self.failed:
+                    return True
+                if self._consumed == 0 and not self.done:
+                    return self._ready_ms >= self.prebuffer_ms
+                return self._ready_end > self._consumed or self.done
+
+            if not self._cond.wait_for(ready, timeout):
+                return b''
+            if self.failed or self._ready_end <= self._consumed:
+                return None
+            segment = bytes(self._buffer[self._consumed:self._ready_end])
+            self._consumed = self._ready_end
+            return segment
+
+    def mark_first_sound(self, at=None):
+        """记录开始出声的时间（time.monotonic），at 为 None 时取当前时间。"""
+        if self.first_sound_at is None:
+            self.first_sound_at = time.monotonic() if at is None else at
+
+    @property
+    def time_to_first_byte(self):
+        """从请求开始到收到第一个字节的毫秒数。"""
+        if self.first_byte_at is None:
+            return None
+        return (self.first_byte_at - self.started_at) * 1000
+
+    @property
+    def time_to_first_sound(self):
+        """从请求开始到开始出声的毫秒数。"""
+        if self.first_sound_at is None:
+            return None
+        return (self.first_sound_at - self.started_at) * 1000
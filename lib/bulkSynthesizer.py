@@ -0,0 +1,284 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+
+from lib.metrics import RollingHistogram
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.tokenBucket import TokenBucket
+from lib.ttsEngine import get_audio_cache, get_cache_key, normalize_text, synthesize_to_cache, utterance_parts
+
+# JSONL 语料中可以逐行覆盖的语音配置
+ENTRY_OVERRIDES = {'voice': 'VOICE', 'voice_style': 'VOICE_STYLE', 'speed': 'SPEED', 'pitch': 'PITCH'}
+
+
+def read_corpus(path):
+    """
+    逐行读取语料。
+
+    .jsonl 文件每行是一个对象，"text" 为文本，可选的 voice、voice_style、speed、pitch 覆盖该行的语音配置；
+    其他文件每行是一条文本。空行和以 # 开头的行被忽略。
+
+    Yields:
+        tuple: (行号, 文本, 覆盖的配置 dict)；JSONL 行无法解析时文本为 None，第三项为错误信息。
+    """
+    jsonl = str(path).endswith('.jsonl')
+    with open(path, encoding='utf-8-sig') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not jsonl:
+                yield number, line, {}
+                continue
+            try:
+                entry = json.loads(line)
+                text = str(entry['text']).strip()
+            except (ValueError, KeyError, TypeError) as e:
+                yield number, None, f'invalid entry: {e}'
+                continue
+            overrides = {ENTRY_OVERRIDES[k]: v for k, v in entry.items() if k in ENTRY_OVERRIDES}
+            yield number, text, overrides
+
+
+class BulkSynthesizer:
+    """
+    把一个语料文件中的所有文本预先合成进缓存。
+
+    每行按与 text_to_speech 相同的方式规范化、切分并计算缓存键，已经在缓存中（或本次已经提交过）的片段跳过，
+    其余片段以有限的并发数合成，每个合成请求发出前先从令牌桶取得令牌。
+    进度定期写入检查点文件：记录已经完成的行，中断后再次运行时直接跳过这些行。
+    语料文件或影响缓存键的配置（语音、规范化规则、分句）变化后，旧的检查点作废。
+    后处理（POSTPROCESS）不在这里进行，第一次播放时才处理。
+    """
+
+    def __init__(self, config, corpus_path, checkpoint_path=None, concurrency=4, rate=0.0, burst=1,
+                 checkpoint_interval=2.0):
+        """
+        Args:
+            config: TTS 配置对象。
+            corpus_path (str): 语料文件（.txt 或 .jsonl）。
+            checkpoint_path (str): 检查点文件，None 表示语料文件名加 .progress.json。
+            concurrency (int): 同时进行的合成请求数。
+            rate (float): 每秒最多发出的合成请求数，0 表示不限速。
+            burst (int): 允许连续发出的请求数。
+            checkpoint_interval (float): 写入检查点的最短间隔（秒）。
+        """
+        self.config = config
+        self.corpus_path = corpus_path
+        self.checkpoint_path = checkpoint_path or f'{corpus_path}.progress.json'
+        self.concurrency = concurrency
+        self.checkpoint_interval = checkpoint_interval
+        self._bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._save_lock = threading.Lock()
+
+    def _fingerprint(self, config):
+        stat = os.stat(self.corpus_path)
+        settings = [os.path.abspath(self.corpus_path), stat.st_size, stat.st_mtime_ns, config.VOICE,
+                    config.VOICE_STYLE, config.SPEED, config.PITCH, config.CHUNKING, config.CHUNK_MIN_LENGTH,
+                    config.FIXED_COLLOCATION, config.WORD_REPLACEMENT]
+        return hashlib.md5(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _load_checkpoint(self, fingerprint):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0, set()
+        if data.get('fingerprint') != fingerprint:
+            return 0, set()
+        return data.get('next_line', 0), set(data.get('done', []))
+
+    def _save_checkpoint(self):
+        with self._save_lock:
+            with self._lock:
+                data = {
+                    'fingerprint': self._fingerprint_value,
+                    'next_line': self._next_line,
+                    'done': sorted(self._done),
+                    'failed': {str(number): error for number, error in self._failed_lines.items()},
+                }
+                self._saved_at = time.monotonic()
+            temp_path = f'{self.checkpoint_path}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.checkpoint_path)
+
+    def _finish_line(self, number, error=None):
+        # 调用方持有 self._lock
+        if error is None:
+            self._done.add(number)
+            # next_line 之前（含）的行全部完成，只需记录它之后完成的行
+            while self._cursor < len(self._order) and self._order[self._cursor] in self._done:
+                self._next_line = self._order[self._cursor]
+                self._done.discard(self._next_line)
+                self._cursor += 1
+        else:
+            self._failed_lines[number] = error
+            if len(self.failures) < 20:
+                self.failures.append((number, self._lines.get(number), error))
+
+    def _synthesize(self, part, config, key):
+        start = time.perf_counter()
+        synthesize_to_cache(part, config, key)
+        ms = (time.perf_counter() - start) * 1000
+        ok = key in get_audio_cache(config)
+        with self._lock:
+            if ok:
+                self.latency.observe(ms)
+        return ok
+
+    def _part_done(self, key, future):
+        ok = not future.cancelled() and future.exception() is None and future.result()
+        error = None if ok else ('cancelled' if future.cancelled() else str(future.exception() or 'synthesis failed'))
+        with self._lock:
+            self._in_flight -= 1
+            if ok:
+                self.synthesized += 1
+            else:
+                self.failed += 1
+            for number in self._waiting.pop(key, ()):
+                self._remaining[number] -= 1
+                if error is not None:
+                    self._line_errors.setdefault(number, error)
+                if self._remaining[number] == 0:
+                    del self._remaining[number]
+                    self._finish_line(number, self._line_errors.pop(number, None))
+            self._idle.notify_all()
+        if time.monotonic() - self._saved_at >= self.checkpoint_interval:
+            self._save_checkpoint()
+
+    def run(self, restart=False, stop=None):
+        """
+        合成语料中缺失的条目，直到全部完成或 stop 被设置（或收到 KeyboardInterrupt）。
+
+        Args:
+            restart (bool): 忽略已有的检查点，从头开始。
+            stop (threading.Event): 可选，被设置时不再发出新的请求，等待进行中的请求完成后返回。
+
+        Returns:
+            dict: 汇总信息，见 summary()。
+        """
+        stop = stop or threading.Event()
+        config = self.config.snapshot()
+        config.POSTPROCESS = False
+        cache = get_audio_cache(config)
+        executor = SynthesisExecutor(self.concurrency, self.concurrency)
+        slots = threading.Semaphore(self.concurrency * 2)
+
+        self._fingerprint_value = self._fingerprint(config)
+        self._next_line, self._done = (0, set()) if restart else self._load_checkpoint(self._fingerprint_value)
+        self._failed_lines = {}
+        self._lines = {}  # {行号: 文本}，本次运行中处理的行
+        self._order = []  # 按读取顺序排列的行号
+        self._cursor = 0
+        self._remaining = {}  # {行号: 还没有完成的片段数}
+        self._line_errors = {}
+        self._waiting = {}  # {缓存键: [等待它的行号]}
+        self._in_flight = 0
+        self._saved_at = time.monotonic()
+        self.latency = RollingHistogram(window=100000)
+        self.lines = self.skipped = self.cached = self.requested = self.synthesized = self.failed = 0
+        self.failures = []  # [(行号, 文本, 原因)]，最多 20 条
+        self.interrupted = False
+
+        configs = {}
+        start = time.perf_counter()
+        try:
+            for number, text, overrides in read_corpus(self.corpus_path):
+                if stop.is_set():
+                    self.interrupted = True
+                    break
+                with self._lock:
+                    self.lines += 1
+                    self._lines[number] = text
+                    self._order.append(number)
+                    if number <= self._next_line or number in self._done:
+                        self.skipped += 1
+                        self._finish_line(number)
+                        continue
+                    if text is None:
+                        self.failed += 1
+                        self._finish_line(number, overrides)
+                        continue
+
+                override_key = tuple(sorted(overrides.items()))
+                entry_config = configs.get(override_key)
+                if entry_config is None:
+                    entry_config = copy.copy(config)
+                    entry_config.__dict__.update(overrides)
+                    configs[override_key] = entry_config
+
+                missing = []
+                with self._lock:
+                    for part in utterance_parts(normalize_text(text, entry_config), entry_config):
+                        key = get_cache_key(part, entry_config)
+                        if key in self._waiting:
+                            self._waiting[key].append(number)
+                            self._remaining[number] = self._remaining.get(number, 0) + 1
+                        elif key in cache:
+                            self.cached += 1
+                        else:
+                            self._waiting[key] = [number]
+                            self._remaining[number] = self._remaining.get(number, 0) + 1
+                            missing.append((key, part))
+                    if number not in self._remaining:
+                        self._finish_line(number)
+
+                for key, part in missing:
+                    slots.acquire()
+                    if not self._bucket.take(stop):
+                        slots.release()
+                        self.interrupted = True
+                        break
+                    with self._lock:
+                        self.requested += 1
+                        self._in_flight += 1
+                    future = executor.submit(self._synthesize, part, entry_config, key,
+                                             priority=SynthesisExecutor.INTERACTIVE, key=key)
+                    future.add_done_callback(lambda f: slots.release())
+                    future.add_done_callback(lambda f, k=key: self._part_done(k, f))
+                if self.interrupted:
+                    break
+        except KeyboardInterrupt:
+            stop.set()
+            self.interrupted = True
+
+        if self.interrupted:
+            # 撤回还在排队的请求，对应的行下次运行时重新处理
+            executor.shutdown()
+        # 等待已经开始的请求完成，再写入最后的检查点
+        with self._lock:
+            while self._in_flight > 0:
+                self._idle.wait(1.0)
+        executor.shutdown()
+        self.elapsed = time.perf_counter() - start
+        self._save_checkpoint()
+        return self.summary()
+
+    def summary(self):
+        """
+        Returns:
+            dict: lines（读到的行数）、skipped（按检查点跳过的行数）、cached（已在缓存中的片段数）、
+                  requested、synthesized、failed、elapsed_s、throughput（每秒合成的片段数）、
+                  latency_ms（每个合成请求耗时的分布）、interrupted，以及最多 20 条 failures。
+        """
+        with self._lock:
+            return {
+                'lines': self.lines,
+                'skipped': self.skipped,
+                'cached': self.cached,
+                'requested': self.requested,
+                'synthesized': self.synthesized,
+                'failed': self.failed,
+                'elapsed_s': round(self.elapsed, 3),
+                'throughput': round(self.synthesized / self.elapsed, 3) if self.elapsed else 0.0,
+                'latency_ms': self.latency.summary(),
+                'interrupted': self.interrupted,
+                'failures': [{'line': number, 'text': text, 'error': error}
+                             for number, text, error in self.failures],
+            }
@@ -0,0 +1,174 @@
+import threading
+
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.ttsEngine import (get_audio_cache, get_cache_key, get_synthesis_executor, normalize_text,
+                           synthesize_to_cache, utterance_parts)
+
+
+def collect_prewarm_texts(config, hotkey_manager=None):
+    """
+    收集需要预热的文本：所有快捷键的文本和所有缩写词。
+
+    Args:
+        config: TTS 配置对象。
+        hotkey_manager: GlobalHotkeyManager，可以为 None。
+
+    Returns:
+        list: 原始文本（尚未规范化）。
+    """
+    texts = [collocation["before"] for collocation in config.FIXED_COLLOCATION]
+    if hotkey_manager is not None:
+        texts.extend(hotkey_manager.hotkeys.values())
+    return texts
+
+
+class CachePrewarmer:
+    """
+    后台缓存预热。
+
+    把给定文本按照与 text_to_speech 相同的方式规范化、切分并计算缓存键，
+    缺失的条目以 PREFETCH 优先级提交到共享的合成线程池：用户请求总是排在前面，
+    预热最多占用 PREWARM_WORKERS 个线程，与用户请求相同的缓存键会被合并为一次合成。
+    每次 start() 开始新的一轮，上一轮还在排队的请求被撤回（已经有用户请求合并进来的除外）。
+    """
+
+    def __init__(self, config, texts_provider, on_progress=None):
+        """
+        Args:
+            config: TTS 配置对象。
+            texts_provider (callable): 无参函数，返回需要预热的文本列表。
+            on_progress (callable): 可选，每处理完一个条目时以 status() 的结果为参数调用。
+        """
+        self.config = config
+        self.texts_provider = texts_provider
+        self.on_progress = on_progress
+        self.requested = 0  # 所有轮次累计提交的合成请求数
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._submitted = []  # [(线程池, 缓存键, Future)]，当前这一轮提交的请求
+        self._done = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self.cached = 0
+        self.synthesized = 0
+        self.failures = []  # [(文本, 原因)]
+        self._pending = 0
+        self._done.clear()
+
+    def attach(self, *sources):
+        """在 Config 或 GlobalHotkeyManager 重新加载后自动重新预热。"""
+        for source in sources:
+            source.add_reload_listener(lambda _source: self.start())
+
+    def start(self):
+        """在后台收集文本并开始新一轮预热。"""
+        threading.Thread(target=self._plan, daemon=True).start()
+
+    def _plan(self):
+        texts = self.texts_provider()
+        config = self.config.snapshot()
+        cache = get_audio_cache(config)
+
+        # 与 text_to_speech 相同的规范化和切分，按缓存键去重
+        parts = {}
+        for text in texts:
+            for part in utterance_parts(normalize_text(text, config), config):
+                parts.setdefault(get_cache_key(part, config), part)
+
+        self._cancel_submitted()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._reset()
+            self.total = len(parts)
+            missing = []
+            for key, part in parts.items():
+                if key in cache:
+                    self.cached += 1
+                else:
+                    missing.append((key, part))
+            self._pending = len(missing)
+            self.requested += len(missing)
+            if not missing:
+                self._done.set()
+        executor = get_synthesis_executor(config)
+        for key, part in missing:
+            # 提交过程中被 cancel() 或新的一轮取代时不再提交；撤回会触发完成回调，不能持有 self._lock 提交
+            future = executor.submit(synthesize_to_cache, part, config, key,
+                                     priority=SynthesisExecutor.PREFETCH, key=key)
+            with self._lock:
+                current = generation == self._generation
+                if current:
+                    self._submitted.append((executor, key, future))
+            if not current:
+                executor.cancel(key, future)
+                break
+            future.add_done_callback(lambda f, g=generation, k=key, p=part: self._warmed(g, k, p, f))
+        self._notify()
+
+    def _warmed(self, generation, key, part, future):
+        if future.cancelled():
+            error = 'cancelled'
+        elif future.exception() is not None:
+            error = str(future.exception())
+        elif key not in get_audio_cache(self.config):
+            error = 'synthesis failed'
+        else:
+            error = None
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            if error is None:
+                self.synthesized += 1
+            else:
+                self.failures.append((part, error))
+            self._pending -= 1
+            if self._pending == 0:
+                self._done.set()
+        self._notify()
+
+    def _notify(self):
+        if self.on_progress is not None:
+            self.on_progress(self.status())
+
+    def cancel(self):
+        """停止当前这一轮预热：撤回还在排队的合成请求，不再统计进度。正在进行的请求会继续完成。"""
+        with self._lock:
+            self._generation += 1
+            self._done.set()
+        self._cancel_submitted()
+
+    def _cancel_submitted(self):
+        with self._lock:
+            submitted, self._submitted = self._submitted, []
+        for executor, key, future in submitted:
+            if not future.done():
+                executor.cancel(key, future)
+
+    def wait(self, timeout=None):
+        """等待当前这一轮预热结束，返回是否已结束。"""
+        return self._done.wait(timeout)
+
+    def status(self):
+        """
+        返回当前这一轮预热的进度。
+
+        Returns:
+            dict: total（需要的条目数）、cached（本来就在缓存中）、synthesized（本轮合成）、
+                  failed（失败数）、pending（尚未处理）、running（是否仍在进行）。
+        """
+        with self._lock:
+            return {
+                'total': self.total,
+                'cached': self.cached,
+                'synthesized': self.synthesized,
+                'failed': len(self.failures),
+                'pending': self._pending,
+                'running': not self._done.is_set(),
+            }
+
+    def shutdown(self):
+        self.cancel()
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+
+from lib.cachePrewarmer import CachePrewarmer
+from lib.ttsEngine import get_audio_cache, get_cache_key, get_phrase_index, normalize_text, utterance_parts, voice_scope
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _keys(text, config):
+    """text 在 config 下对应的全部缓存键。"""
+    return {get_cache_key(part, config) for part in utterance_parts(normalize_text(text, config), config)}
+
+
+def _key_settings(config):
+    """决定缓存键以及条目存放位置的设置；这些都没有变化时，配置变化不会让任何条目过期。"""
+    return (config.FIXED_COLLOCATION, config.WORD_REPLACEMENT, config.VOICE, config.VOICE_STYLE, config.SPEED,
+            config.PITCH, config.CHUNKING, config.CHUNK_MIN_LENGTH, config.CACHE_BACKEND, config.STORED_FILEPATH)
+
+
+class ConfigWatcher:
+    """
+    监视配置文件，文件变化后自动重新加载。
+
+    后台线程每隔 interval 秒对 Config 的三个文件和快捷键文件做一次 stat，只比较修改时间和大小，
+    空闲时几乎没有开销（不依赖 inotify，Windows 上同样可用）。发现变化后等文件写完，
+    只重新加载变化的那个文件、只重新编译它对应的规则（Config.reload_file），
+    快捷键文件则交给 GlobalHotkeyManager.reload_shortcuts()。
+
+    重新加载之后用 PhraseIndex 中在旧的语音设置下记录的原始文本和快捷键、缩写词文本，分别按新旧配置计算缓存键，
+    找出新配置下再也不会被查到的缓存条目（过期条目）：总是打印报告，可选删除这些条目，
+    也可选按新配置重新合成最近用过的文本。其他音色下记录的条目不受影响；
+    不影响缓存键的改动（例如快捷键、网络设置）不做检查。
+    """
+
+    SETTLE_SECONDS = 0.1
+
+    def __init__(self, config, hotkey_manager=None, texts_provider=None, interval=1.0,
+                 gc_stale=False, rewarm_stale=True, max_rewarm=200):
+        """
+        Args:
+            config: TTS 配置对象。
+            hotkey_manager: GlobalHotkeyManager，可以为 None。
+            texts_provider (callable): 可选，无参函数，返回除历史记录外也需要保留的文本（例如快捷键和缩写词）。
+            interval (float): 检查间隔（秒）。
+            gc_stale (bool): 是否删除过期的缓存条目。
+            rewarm_stale (bool): 是否按新配置重新合成受影响的历史文本。
+            max_rewarm (int): 每次最多重新合成的文本数，最近使用的优先。
+        """
+        self.config = config
+        self.hotkey_manager = hotkey_manager
+        self.texts_provider = texts_provider or (lambda: [])
+        self.interval = interval
+        self.gc_stale = gc_stale
+        self.rewarm_stale = rewarm_stale
+        self.max_rewarm = max_rewarm
+        self.last_report = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._rewarmer = None
+        self._stats = {path: _stat(path) for path in self._paths()}
+
+    @classmethod
+    def from_config(cls, config, hotkey_manager=None, texts_provider=None):
+        """根据 Config 对象创建监视器。"""
+        return cls(config, hotkey_manager, texts_provider, config.CONFIG_WATCH_INTERVAL,
+                   config.CACHE_GC_STALE, config.CACHE_REWARM_STALE)
+
+    def _paths(self):
+        paths = [os.path.abspath(path) for path in self.config.config_paths]
+        if self.hotkey_manager is not None:
+            paths.append(os.path.abspath(self.hotkey_manager.shortcut_file))
+        return paths
+
+    def start(self):
+        """在后台线程中开始监视。"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._rewarmer is not None:
+            self._rewarmer.shutdown()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Config watcher error: {e}")
+
+    def check(self):
+        """
+        检查一次配置文件，重新加载发生变化的文件。
+
+        Returns:
+            list: 本次重新加载的文件路径。
+        """
+        with self._lock:
+            changed = [path for path in self._paths() if _stat(path) != self._stats.get(path)]
+            if not changed:
+                return []
+            # 编辑器保存时可能分几次写入，等文件稳定下来再读
+            time.sleep(self.SETTLE_SECONDS)
+            reloaded = []
+            for path in changed:
+                stat = _stat(path)
+                self._stats[path] = stat
+                if stat is not None and self._reload(path):
+                    reloaded.append(path)
+            return reloaded
+
+    def _reload(self, path):
+        old = self.config.snapshot()
+        try:
+            if self.hotkey_manager is not None and path == os.path.abspath(self.hotkey_manager.shortcut_file):
+                self.hotkey_manager.reload_shortcuts()
+                part = 'shortcut_key'
+            else:
+                part = self.config.reload_file(path)
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError 也是 ValueError；解析失败时继续使用旧配置
+            print(f"Failed to reload {path}, keeping the previous configuration: {e}")
+            return False
+        print(f"Reloaded {part} from {path}")
+        self._invalidate(old, self.config.snapshot(), part)
+        return True
+
+    def _invalidate(self, old, new, part):
+        if _key_settings(old) == _key_settings(new):
+            self.last_report = {'part': part, 'stale': 0, 'missing': 0, 'removed': 0, 'rewarming': 0}
+            return self.last_report
+        cache = get_audio_cache(new)
+        phrases = get_phrase_index(new)
+        recorded = phrases.items(voice_scope(old))
+        extra = list(self.texts_provider())
+
+        # 候选：历史记录中的所有缓存键，以及其他文本在旧配置下的缓存键
+        candidates = {key for key, _, _ in recorded}
+        for text in extra:
+            candidates |= _keys(text, old)
+
+        # 新配置下仍然会被用到的缓存键；同时找出新配置下缺失的历史文本，最近使用的在前
+        live = set()
+        missing = []
+        for text in dict.fromkeys([text for _, text, _ in recorded] + extra):
+            keys = _keys(text, new)
+            live |= keys
+            if not all(key in cache for key in keys):
+                missing.append(text)
+
+        stale = sorted(key for key in candidates - live if key in cache)
+        report = {'part': part, 'stale': len(stale), 'missing': len(missing), 'removed': 0, 'rewarming': 0}
+        if stale and self.gc_stale:
+            for key in stale:
+                cache.discard(key)
+            phrases.forget(stale)
+            report['removed'] = len(stale)
+        if missing and self.rewarm_stale:
+            texts = missing[:self.max_rewarm]
+            if self._rewarmer is not None:
+                self._rewarmer.shutdown()
+            self._rewarmer = CachePrewarmer(self.config, lambda: texts)
+            self._rewarmer.start()
+            report['rewarming'] = len(texts)
+        self.last_report = report
+        print(f"Config change made {report['stale']} cache entries stale "
+              f"({report['removed']} removed), {report['missing']} texts need synthesis "
+              f"({report['rewarming']} re-warming).")
+        return report
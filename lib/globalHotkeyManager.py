@@ -1,7 +1,11 @@
 import json
+import threading
 from pynput import keyboard
 from pathlib import Path
-from lib.ttsEngine import text_to_speech
+from lib.metrics import Trace
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.tokenBucket import TokenBucket
+from lib.ttsEngine import PreparedSpeech, preload_prepared, speak_prepared, text_to_speech
 
 
 class GlobalHotkeyManager:
@@ -16,8 +20,16 @@ class GlobalHotkeyManager:
         self.config = config
         self.shortcut_file = Path(shortcut_file)
         self.hotkeys = {}  # 存储 {快捷键字符串: 文本} 的字典
+        self.replace_keys = set()  # 使用 latest-wins 的快捷键：新触发的语音取代还没播放的旧语音
         self.listener = None
+        self._bucket = None
+        self._bucket_settings = None
+        self._reload_listeners = []
+        self._prepared = {}  # {快捷键字符串: PreparedSpeech}，按下时直接播放缓存
+        self._prepare_lock = threading.Lock()
         self._load_shortcuts()
+        # 规范化规则或语音配置变化后重新准备受影响的快捷键
+        config.add_reload_listener(lambda _config: self._prepare())
 
     def _load_shortcuts(self):
         """从 JSON 文件加载快捷键配置。"""
@@ -33,17 +45,48 @@ class GlobalHotkeyManager:
                 # 验证数据结构
                 if not isinstance(data, list):
                     raise ValueError("Shortcut file must contain a JSON array of objects.")
-                self.hotkeys = {}
+                hotkeys = {}
+                replace_keys = set()
                 for item in data:
                     if not isinstance(item, dict) or 'key' not in item or 'text' not in item:
                         print(f"Invalid shortcut item: {item}. Skipping.")
                         continue
                     key_str = item['key']
                     text = item['text']
-                    self.hotkeys[key_str] = text
+                    hotkeys[key_str] = text
+                    if item.get('replace'):
+                        replace_keys.add(key_str)
                     print(f"Loaded shortcut: {key_str} -> '{text}'")
+            # 整体替换：触发中的快捷键要么看到旧配置要么看到新配置；文件有误时保留旧配置
+            self.hotkeys = hotkeys
+            self.replace_keys = replace_keys
         except Exception as e:
             print(f"Error loading shortcut file {self.shortcut_file}: {e}")
+            return
+        self._prepare()
+
+    def _prepare(self):
+        """
+        预先规范化快捷键文本并计算缓存键。文本和相关配置都没有变化的快捷键沿用之前的结果，
+        新准备的快捷键如果已经在缓存中，在后台解码进内存缓存。
+        """
+        with self._prepare_lock:
+            config = self.config.snapshot()
+            prepared = {}
+            rebuilt = []
+            for key_str, text in self.hotkeys.items():
+                old = self._prepared.get(key_str)
+                if old is not None and old.text == text and old.is_current(config):
+                    prepared[key_str] = old
+                    continue
+                try:
+                    prepared[key_str] = PreparedSpeech(text, config)
+                except Exception as e:
+                    print(f"Failed to prepare shortcut {key_str}: {e}")
+                    continue
+                rebuilt.append(prepared[key_str])
+            self._prepared = prepared
+        preload_prepared(rebuilt)
 
     def _create_example_file(self):
         """创建一个示例快捷键文件。"""
@@ -66,15 +109,37 @@ class GlobalHotkeyManager:
         Args:
             key_str (str): 被按下的快捷键字符串（如 "<ctrl>+a"）。
         """
-        if key_str in self.hotkeys:
-            text_to_speak = self.hotkeys[key_str]
+        text_to_speak = self.hotkeys.get(key_str)
+        if text_to_speak is not None:
+            # 从按下快捷键开始计时，一直到开始出声
+            trace = Trace('hotkey', key_str)
+            # 连续狂按时超出速率的触发直接忽略，不进入合成和播放队列
+            if not self._rate_limiter().try_take():
+                print(f"Global Hotkey rate limited: {key_str}")
+                trace.finish(dropped='rate_limited')
+                return
             print(f"Global Hotkey Triggered: {key_str} -> '{text_to_speak}'")
             # 调用 TTS 引擎播放语音
-            # 注意: ttsEngine.text_to_speech 是异步的（使用了线程），所以这里不会阻塞
-            text_to_speech(text_to_speak, self.config)
+            # 注意: ttsEngine.text_to_speech 是异步的（在分派线程中查缓存，未命中时提交到合成线程池），所以这里不会阻塞
+            replace = f'hotkey:{key_str}' if key_str in self.replace_keys else None
+            # 快捷键语音已经在缓存中时直接加入播放队列；否则（第一次使用、还在预热）走完整流程合成
+            prepared = self._prepared.get(key_str)
+            if prepared is not None and prepared.text == text_to_speak and \
+                    speak_prepared(prepared, SynthesisExecutor.HOTKEY, trace, self.config.HOTKEY_TTL, replace):
+                return
+            text_to_speech(text_to_speak, self.config, SynthesisExecutor.HOTKEY, trace,
+                           self.config.HOTKEY_TTL, replace)
         else:
             print(f"Unexpected hotkey triggered: {key_str}")
 
+    def _rate_limiter(self):
+        """返回按当前配置创建的令牌桶，配置被重新加载、限速设置变化时重建。"""
+        settings = (self.config.HOTKEY_MAX_RATE, self.config.HOTKEY_BURST)
+        if self._bucket is None or self._bucket_settings != settings:
+            self._bucket = TokenBucket(*settings)
+            self._bucket_settings = settings
+        return self._bucket
+
     def start(self):
         """启动全局热键监听器。"""
         if self.listener is not None:
@@ -114,12 +179,18 @@ class GlobalHotkeyManager:
             self.listener = None
             print("Global hotkey listener stopped.")
 
+    def add_reload_listener(self, listener):
+        """注册一个回调，在每次 reload_shortcuts() 之后以管理器为参数调用。"""
+        self._reload_listeners.append(listener)
+
     def reload_shortcuts(self):
         """重新加载快捷键配置文件。"""
         old_hotkeys = self.hotkeys.copy()
         self._load_shortcuts()
-        # 如果快捷键有变化，需要重启监听器
-        if self.listener and old_hotkeys != self.hotkeys:
+        for listener in self._reload_listeners:
+            listener(self)
+        # 文本在触发时才查找，只有快捷键组合本身变化时才需要重启监听器
+        if self.listener and old_hotkeys.keys() != self.hotkeys.keys():
             print("Shortcut configuration changed. Restarting listener...")
             self.stop()
             self.start()
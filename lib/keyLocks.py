@@ -0,0 +1,309 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from lib.metrics import registry
+
+
+def pid_alive(pid):
+    """
+    返回本机上的进程 pid 是否仍在运行。无法判断时视为仍在运行。
+
+    Windows 上 os.kill(pid, 0) 会结束目标进程，因此改用 OpenProcess 查询。
+    """
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x00100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED：进程存在但无权访问
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT：尚未退出
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class OwnerLock:
+    """
+    由操作系统维护的独占文件锁（POSIX 上是 fcntl.flock，Windows 上是 msvcrt.locking）。
+
+    持有的进程退出或崩溃时操作系统自动释放，不依赖 pid 判断锁是否过期，因此适合在进程整个生命周期内持有的锁。
+    锁文件本身不删除，只是加锁的对象。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    def acquire(self):
+        """
+        不等待地尝试加锁。
+
+        Returns:
+            bool: 取得锁时返回 True，锁被其他进程（或本进程的另一个 OwnerLock）持有时返回 False。
+        """
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            f.close()
+
+
+class Lease:
+    """KeyLocks.acquire() 取得的锁，release() 或离开 with 块时删除锁文件。"""
+
+    def __init__(self, path, token, locks=None):
+        self.path = path
+        self.token = token
+        self._locks = locks
+
+    def refresh(self):
+        """锁仍属于自己时更新锁文件的修改时间，重新开始计算租约。"""
+        owner = KeyLocks._read_owner(self.path)
+        if owner and owner.get('token') == self.token:
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    def release(self):
+        if self._locks is not None:
+            self._locks._forget(self)
+        # 只删除自己的锁：租约过期后锁可能已经被其他进程回收并重新创建
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                owner = json.load(f)
+        except (OSError, ValueError):
+            return
+        if owner.get('token') == self.token:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class KeyLocks:
+    """
+    同一缓存目录下按键互斥的锁文件，用于多个进程（多个窗口实例、服务模式、批量合成）共享一个缓存目录时，
+    保证同一个键只由一个进程合成，其他进程等它写入缓存后直接使用。
+
+    锁文件 locks/<键>.lock 以 O_CREAT | O_EXCL 创建，内容是持有者的主机名、pid 和随机令牌。
+    持有者崩溃后留下的锁在以下情况视为过期并被回收：同一台机器上持有的进程已经退出，
+    或者锁文件超过租约 lease 秒没有更新。持有期间后台线程每 lease/3 秒刷新一次锁文件的修改时间，
+    因此合成（连同重试）比租约还长时锁也不会被其他进程当作过期回收。锁只用于避免重复合成；缓存文件本身通过临时文件加重命名
+    原子写入，即使两个进程回收同一把过期锁、各自合成了一次，读者也不会读到半截文件。
+    """
+
+    DIRECTORY_NAME = 'locks'
+
+    def __init__(self, directory, lease=60.0, poll_interval=0.05):
+        """
+        Args:
+            directory (str): 缓存目录，锁文件放在其中的 locks 子目录。
+            lease (float): 租约时长（秒），超过后锁视为过期；None 表示只在持有进程退出后过期。
+            poll_interval (float): 等待其他进程释放锁时的轮询间隔（秒）。
+        """
+        self.directory = Path(directory) / self.DIRECTORY_NAME
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.host = socket.gethostname()
+        self.acquired = 0
+        self.waited = 0
+        self.recovered = 0
+        self._lock = threading.Lock()
+        self._held = set()  # 本进程持有、需要刷新的 Lease
+        self._heartbeat = None
+
+    def path_for(self, key):
+        return self.directory / f'{key}.lock'
+
+    def acquire(self, key, ready=None, timeout=None):
+        """
+        取得 key 的锁。锁被其他进程持有时等待，直到它被释放或过期。
+
+        Args:
+            key (str): 缓存键。
+            ready (callable): 可选，等待期间反复调用，返回 True（其他进程已经完成）时不再等待。
+            timeout (float): 最长等待秒数，None 表示不限（过期的锁总会被回收）。
+
+        Returns:
+            Lease: 取得锁时返回；ready() 返回 True 或超时时返回 None。
+        """
+        path = self.path_for(key)
+        start = time.monotonic()
+        waited = False
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._recover_if_stale(path):
+                    continue
+                if not waited:
+                    waited = True
+                    with self._lock:
+                        self.waited += 1
+                if ready is not None and ready():
+                    break
+                if timeout is not None and time.monotonic() - start >= timeout:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'host': self.host, 'pid': os.getpid(), 'token': token, 'time': time.time()}, f)
+            lease = Lease(path, token, self)
+            with self._lock:
+                self.acquired += 1
+                if self.lease is not None:
+                    self._held.add(lease)
+                    if self._heartbeat is None:
+                        self._heartbeat = threading.Thread(target=self._refresh_held, name='cache-lock-heartbeat',
+                                                           daemon=True)
+                        self._heartbeat.start()
+            if waited:
+                registry.observe('cache.lock_wait_ms', (time.monotonic() - start) * 1000)
+            return lease
+        if waited:
+            registry.observe('cache.lock_wait_ms', (time.monotonic() - start) * 1000)
+        return None
+
+    def _forget(self, lease):
+        with self._lock:
+            self._held.discard(lease)
+
+    def _refresh_held(self):
+        """心跳线程：定期刷新持有中的锁，没有持有的锁时退出，下次取得锁时重新启动。"""
+        while True:
+            time.sleep(self.lease / 3)
+            with self._lock:
+                if not self._held:
+                    self._heartbeat = None
+                    return
+                held = list(self._held)
+            for lease in held:
+                lease.refresh()
+
+    def _recover_if_stale(self, path):
+        """锁已经不存在或已过期（并被本调用删除）时返回 True。"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+        owner = self._read_owner(path)
+        if owner is False:
+            return True
+        stale = self.lease is not None and time.time() - stat.st_mtime > self.lease
+        if owner is not None and owner.get('host') == self.host and not pid_alive(owner.get('pid', -1)):
+            stale = True
+        if not stale:
+            return False
+        # 先改名再删除：多个进程同时回收时只有一个能改名成功
+        removed = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.stale')
+        try:
+            os.replace(path, removed)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+        # 判断过期之后、改名之前，锁可能已经被其他进程回收并重新创建：改名拿到的必须是判断过的那个文件
+        try:
+            renamed = os.stat(removed)
+        except OSError:
+            return False
+        if (renamed.st_ino, renamed.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns) or \
+                self._read_owner(removed) != owner:
+            self._restore(removed, path)
+            return False
+        try:
+            os.remove(removed)
+        except OSError:
+            pass
+        print(f"Recovered stale cache lock {path.name}.")
+        with self._lock:
+            self.recovered += 1
+        return True
+
+    @staticmethod
+    def _read_owner(path):
+        """返回锁文件记录的持有者；文件已经不存在时返回 False，内容还没写完时返回 None。"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _restore(removed, path):
+        """把误改名的有效锁放回原处。原处已经又有新锁时放弃，原持有者释放时会因令牌不符而不删除新锁。"""
+        try:
+            os.link(removed, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # 不支持硬链接的文件系统：原处没有文件时直接改名回去
+            if not os.path.exists(path):
+                try:
+                    os.replace(removed, path)
+                    return
+                except OSError:
+                    pass
+        try:
+            os.remove(removed)
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        Returns:
+            dict: acquired（取得锁的次数）、waited（因其他进程持有而等待的次数）、recovered（回收的过期锁数）。
+        """
+        with self._lock:
+            return {'acquired': self.acquired, 'waited': self.waited, 'recovered': self.recovered}
@@ -31,12 +31,22 @@ class DraggableWindow(tk.Tk):
 
 
 class TTSApp:
-    def __init__(self, root, hotkey_manager, func, *args):
+    def __init__(self, root, hotkey_manager, func, *args, speculator=None, debounce_ms=400):
+        """
+        Args:
+            root: 主窗口。
+            hotkey_manager: GlobalHotkeyManager。
+            func (callable): 提交文本时调用，参数为 (文本, *args)。
+            speculator (SpeculativeSynthesizer): 可选，输入停顿 debounce_ms 毫秒后在后台推测合成当前文本。
+        """
         self.root = root
         self.root.title("tts")
         self.root.geometry("200x120")  # 与您代码中的尺寸一致
         self.root.resizable(False, False)  # 通常这类小工具窗口不可调整大小
         self.hotkey_manager = hotkey_manager
+        self.speculator = speculator
+        self.debounce_ms = debounce_ms
+        self._speculation_job = None
 
         # --- 创建主框架并居中所有内容 ---
         # 使用 place 配合 relx/rely/anchor 是实现居中的常用方法
@@ -86,6 +96,21 @@ class TTSApp:
 
         # --- 绑定回车键提交 ---
         self.text_entry.bind('<Return>', lambda event: self.submit_text(func, *args))
+        # --- 输入停顿后推测合成 ---
+        if self.speculator is not None:
+            self.text_entry.bind('<KeyRelease>', self.schedule_speculation)
+
+    def schedule_speculation(self, event=None):
+        """每次输入后重新计时，输入停顿 debounce_ms 毫秒后才推测合成。"""
+        if event is not None and event.keysym == 'Return':
+            return  # 回车已经提交了文本
+        if self._speculation_job is not None:
+            self.root.after_cancel(self._speculation_job)
+        self._speculation_job = self.root.after(self.debounce_ms, self._speculate)
+
+    def _speculate(self):
+        self._speculation_job = None
+        self.speculator.guess(self.text_entry.get())
 
     def update_shortcut_key(self):
         if self.shortcut_var.get() == 1:
@@ -123,6 +148,11 @@ class TTSApp:
         user_input = self.text_entry.get().strip()
         if user_input:
             # 在这里可以添加调用 TTS 引擎、处理文本等逻辑
+            if self.speculator is not None:
+                if self._speculation_job is not None:
+                    self.root.after_cancel(self._speculation_job)
+                    self._speculation_job = None
+                self.speculator.commit(user_input)
             if func is not None:
                 func(user_input, *args)
             self.text_entry.delete(0, tk.END)  # 清空输入框
@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class Trace:
+    """
+    一次语音请求从触发到出声的分阶段计时。
+
+    各阶段用 lap() 记录：每次调用记下距离上一次 lap 的时间，计时使用 time.perf_counter。
+    """
+
+    __slots__ = ('source', 'label', 'started', 'stages', 'attrs', 'total', '_last', '_finished')
+
+    def __init__(self, source, label=''):
+        """
+        Args:
+            source (str): 请求来源，如 "interactive"、"hotkey"。
+            label (str): 附加说明，如快捷键。
+        """
+        self.source = source
+        self.label = label
+        self.started = time.perf_counter()
+        self.stages = {}  # {阶段: 毫秒}
+        self.attrs = {}
+        self.total = None
+        self._last = self.started
+        self._finished = False
+
+    def lap(self, stage=None):
+        """记录从上一次 lap 到现在的耗时；stage 为 None 时只重置起点。"""
+        now = time.perf_counter()
+        if stage is not None:
+            self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def add(self, stage, ms):
+        """直接记录一个阶段的耗时（毫秒）。"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def finish(self, ahead=0.0, **attrs):
+        """
+        结束计时并提交到 registry。只有第一次调用有效。
+
+        Args:
+            ahead (float): 距离真正出声还有多少秒（音频已排在声道队列中尚未开始时）。
+            **attrs: 附加信息，如 error="..."。
+        """
+        if self._finished:
+            return
+        self._finished = True
+        if ahead > 0:
+            self.stages['playback_wait'] = ahead * 1000
+        self.total = (time.perf_counter() - self.started + ahead) * 1000
+        self.attrs.update(attrs)
+        registry.record_trace(self)
+
+    def to_dict(self):
+        return {
+            'ts': time.time(),
+            'source': self.source,
+            'label': self.label,
+            'total_ms': round(self.total, 3) if self.total is not None else None,
+            'stages': {stage: round(ms, 3) for stage, ms in self.stages.items()},
+            **self.attrs,
+        }
+
+
+class RollingHistogram:
+    """保留最近 window 个样本的延迟分布，记录为 O(1)，只在导出时计算分位数。"""
+
+    def __init__(self, window=1024):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, value):
+        self._samples.append(value)
+        self.count += 1
+
+    def percentile(self, p):
+        """返回窗口内样本的 p 分位数（0 < p < 1），没有样本时返回 None。"""
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    def summary(self):
+        samples = sorted(self._samples)
+        if not samples:
+            return {'count': self.count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+        return {
+            'count': self.count,
+            'mean': round(sum(samples) / len(samples), 3),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'max': round(samples[-1], 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    进程内的指标汇总：滚动延迟直方图、计数器，以及可选的 JSON Lines 输出和本地 HTTP 查询接口。
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._providers = {}
+        self._jsonl = None
+        self._server = None
+
+    def observe(self, name, ms):
+        with self._lock:
+            self._observe_locked(name, ms)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def add_provider(self, name, provider):
+        """注册一个无参函数，其返回的 dict 会出现在 snapshot() 的同名字段中。"""
+        self._providers[name] = provider
+
+    def record_trace(self, trace):
+        with self._lock:
+            for stage, ms in trace.stages.items():
+                self._observe_locked(f'stage.{stage}', ms)
+            if 'error' in trace.attrs:
+                self._counters['errors'] = self._counters.get('errors', 0) + 1
+            elif 'dropped' in trace.attrs:
+                # 被队列策略丢弃的请求没有出声，不计入总耗时
+                name = f"dropped.{trace.attrs['dropped']}"
+                self._counters[name] = self._counters.get(name, 0) + 1
+            else:
+                self._observe_locked('total', trace.total)
+                self._observe_locked(f'total.{trace.source}', trace.total)
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(trace.to_dict(), ensure_ascii=False) + '\n')
+
+    def _observe_locked(self, name, ms):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = RollingHistogram(self.window)
+        histogram.observe(ms)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: latency（各直方图的 count/mean/p50/p95/p99/max，单位毫秒）、counters，以及各 provider 的结果。
+        """
+        with self._lock:
+            result = {
+                'latency': {name: histogram.summary() for name, histogram in sorted(self._histograms.items())},
+                'counters': dict(self._counters),
+            }
+        for name, provider in self._providers.items():
+            try:
+                result[name] = provider()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+        return result
+
+    def open_jsonl(self, path):
+        """把每条完成的 Trace 以 JSON Lines 形式追加写入 path（行缓冲）。"""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+            self._jsonl = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def start_server(self, port, host='127.0.0.1'):
+        """在本地启动 HTTP 接口，GET /metrics 返回 snapshot() 的 JSON。"""
+        if self._server is not None:
+            return self._server
+        # 只有启用了 METRICS_PORT 才需要 http.server，不在启动时加载
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry_ref = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry_ref.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='tts-metrics', daemon=True).start()
+        print(f"Metrics endpoint: http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def configure(self, config):
+        """根据配置打开 JSON Lines 输出和 HTTP 接口。"""
+        if config.METRICS_JSONL_PATH:
+            self.open_jsonl(config.METRICS_JSONL_PATH)
+        if config.METRICS_PORT:
+            self.start_server(config.METRICS_PORT)
+
+    def close(self):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 全局的指标汇总
+registry = MetricsRegistry()
@@ -0,0 +1,616 @@
+import argparse
+import io
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+
+from lib.audioCache import is_complete_mp3
+from lib.keyLocks import OwnerLock
+
+# 每条记录前的头部：魔数、键长度、数据长度，之后是键（UTF-8）和 MP3 数据。
+# 索引丢失时可以顺序扫描这些头部重建索引。
+_RECORD_MAGIC = b'TPK1'
+_RECORD_HEADER = struct.Struct('<4sHI')
+
+
+class ClipReader(io.RawIOBase):
+    """在 memoryview 上的只读文件对象，读取时直接从内存映射复制到调用方的缓冲区。"""
+
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self._view) - self._position)
+        if n <= 0:
+            return 0
+        buffer[:n] = self._view[self._position:self._position + n]
+        self._position += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+class PackedClip:
+    """
+    打包存储中的一段音频，交给播放引擎时代替文件路径。
+
+    view 是指向内存映射的 memoryview，不复制数据；条目不存在时为 None。
+    """
+
+    __slots__ = ('key', 'view')
+
+    def __init__(self, key, view):
+        self.key = key
+        self.view = view
+
+    def open(self):
+        """返回可供 pygame 解码的只读文件对象。"""
+        return ClipReader(self.view)
+
+    def __len__(self):
+        return len(self.view) if self.view is not None else 0
+
+    def __str__(self):
+        return f'{self.key}.mp3 (pack)'
+
+    def __repr__(self):
+        return f'PackedClip({self.key})'
+
+
+class PackedAudioCache:
+    """
+    单文件的打包音频缓存，接口与 AudioCache 相同。
+
+    所有音频顺序追加到一个 pack 文件中，索引（键 → 偏移、大小、访问时间、命中次数）保存在
+    pack-index.sqlite3 里并在启动时整体载入内存。读取通过 mmap 进行，get() 返回指向映射内存的
+    PackedClip，播放时不需要 open() 文件也不复制数据。
+    淘汰只从索引中删除条目；被淘汰的数据超过 pack 文件的一半时在后台压缩，把有效数据复制到
+    新一代的 pack 文件中。旧文件在没有读取者之后删除（Windows 上映射仍被占用时留到下次启动删除）。
+    pack 文件只能由一个进程追加：打开时取得目录的独占文件锁（由操作系统在进程退出时释放），已被另一个仍在运行的进程打开时抛出 RuntimeError，
+    需要多个进程共用缓存时请使用 AudioCache（CACHE_BACKEND 为 "files"）。
+    与 AudioCache 一样，命中时的访问时间和命中次数批量写回索引。
+    """
+
+    INDEX_NAME = 'pack-index.sqlite3'
+    OWNER_LOCK_NAME = 'pack.lock'
+    FLUSH_BATCH = 256
+    FLUSH_INTERVAL = 5.0
+    COMPACT_RATIO = 0.5
+    COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, directory, max_bytes=0, max_entries=0, policy='lru', import_existing=True):
+        """
+        Args:
+            directory (str): 缓存目录。
+            max_bytes (int): 缓存总字节数上限，0 表示不限制。
+            max_entries (int): 缓存条目数上限，0 表示不限制。
+            policy (str): 淘汰策略，"lru"（最久未使用）或 "lfu"（最少使用）。
+            import_existing (bool): 第一次创建时导入目录中已有的 md5 命名的 MP3 文件。
+        """
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown cache eviction policy: {policy}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._owner = OwnerLock(self.directory / self.OWNER_LOCK_NAME)
+        if not self._owner.acquire():
+            raise RuntimeError(f"Packed cache {self.directory} is in use by another process; "
+                               f"use CACHE_BACKEND 'files' to share a cache between processes.")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.corrupted = 0
+        self.compactions = 0
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compacting = False
+        self._entries = {}  # {key: [offset, size, last_access, hit_count]}
+        self._total_bytes = 0
+        self._derived = {}  # {key: size}，依附于条目的派生数据，见 attach_derived()
+        self._derived_bytes = 0
+        self._on_remove = None
+        self._dirty = {}  # {key: entry}，访问时间还没有写回索引的条目
+        self._flushed_at = time.monotonic()
+
+        index_path = self.directory / self.INDEX_NAME
+        is_new = not index_path.exists()
+        self._db = sqlite3.connect(str(index_path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, offset INTEGER NOT NULL, size INTEGER NOT NULL, '
+                         'last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        self._generation = row[0] if row else self._latest_generation()
+        self._remove_stale_packs()
+
+        self._pack = open(self._pack_path(self._generation), 'a+b')
+        self._pack_size = self._pack.seek(0, os.SEEK_END)
+        self._map = None
+        self._map_size = 0
+
+        if is_new and self._pack_size:
+            # 索引丢失但 pack 文件还在：扫描记录头重建索引
+            self._rebuild_index()
+        for key, offset, size, last_access, hits in self._db.execute(
+                'SELECT key, offset, size, last_access, hits FROM entries'):
+            if offset + size > self._pack_size:
+                self.corrupted += 1  # pack 文件被截断
+                continue
+            self._entries[key] = [offset, size, last_access, hits]
+            self._total_bytes += size
+        if self.corrupted:
+            with self._db:
+                self._db.executemany('DELETE FROM entries WHERE key = ?',
+                                     [(key,) for key in self._index_keys() if key not in self._entries])
+        if is_new and import_existing:
+            imported = self.import_directory(self.directory)
+            if imported:
+                print(f"Imported {imported} existing cache files into pack.")
+        self._evict()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 Config 对象创建缓存。"""
+        return cls(config.STORED_FILEPATH, config.CACHE_MAX_BYTES, config.CACHE_MAX_ENTRIES, config.CACHE_POLICY)
+
+    # --- 文件 ---
+
+    def _pack_path(self, generation):
+        return self.directory / f'pack-{generation}.dat'
+
+    def _latest_generation(self):
+        # 索引丢失时以编号最大的 pack 文件为准
+        generations = [int(path.stem[len('pack-'):]) for path in self.directory.glob('pack-*.dat')
+                       if path.stem[len('pack-'):].isdigit()]
+        return max(generations, default=0)
+
+    def _remove_stale_packs(self):
+        current = self._pack_path(self._generation).name
+        for path in self.directory.glob('pack-*.dat*'):
+            if path.name != current:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _index_keys(self):
+        return [key for key, in self._db.execute('SELECT key FROM entries')]
+
+    def _rebuild_index(self):
+        rows = []
+        with open(self._pack_path(self._generation), 'rb') as f:
+            data = f.read()
+        offset = 0
+        now = time.time()
+        while offset + _RECORD_HEADER.size <= len(data):
+            magic, key_length, size = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size + key_length
+            if magic != _RECORD_MAGIC or start + size > len(data):
+                break
+            key = data[offset + _RECORD_HEADER.size:start].decode('utf-8')
+            rows.append((key, start, size, now, 0))
+            offset = start + size
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', rows)
+        print(f"Rebuilt pack index with {len(rows)} records.")
+
+    def _view(self, offset, size):
+        """返回 pack 文件中一段数据的 memoryview，需持有锁。"""
+        if self._map is None or offset + size > self._map_size:
+            self._pack.flush()
+            # 旧的映射可能还被播放中的 memoryview 引用，交给垃圾回收释放
+            self._map = mmap.mmap(self._pack.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_size = len(self._map)
+        return memoryview(self._map)[offset:offset + size]
+
+    # --- AudioCache 接口 ---
+
+    def path_for(self, key):
+        """返回缓存键对应的文件路径。打包存储中只用于放置流式下载的临时文件。"""
+        return self.directory / f'{key}.mp3'
+
+    def source_for(self, key):
+        """返回可以交给播放引擎的 PackedClip（不更新统计信息，条目不存在时 view 为 None）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return PackedClip(key, self._view(entry[0], entry[1]) if entry is not None else None)
+
+    def get(self, key):
+        """
+        查找缓存，命中时更新访问时间和命中次数。
+
+        Returns:
+            PackedClip: 命中时返回，否则返回 None。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[2] = time.time()
+            entry[3] += 1
+            self._touch(key, entry)
+            return PackedClip(key, self._view(entry[0], entry[1]))
+
+    def check(self, key):
+        """与 key in cache 相同（pack 只有一个进程写入）。"""
+        return key in self
+
+    def _touch(self, key, entry):
+        """记下命中后的访问时间，按批量或间隔写回索引。调用方持有 self._lock。"""
+        self._dirty[key] = entry
+        if len(self._dirty) >= self.FLUSH_BATCH or time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self._flush()
+
+    def flush(self):
+        """把内存中的访问时间和命中次数写回索引。"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._dirty:
+            with self._db:
+                self._db.executemany('UPDATE entries SET last_access = ?, hits = ? WHERE key = ?',
+                                     [(entry[2], entry[3], key) for key, entry in self._dirty.items()])
+            self._dirty.clear()
+        self._flushed_at = time.monotonic()
+
+    def read(self, key):
+        """
+        Returns:
+            bytes: 命中时返回音频数据（计入命中统计），否则返回 None。
+        """
+        clip = self.get(key)
+        return bytes(clip.view) if clip is not None else None
+
+    def discard(self, key):
+        """删除一条缓存，条目不存在时什么也不做。"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def attach_derived(self, sizes, on_remove=None):
+        """
+        登记依附于缓存条目的派生数据（例如后处理结果），替换之前登记的全部派生数据。
+        派生数据的大小计入 max_bytes；条目被删除或淘汰时调用 on_remove(key)，由调用方删除对应的派生数据。
+
+        Args:
+            sizes (dict): {缓存键: 字节数}，不在缓存中的键被忽略。
+            on_remove (callable): 条目被删除时的回调，在持有缓存锁时调用，不能再访问缓存。
+        """
+        with self._lock:
+            self._derived = {key: size for key, size in sizes.items() if key in self._entries}
+            self._derived_bytes = sum(self._derived.values())
+            self._on_remove = on_remove
+            self._evict()
+
+    def add_derived(self, key, size):
+        """
+        登记一条派生数据。
+
+        Returns:
+            bool: 条目已经不在缓存中时返回 False，调用方应删除这条派生数据。
+        """
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._derived_bytes += size - self._derived.get(key, 0)
+            self._derived[key] = size
+            self._evict(protect=key)
+            return True
+
+    def __contains__(self, key):
+        """只检查索引，不更新统计信息。"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, audio_bytes, last_access=None):
+        """
+        写入一条缓存：追加到 pack 文件末尾后再登记到索引。
+
+        Returns:
+            PackedClip: 写入成功返回；数据不完整时不写入并返回 None。
+        """
+        if not audio_bytes or not is_complete_mp3(audio_bytes):
+            print(f"Refusing to cache incomplete audio for {key}.")
+            return None
+        encoded_key = key.encode('utf-8')
+        record = _RECORD_HEADER.pack(_RECORD_MAGIC, len(encoded_key), len(audio_bytes)) + encoded_key + audio_bytes
+        with self._lock:
+            # 以文件实际的末尾为准，记录一次写完；写入失败时截回原来的长度，不留下半条记录
+            start = self._pack.seek(0, os.SEEK_END)
+            try:
+                self._pack.write(record)
+                self._pack.flush()
+            except OSError:
+                try:
+                    self._pack.truncate(start)
+                except OSError:
+                    os.ftruncate(self._pack.fileno(), start)
+                raise
+            self._pack_size = start + len(record)
+            offset = self._pack_size - len(audio_bytes)
+            self._add(key, offset, len(audio_bytes), last_access)
+            return PackedClip(key, self._view(offset, len(audio_bytes)))
+
+    def commit_file(self, key, temp_path):
+        """
+        把已经写好的临时文件（例如流式下载的结果）追加到 pack 中，并删除临时文件。
+
+        Returns:
+            PackedClip: 成功返回；文件不完整时返回 None。
+        """
+        with open(temp_path, 'rb') as f:
+            audio_bytes = f.read()
+        os.remove(temp_path)
+        return self.put(key, audio_bytes)
+
+    def _add(self, key, offset, size, last_access=None):
+        old = self._entries.get(key)
+        if old is not None:
+            self._total_bytes -= old[1]
+        last_access = last_access if last_access is not None else time.time()
+        hits = old[3] if old is not None else 0
+        self._dirty.pop(key, None)
+        self._entries[key] = [offset, size, last_access, hits]
+        self._total_bytes += size
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                             (key, offset, size, last_access, hits))
+        self._evict(protect=key)
+
+    def _remove(self, key):
+        self._dirty.pop(key, None)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+        with self._db:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        size = self._derived.pop(key, None)
+        if size is not None:
+            self._derived_bytes -= size
+            if self._on_remove is not None:
+                self._on_remove(key)
+
+    def _over_limit(self, ratio=1.0):
+        return ((self.max_bytes and self._total_bytes + self._derived_bytes > self.max_bytes * ratio) or
+                (self.max_entries and len(self._entries) > self.max_entries * ratio))
+
+    def _evict(self, protect=None):
+        """淘汰条目直到满足容量上限，被淘汰的数据在压缩时回收。"""
+        with self._lock:
+            if self._over_limit():
+                if self.policy == 'lfu':
+                    order = sorted(self._entries, key=lambda k: (self._entries[k][3], self._entries[k][2]))
+                else:
+                    order = sorted(self._entries, key=lambda k: self._entries[k][2])
+                for key in order:
+                    if not self._over_limit(0.9):
+                        break
+                    if key == protect:
+                        continue
+                    self._remove(key)
+                    self.evictions += 1
+            if self._should_compact() and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, name='tts-pack-compact', daemon=True).start()
+
+    def _dead_bytes(self):
+        return self._pack_size - self._total_bytes
+
+    def _should_compact(self):
+        dead = self._dead_bytes()
+        return dead > self.COMPACT_MIN_BYTES and dead > self._pack_size * self.COMPACT_RATIO
+
+    # --- 压缩 ---
+
+    def compact(self):
+        """
+        把有效数据复制到新一代的 pack 文件中，回收被淘汰和被覆盖的条目占用的空间。
+        复制期间仍然可以读写，复制过程中新写入的条目会在切换前补上。
+
+        Returns:
+            int: 回收的字节数。
+        """
+        with self._compact_lock:
+            try:
+                return self._compact()
+            finally:
+                self._compacting = False
+
+    def _compact(self):
+        with self._lock:
+            snapshot = {key: (entry[0], entry[1]) for key, entry in self._entries.items()}
+            generation = self._generation + 1
+            old_size = self._pack_size
+        new_path = self._pack_path(generation)
+        offsets = {}
+        with open(new_path, 'wb') as out:
+            self._copy(out, snapshot, offsets)
+            with self._lock:
+                # 复制期间新写入或被覆盖的条目
+                changed = {key: (entry[0], entry[1]) for key, entry in self._entries.items()
+                           if snapshot.get(key) != (entry[0], entry[1])}
+                self._copy(out, changed, offsets)
+                out.flush()
+                os.fsync(out.fileno())
+                for key in list(offsets):
+                    if key not in self._entries:
+                        del offsets[key]
+                with self._db:
+                    self._db.executemany('UPDATE entries SET offset = ? WHERE key = ?',
+                                         [(offset, key) for key, offset in offsets.items()])
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (generation,))
+                for key, offset in offsets.items():
+                    self._entries[key][0] = offset
+                old_path = self._pack_path(self._generation)
+                self._pack.close()
+                self._pack = open(new_path, 'a+b')
+                self._pack_size = self._pack.seek(0, os.SEEK_END)
+                self._map = None
+                self._map_size = 0
+                self._generation = generation
+                self.compactions += 1
+                reclaimed = old_size - self._pack_size
+        try:
+            old_path.unlink()
+        except OSError:
+            pass  # 仍有读取者映射着旧文件，下次启动时删除
+        return reclaimed
+
+    def _copy(self, out, entries, offsets):
+        for key, (offset, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            with self._lock:
+                view = self._view(offset, size)
+            encoded_key = key.encode('utf-8')
+            out.write(_RECORD_HEADER.pack(_RECORD_MAGIC, len(encoded_key), size) + encoded_key)
+            offsets[key] = out.tell()
+            out.write(view)
+
+    # --- 导入导出 ---
+
+    def import_directory(self, directory):
+        """
+        导入 AudioCache 格式的目录（{key}.mp3 文件），不完整的文件会被跳过。
+
+        Returns:
+            int: 导入的条目数。
+        """
+        imported = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not (entry.is_file() and entry.name.endswith('.mp3')):
+                    continue
+                key = entry.name[:-4]
+                if key in self:
+                    continue
+                with open(entry.path, 'rb') as f:
+                    audio_bytes = f.read()
+                if is_complete_mp3(audio_bytes) and self.put(key, audio_bytes, entry.stat().st_mtime):
+                    imported += 1
+        return imported
+
+    def export_directory(self, directory):
+        """
+        把所有条目导出为 AudioCache 格式的目录（{key}.mp3 文件）。
+
+        Returns:
+            int: 导出的条目数。
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            entries = [(key, entry[2]) for key, entry in self._entries.items()]
+        for key, last_access in entries:
+            clip = self.source_for(key)
+            if clip.view is None:
+                continue
+            path = directory / f'{key}.mp3'
+            with open(path, 'wb') as f:
+                f.write(clip.view)
+            os.utime(path, (last_access, last_access))
+        return len(entries)
+
+    # --- 维护 ---
+
+    def verify(self):
+        """
+        完整检查所有缓存条目，删除无法完整解析的条目。
+
+        Returns:
+            int: 删除的条目数。
+        """
+        removed = 0
+        with self._lock:
+            for key in list(self._entries):
+                offset, size = self._entries[key][:2]
+                if not is_complete_mp3(bytes(self._view(offset, size))):
+                    self._remove(key)
+                    removed += 1
+            self.corrupted += removed
+        return removed
+
+    def stats(self):
+        """
+        返回缓存统计信息。
+
+        Returns:
+            dict: 包含 entries、bytes、derived_bytes（派生数据的字节数）、hits、misses、hit_rate、evictions、corrupted，
+                  以及 pack_bytes（pack 文件大小）、dead_bytes（待压缩回收的字节数）、compactions。
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'derived_bytes': self._derived_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'corrupted': self.corrupted,
+                'pack_bytes': self._pack_size,
+                'dead_bytes': self._dead_bytes(),
+                'compactions': self.compactions,
+            }
+
+    def close(self):
+        with self._compact_lock, self._lock:
+            self._flush()
+            self._map = None
+            self._pack.close()
+            self._db.close()
+            self._owner.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import, export or compact a packed audio cache')
+    parser.add_argument('command', choices=['import', 'export', 'compact'])
+    parser.add_argument('pack_directory', help='directory holding pack-*.dat and pack-index.sqlite3')
+    parser.add_argument('directory', nargs='?', help='md5-named MP3 directory to import from or export to')
+    args = parser.parse_args()
+    if args.command != 'compact' and not args.directory:
+        parser.error(f'{args.command} needs a directory')
+
+    cache = PackedAudioCache(args.pack_directory, import_existing=False)
+    try:
+        if args.command == 'import':
+            print(f"Imported {cache.import_directory(args.directory)} entries.")
+        elif args.command == 'export':
+            print(f"Exported {cache.export_directory(args.directory)} entries.")
+        else:
+            print(f"Reclaimed {cache.compact()} bytes.")
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class PhraseIndex:
+    """
+    记录每个缓存键是由哪段原始文本（规范化之前）合成的。
+
+    缓存键由语音设置和规范化后的文本计算得到，无法反推原文；有了这份记录，配置变化后就能
+    重新计算每段原文的缓存键，找出不会再被用到的旧条目，以及需要重新合成的新条目。
+    每条记录带有合成时的语音设置（scope），配置变化时只需要检查旧设置下的记录。
+    记录最多保存 max_phrases 条，超出时删除按使用频率衰减后权重最低的。
+
+    同时保存每段原文的使用频率（history 表），用于预先合成常用的短语。频率随时间按半衰期衰减，
+    只保存权重最高的 max_history 条。为了不必定期更新所有行，表中保存的是
+    log2(权重) + 时间 / 半衰期：它与当前权重单调对应，可以直接排序，只有被使用的那一行需要更新。
+    """
+
+    INDEX_NAME = 'phrases.sqlite3'
+
+    def __init__(self, directory, max_history=5000, half_life=7 * 24 * 3600, max_phrases=20000):
+        """
+        Args:
+            directory (str): 缓存目录，记录保存在其中的 phrases.sqlite3。
+            max_history (int): 使用频率最多保存的短语数。
+            half_life (float): 使用频率衰减一半所需的时间（秒）。
+            max_phrases (int): 缓存键与原文的对应记录最多保存的条数。
+        """
+        self.max_history = max_history
+        self.half_life = half_life
+        self.max_phrases = max_phrases
+        path = Path(directory) / self.INDEX_NAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS phrases ('
+                         'key TEXT NOT NULL, text TEXT NOT NULL, last_used REAL NOT NULL, '
+                         "scope TEXT NOT NULL DEFAULT '', PRIMARY KEY (key, text))")
+        if 'scope' not in [row[1] for row in self._db.execute('PRAGMA table_info(phrases)')]:
+            # 旧版本的记录没有 scope，配置变化时不会被检查，之后再次合成时补上
+            self._db.execute("ALTER TABLE phrases ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+        self._db.execute('CREATE INDEX IF NOT EXISTS phrases_scope ON phrases (scope)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS history ('
+                         'text TEXT PRIMARY KEY, rank REAL NOT NULL, uses INTEGER NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS history_rank ON history (rank)')
+        self._history_size = self._db.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+        self._phrases_size = self._db.execute('SELECT COUNT(*) FROM phrases').fetchone()[0]
+
+    def record(self, text, keys, scope=''):
+        """
+        记录 text 合成出了 keys 这些缓存条目。
+
+        Args:
+            scope (str): 合成时的语音设置，见 ttsEngine.voice_scope()。
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO phrases VALUES (?, ?, ?, ?)',
+                                 [(key, text, now, scope) for key in keys])
+            # 替换已有的记录时不增加条数，这里的计数只会偏大，超出上限时再准确计数
+            self._phrases_size += len(keys)
+            if self._phrases_size > self.max_phrases * 1.1:
+                self._trim_phrases()
+
+    def _trim_phrases(self):
+        # 一次删到上限。原文的权重取使用频率记录中的值，没有记录时按最后一次合成时使用过一次计算
+        self._phrases_size = self._db.execute('SELECT COUNT(*) FROM phrases').fetchone()[0]
+        excess = self._phrases_size - self.max_phrases
+        if excess <= 0:
+            return
+        self._db.execute('DELETE FROM phrases WHERE rowid IN '
+                         '(SELECT phrases.rowid FROM phrases LEFT JOIN history ON history.text = phrases.text '
+                         'ORDER BY MAX(COALESCE(history.rank, 0), phrases.last_used / ?) LIMIT ?)',
+                         (self.half_life, excess))
+        self._phrases_size = self.max_phrases
+
+    def items(self, scope=None):
+        """
+        Args:
+            scope (str): 只返回在这个语音设置下合成的记录，None 表示全部。
+
+        Returns:
+            list: [(缓存键, 原始文本, 最后使用时间)]，最近使用的在前。
+        """
+        with self._lock:
+            if scope is None:
+                return self._db.execute('SELECT key, text, last_used FROM phrases '
+                                        'ORDER BY last_used DESC').fetchall()
+            return self._db.execute('SELECT key, text, last_used FROM phrases WHERE scope = ? '
+                                    'ORDER BY last_used DESC', (scope,)).fetchall()
+
+    def forget(self, keys):
+        """删除这些缓存键的记录。"""
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM phrases WHERE key = ?', [(key,) for key in keys])
+            self._phrases_size = self._db.execute('SELECT COUNT(*) FROM phrases').fetchone()[0]
+
+    def use(self, text):
+        """记录一次 text_to_speech 调用。"""
+        now = time.time() / self.half_life
+        with self._lock, self._db:
+            row = self._db.execute('SELECT rank, uses FROM history WHERE text = ?', (text,)).fetchone()
+            if row is None:
+                self._db.execute('INSERT INTO history VALUES (?, ?, 1)', (text, now))
+                self._history_size += 1
+                if self._history_size > self.max_history * 1.1:
+                    # 超出上限时一次删到上限，避免每次使用都删除一行
+                    self._db.execute('DELETE FROM history WHERE text IN '
+                                     '(SELECT text FROM history ORDER BY rank LIMIT ?)',
+                                     (self._history_size - self.max_history,))
+                    self._history_size = self.max_history
+            else:
+                # 旧权重衰减到现在再加 1
+                weight = 2 ** (row[0] - now) + 1
+                self._db.execute('UPDATE history SET rank = ?, uses = ? WHERE text = ?',
+                                 (math.log2(weight) + now, row[1] + 1, text))
+
+    def frequent(self, limit=None):
+        """
+        Args:
+            limit (int): 最多返回的条数，None 表示全部。
+
+        Returns:
+            list: [(原始文本, 当前权重, 使用次数)]，权重最高的在前。
+        """
+        now = time.time() / self.half_life
+        with self._lock:
+            rows = self._db.execute('SELECT text, rank, uses FROM history ORDER BY rank DESC LIMIT ?',
+                                    (-1 if limit is None else limit,)).fetchall()
+        return [(text, 2 ** (rank - now), uses) for text, rank, uses in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,101 @@
+import threading
+
+from lib.cachePrewarmer import CachePrewarmer
+from lib.ttsEngine import get_audio_cache, get_cache_key, get_phrase_index, normalize_text, utterance_parts
+
+
+class PhrasePrefetcher:
+    """
+    按使用频率预先合成常用短语。
+
+    PhraseIndex 记录了每次 text_to_speech 的原始文本及其随时间衰减的使用频率。
+    本类定期（以及每次配置重新加载、尤其是更换音色之后）取权重最高的 top_n 条短语，
+    交给 CachePrewarmer 按当前的 VOICE/SPEED/PITCH 补齐缓存，已经在缓存中的不会重复合成。
+
+    每一轮开始时估算预计的命中率提升：在全部使用记录的权重中，这一轮需要补合成的短语所占的比例，
+    即如果用户接下来的输入分布与历史相同，预取后多出来的缓存命中率。
+    """
+
+    def __init__(self, config, top_n=100, interval=600.0):
+        """
+        Args:
+            config: TTS 配置对象。
+            top_n (int): 保持合成的短语数。
+            interval (float): 重新检查的间隔（秒）。
+        """
+        self.config = config
+        self.top_n = top_n
+        self.interval = interval
+        self.rounds = 0
+        self.coverage = 0.0
+        self.predicted_gain = 0.0
+        self._prewarmer = CachePrewarmer(config, self._texts)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 Config 对象创建预取器。"""
+        return cls(config, config.PREFETCH_TOP_PHRASES, config.PREFETCH_INTERVAL)
+
+    def _texts(self):
+        config = self.config.snapshot()
+        history = get_phrase_index(config).frequent()
+        top = history[:self.top_n]
+        cache = get_audio_cache(config)
+        total = sum(weight for _, weight, _ in history)
+        missing = 0.0
+        for text, weight, _ in top:
+            parts = utterance_parts(normalize_text(text, config), config)
+            if not all(get_cache_key(part, config) in cache for part in parts):
+                missing += weight
+        self.rounds += 1
+        self.coverage = sum(weight for _, weight, _ in top) / total if total else 0.0
+        self.predicted_gain = missing / total if total else 0.0
+        return [text for text, _, _ in top]
+
+    def attach(self, *sources):
+        """在 Config 重新加载（例如更换音色）后立即重新预取。"""
+        self._prewarmer.attach(*sources)
+
+    def start(self):
+        """立即预取一轮，之后每隔 interval 秒检查一次。"""
+        self._prewarmer.start()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='phrase-prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # 上一轮还没结束时跳过，避免越积越多
+            if self._prewarmer.wait(0):
+                self._prewarmer.start()
+
+    def stats(self):
+        """
+        返回预取统计信息。
+
+        Returns:
+            dict: rounds（轮数）、coverage（前 top_n 条短语占全部使用权重的比例）、
+                  predicted_hit_rate_gain（最近一轮预计带来的命中率提升）、
+                  requests（累计的预取合成请求数，即预取成本）以及当前一轮的进度。
+        """
+        status = self._prewarmer.status()
+        return {
+            'rounds': self.rounds,
+            'coverage': self.coverage,
+            'predicted_hit_rate_gain': self.predicted_gain,
+            'requests': self._prewarmer.requested,
+            'synthesized': status['synthesized'],
+            'failed': status['failed'],
+            'pending': status['pending'],
+        }
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._prewarmer.shutdown()
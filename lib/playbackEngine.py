@@ -0,0 +1,588 @@
+import heapq
+import io
+import itertools
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import pygame
+
+from lib.audioStream import AudioStream
+from lib.metrics import registry
+from lib.packedAudioCache import PackedClip
+
+
+class PlaybackItem:
+    """一次播放请求。播放结束、被打断或出错后 done 会被设置。"""
+
+    def __init__(self, source, priority=0, mode='queue', trace=None, ticket=None):
+        self.source = source
+        self.priority = priority
+        self.mode = mode
+        self.trace = trace  # metrics.Trace，在开始出声时结束
+        self.ticket = ticket
+        self.enqueued_at = time.monotonic()
+        self.started_at = None  # 预计开始出声的时间（time.monotonic）
+        self.finished_at = None
+        self.interrupted = False
+        self.dropped = None  # 被队列策略丢弃时为原因：overflow / expired / replaced / coalesced
+        self.error = None
+        self.done = threading.Event()
+        self._appending = True  # 还有音频片段没有交给声道
+
+    def __repr__(self):
+        return f'PlaybackItem({self.source})'
+
+    def wait(self, timeout=None):
+        """等待播放结束，返回是否已结束。"""
+        return self.done.wait(timeout)
+
+
+class PlaybackTicket:
+    """
+    一次请求（例如一次按下快捷键）的播放凭据，由 PlaybackEngine.ticket() 创建，
+    同一请求的所有片段共用一个凭据。
+    """
+
+    def __init__(self, tag=None, ttl=0.0, generation=None):
+        self.tag = tag
+        self.ttl = ttl
+        self.generation = generation
+        self.created_at = time.monotonic()
+        self.started = False  # 已经有片段开始播放，之后的片段不再因过期被丢弃
+
+    def __repr__(self):
+        return f'PlaybackTicket({self.tag}, ttl={self.ttl})'
+
+
+class _Lane:
+    """一个混音声道及其播放时间线 [(预计结束时间, PlaybackItem)]。"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.timeline = deque()
+
+
+class PlaybackEngine:
+    """
+    事件驱动的播放引擎。
+
+    所有音频都以 pygame.mixer.Sound 的形式在固定的声道上播放。当前片段开始播放后，
+    下一个片段立即通过 Channel.queue 排在后面，由 SDL 在混音线程里无缝衔接；
+    播放线程根据每个片段的时长计算结束时间，只在需要时被唤醒，空闲时完全阻塞。
+    主声道上边下载边播放的流由单独的线程逐段交给声道，期间播放线程照常处理 interrupt 和 duck 请求；
+    主声道被流占用或已经有片段在排队时，queue 请求留在堆中等待，不阻塞播放线程。
+
+    播放模式：
+        queue: 按优先级排队播放（默认）。
+        interrupt: 立即打断正在播放的内容并播放。
+        duck: 在另一个声道上立即播放，期间把正在播放的内容压低音量。
+
+    排队（queue 模式）的请求还受以下策略约束，避免连续触发时积压一长串过时的语音：
+        max_depth: 等待中的请求数上限，超出时按 drop_policy 丢弃最旧（优先级最低的请求中最早的）或最新的请求；
+        coalesce: 与还在等待（尚未开始播放）的另一次请求是同一段音频时直接合并；同一次请求（同一凭据）的片段
+                  和没有凭据的请求不合并；
+        凭据的 ttl: 请求发出后超过 ttl 秒仍未开始播放就丢弃；
+        凭据的 tag: 同一 tag 的新请求取代还在等待的旧请求（latest-wins）。
+    """
+
+    QUEUE = 'queue'
+    INTERRUPT = 'interrupt'
+    DUCK = 'duck'
+
+    DROP_OLDEST = 'oldest'
+    DROP_NEWEST = 'newest'
+
+    def __init__(self, sound_cache, mixer_settings=(22050, -16, 2, 512), duck_volume=0.3,
+                 max_depth=0, drop_policy=DROP_OLDEST, coalesce=True):
+        """
+        Args:
+            sound_cache (SoundCache): 解码文件用的内存缓存。
+            mixer_settings (tuple): pygame.mixer.init 的 (frequency, size, channels, buffer)。
+            duck_volume (float): duck 模式下被压低的声道音量。
+            max_depth (int): 等待中的 queue 请求数上限，0 表示不限制。
+            drop_policy (str): 超出上限时丢弃 "oldest"（最旧）还是 "newest"（新来的）请求。
+            coalesce (bool): 是否合并还在等待中的重复请求。
+        """
+        self.sound_cache = sound_cache
+        self.mixer_settings = mixer_settings
+        self.duck_volume = duck_volume
+        self.configure_queue(max_depth, drop_policy, coalesce)
+        self._cond = threading.Condition()
+        self._pending = []  # 堆: [(排序键, PlaybackItem)]
+        self._seq = itertools.count()
+        self._generations = {}  # {tag: 最新凭据的代数}
+        self.enqueued = 0
+        self.started = 0
+        self.dropped = {}  # {原因: 次数}
+        self._main = None
+        self._duck = None
+        self._interrupt = False
+        self._feeding = None  # 正在由 _feed() 线程逐段交给主声道的流
+        self._ducking = False
+        self._stopping = False
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """启动播放线程。"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='tts-playback', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """停止播放线程，正在播放和等待中的内容都会被放弃。"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def configure_queue(self, max_depth=0, drop_policy=DROP_OLDEST, coalesce=True):
+        """调整排队策略（参数见构造函数），只影响之后加入的请求。"""
+        if drop_policy not in (self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError(f"Unknown playback drop policy: {drop_policy}")
+        self.max_depth = max_depth
+        self.drop_policy = drop_policy
+        self.coalesce = coalesce
+
+    def ticket(self, tag=None, ttl=0.0):
+        """
+        为一次请求创建播放凭据。
+
+        Args:
+            tag (str): 非空时启用 latest-wins：同一 tag 还在等待的旧请求立即被丢弃，
+                旧凭据之后才加入的片段也会被丢弃。
+            ttl (float): 凭据创建后超过该秒数仍未开始播放的片段被丢弃，0 表示不限制。
+
+        Returns:
+            PlaybackTicket: 传给 enqueue()。
+        """
+        with self._cond:
+            generation = None
+            if tag is not None:
+                generation = self._generations.get(tag, 0) + 1
+                self._generations[tag] = generation
+                replaced = [entry for entry in self._pending
+                            if entry[1].ticket is not None and entry[1].ticket.tag == tag]
+                if replaced:
+                    self._pending = [entry for entry in self._pending if entry not in replaced]
+                    heapq.heapify(self._pending)
+                    for _, item in replaced:
+                        self._drop(item, 'replaced')
+            return PlaybackTicket(tag, ttl, generation)
+
+    def enqueue(self, source, priority=0, mode=QUEUE, trace=None, ticket=None):
+        """
+        添加一个播放请求。
+
+        Args:
+            source: 文件路径、PackedClip、AudioStream 或 pygame.mixer.Sound。
+            priority (int): 优先级，数值越大越先播放；interrupt 和 duck 请求总是最先处理。
+            mode (str): queue / interrupt / duck。
+            trace (Trace): 可选的分阶段计时，记录 playback_queue、decode、mixer_start 后在开始出声时结束。
+            ticket (PlaybackTicket): 可选，ticket() 创建的凭据，用于过期丢弃和 latest-wins。
+
+        Returns:
+            PlaybackItem: 可以用来等待播放结束。请求被合并时返回之前的请求；被丢弃时 done 已经设置，
+            dropped 为丢弃原因。
+        """
+        if mode not in (self.QUEUE, self.INTERRUPT, self.DUCK):
+            raise ValueError(f"Unknown playback mode: {mode}")
+        item = PlaybackItem(source, priority, mode, trace, ticket)
+        with self._cond:
+            self.enqueued += 1
+            if self._superseded(item):
+                self._drop(item, 'replaced')
+                return item
+            if mode == self.QUEUE:
+                previous = self._coalesce_target(item) if self.coalesce else None
+                if previous is not None:
+                    self._drop(item, 'coalesced')
+                    return previous
+                if self.max_depth and self._queued_count() >= self.max_depth:
+                    victim = item if self.drop_policy == self.DROP_NEWEST else self._overflow_victim(item)
+                    if victim is item:
+                        self._drop(item, 'overflow')
+                        return item
+                    self._pending = [entry for entry in self._pending if entry[1] is not victim]
+                    heapq.heapify(self._pending)
+                    self._drop(victim, 'overflow')
+            if mode == self.INTERRUPT:
+                self._interrupt = True
+            urgent = 0 if mode != self.QUEUE else 1
+            heapq.heappush(self._pending, ((urgent, -priority, next(self._seq)), item))
+            self._cond.notify_all()
+        return item
+
+    def _coalesce_target(self, item):
+        """还在等待中、与 item 是同一段音频的另一次请求（需持有锁）；没有时返回 None。"""
+        if item.ticket is None:
+            return None
+        for _, previous in self._pending:
+            if (previous.mode == self.QUEUE and previous.ticket is not None and previous.ticket is not item.ticket
+                    and _same_source(previous.source, item.source)):
+                return previous
+        return None
+
+    def _queued_count(self):
+        return sum(1 for _, item in self._pending if item.mode == self.QUEUE)
+
+    def _overflow_victim(self, item):
+        """
+        等待中的 queue 请求和新请求里，与堆相同按播放优先级排在最后的那一级中最早加入的请求（需持有锁）。
+        新请求的优先级低于所有等待中的请求时丢弃的就是它自己。
+        """
+        candidates = [entry for entry in self._pending if entry[1].mode == self.QUEUE]
+        candidates.append(((1, -item.priority, float('inf')), item))
+        least = max(entry[0][1] for entry in candidates)
+        return min((entry for entry in candidates if entry[0][1] == least), key=lambda entry: entry[0][2])[1]
+
+    def _superseded(self, item):
+        ticket = item.ticket
+        return ticket is not None and ticket.tag is not None and \
+            self._generations.get(ticket.tag) != ticket.generation
+
+    def _stale(self, item, now):
+        """请求已被同一 tag 的新请求取代，或凭据过期时返回丢弃原因（需持有锁）。"""
+        ticket = item.ticket
+        if ticket is None or item.started_at is not None:
+            return None
+        if self._superseded(item):
+            return 'replaced'
+        if ticket.ttl and not ticket.started and now - ticket.created_at > ticket.ttl:
+            return 'expired'
+        return None
+
+    def _drop(self, item, reason):
+        """丢弃一个还没开始播放的请求（需持有锁）。"""
+        item.dropped = reason
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        print(f"Dropped playback ({reason}): {item.source}")
+        if item.trace is not None:
+            item.trace.finish(dropped=reason)
+        item.finished_at = time.monotonic()
+        item.done.set()
+
+    def wait_ready(self, timeout=None):
+        """等待播放线程完成 mixer 初始化，返回是否已就绪。"""
+        return self._ready.wait(timeout)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        """
+        Returns:
+            dict: pending、idle、enqueued（加入的请求数）、started（开始播放的请求数）和
+                  dropped（按原因统计的丢弃数）。等待时间见 registry 中的 playback.queue_wait_ms。
+        """
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'idle': self._idle_locked(),
+                'enqueued': self.enqueued,
+                'started': self.started,
+                'dropped': dict(self.dropped),
+            }
+
+    def preload(self, source):
+        """
+        提前把文件或 PackedClip 解码进内存缓存，之后播放时不必再读盘和解码。
+        mixer 尚未由播放线程初始化时什么也不做。
+        """
+        if not pygame.mixer.get_init():
+            return
+        try:
+            if isinstance(source, PackedClip):
+                self.sound_cache.load_clip(source)
+            else:
+                self.sound_cache.load(source)
+        except pygame.error as e:
+            print(f"Failed to preload {source}: {e}")
+
+    def is_idle(self):
+        """没有等待中的请求，且两个声道都没有在播放。"""
+        with self._cond:
+            return self._idle_locked()
+
+    def _idle_locked(self):
+        return not self._pending and self._feeding is None and not (self._main and self._main.timeline) and \
+            not (self._duck and self._duck.timeline)
+
+    # --- 播放线程 ---
+
+    def _run(self):
+        # 启动时就初始化 mixer 和音频设备，第一条语音不必再等待
+        self._ensure_mixer()
+        while True:
+            with self._cond:
+                item = None
+                while not self._stopping:
+                    self._reap()
+                    if self._pending and not self._main_blocked():
+                        item = heapq.heappop(self._pending)[1]
+                        reason = self._stale(item, time.monotonic())
+                        if reason is not None:
+                            self._drop(item, reason)
+                            item = None
+                            continue
+                        break
+                    # 没有新请求：睡到下一个片段结束（空闲时无限期阻塞）
+                    self._cond.wait(self._next_deadline())
+                if self._stopping:
+                    break
+            self._lap(item, 'playback_queue')
+            if not self._guarded(self._begin, item):
+                continue
+            if isinstance(item.source, AudioStream) and item.mode != self.DUCK:
+                with self._cond:
+                    self._feeding = item
+                threading.Thread(target=self._feed, args=(item,), name='tts-stream-feed', daemon=True).start()
+            else:
+                self._guarded(self._handle, item)
+        self._shutdown()
+
+    def _main_blocked(self):
+        """
+        堆顶的 queue 请求现在交给主声道只会阻塞播放线程时返回 True（需持有锁）：主声道正被流占用，
+        或者已经有片段在当前片段后面排队。interrupt 和 duck 请求总在堆顶，不受影响。
+        """
+        if self._pending[0][1].mode != self.QUEUE:
+            return False
+        return self._feeding is not None or (self._main is not None and len(self._main.timeline) > 1)
+
+    def _feed(self, item):
+        try:
+            self._guarded(self._handle, item)
+        finally:
+            with self._cond:
+                self._feeding = None
+                self._cond.notify_all()
+
+    @staticmethod
+    def _guarded(step, item):
+        """执行 step(item)，意外出错时结束 item 并返回 False。"""
+        try:
+            return step(item)
+        except Exception as e:
+            print(f"Unexpected error in playback engine: {e}")
+            item.error = e
+            item.done.set()
+            return False
+
+    def _ensure_mixer(self):
+        if self._main is not None and pygame.mixer.get_init():
+            return True
+        try:
+            if not pygame.mixer.get_init():
+                frequency, size, channels, buffer = self.mixer_settings
+                pygame.mixer.init(frequency=frequency, size=size, channels=channels, buffer=buffer)
+                print("Pygame mixer initialized by worker.")
+            # 保留 0、1 两个声道给引擎使用，其他地方的 Sound.play() 不会占用它们
+            pygame.mixer.set_reserved(2)
+            self._main = _Lane(pygame.mixer.Channel(0))
+            self._duck = _Lane(pygame.mixer.Channel(1))
+            self._ready.set()
+            return True
+        except pygame.error as e:
+            print(f"Failed to initialize pygame mixer: {e}")
+            return False
+
+    def _next_deadline(self):
+        deadlines = [lane.timeline[0][0] for lane in (self._main, self._duck) if lane and lane.timeline]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _reap(self):
+        """处理已经播放结束的片段（需持有锁）。"""
+        now = time.monotonic()
+        for lane in (self._main, self._duck):
+            if lane is None:
+                continue
+            while lane.timeline and lane.timeline[0][0] <= now:
+                end, item = lane.timeline.popleft()
+                if not item._appending and not (lane.timeline and lane.timeline[0][1] is item):
+                    self._finish(item, end)
+        # duck 声道播放完毕后恢复主声道音量
+        if self._ducking and not self._duck.timeline:
+            self._main.channel.set_volume(1.0)
+            self._ducking = False
+
+    @staticmethod
+    def _finish(item, end=None):
+        if not item.done.is_set():
+            item.finished_at = end if end is not None else time.monotonic()
+            item.done.set()
+            print(f"Finished playing: {item.source}")
+
+    def _cut(self, lane):
+        """打断一个声道上正在播放和排队的片段（需持有锁）。"""
+        lane.channel.stop()
+        while lane.timeline:
+            _, item = lane.timeline.popleft()
+            item.interrupted = True
+            self._finish(item)
+
+    def _begin(self, item):
+        """
+        在播放线程中为 item 做准备：确保 mixer 可用；interrupt 请求等正在交给主声道的流停下后打断主声道。
+        之后的 _handle() 可能在 _feed() 线程中进行。mixer 不可用时结束 item 并返回 False。
+        """
+        if not self._ensure_mixer():
+            item.error = RuntimeError('mixer unavailable')
+            item.done.set()
+            return False
+        if item.mode == self.INTERRUPT:
+            with self._cond:
+                # _interrupt 仍为 True，正在交给主声道的流会在下一段之前停下
+                while self._feeding is not None and not self._stopping:
+                    self._cond.wait(0.05)
+                self._interrupt = False
+                self._cut(self._main)
+        return True
+
+    def _handle(self, item):
+        lane = self._duck if item.mode == self.DUCK else self._main
+        try:
+            for sound in self._sounds(item):
+                if not self._append(lane, sound, item):
+                    if item.dropped is None:
+                        item.interrupted = True
+                    break
+        except pygame.error as e:
+            print(f"Pygame error playing {item.source}: {e}")
+            item.error = e
+
+        with self._cond:
+            item._appending = False
+            if not any(entry[1] is item for entry in lane.timeline):
+                self._finish(item)
+        if item.trace is not None and item.started_at is None:
+            item.trace.finish(error=str(item.error) if item.error else 'interrupted')
+        if isinstance(item.source, AudioStream):
+            self._report_stream(item.source)
+
+    def _sounds(self, item):
+        source = item.source
+        if isinstance(source, AudioStream):
+            while True:
+                segment = source.next_segment(timeout=0.05)
+                if segment is None or self._interrupt or self._stopping:
+                    return
+                if segment:
+                    self._lap(item, 'stream_buffer')
+                    sound = pygame.mixer.Sound(file=io.BytesIO(segment))
+                    self._lap(item, 'decode')
+                    yield sound
+        elif isinstance(source, pygame.mixer.Sound):
+            yield source
+        elif isinstance(source, PackedClip):
+            if source.view is None:
+                print(f"Playback Error: Clip not found in pack: {source}")
+                item.error = KeyError(source.key)
+                return
+            sound = self.sound_cache.load_clip(source)
+            self._lap(item, 'decode')
+            yield sound
+        else:
+            file_path = Path(source)
+            if not file_path.is_file():
+                print(f"Playback Error: File not found or invalid: {file_path}")
+                item.error = FileNotFoundError(str(file_path))
+                return
+            # 短音频解码后缓存在内存中，再次播放时不读盘也不解码
+            sound = self.sound_cache.load(file_path)
+            self._lap(item, 'decode')
+            yield sound
+
+    @staticmethod
+    def _lap(item, stage):
+        # 只记录开始出声之前的阶段
+        if item.trace is not None and item.started_at is None:
+            item.trace.lap(stage)
+
+    def _append(self, lane, sound, item):
+        """
+        把一个片段交给声道：声道空闲时直接播放，正在播放时排到后面，
+        已经有片段在排队时等到当前片段结束。被打断或停止时返回 False。
+        """
+        length = sound.get_length()
+        first = item.started_at is None
+        with self._cond:
+            while True:
+                if self._stopping or (self._interrupt and lane is self._main):
+                    return False
+                self._reap()
+                now = time.monotonic()
+                channel = lane.channel
+                busy = channel.get_busy()
+                if busy and channel.get_queue() is not None:
+                    # 已有片段在排队，等当前片段结束后队列空出来；按时长估计当前片段已经结束时只是 SDL 还没切换，稍后再看
+                    wait = lane.timeline[0][0] - now if len(lane.timeline) > 1 else 0
+                    self._cond.wait(max(wait, 0.005))
+                    continue
+                start = max(now, lane.timeline[-1][0]) if busy and lane.timeline else now
+                # 在前面的片段后面等待期间也可能已经过期或被取代，按预计出声的时间判断
+                reason = self._stale(item, start) if first else None
+                if reason is not None:
+                    self._drop(item, reason)
+                    return False
+                if busy:
+                    channel.queue(sound)
+                else:
+                    channel.play(sound)
+                break
+            lane.timeline.append((start + length, item))
+            if lane is self._duck:
+                self._main.channel.set_volume(self.duck_volume)
+                self._ducking = True
+            if item.started_at is None:
+                item.started_at = start
+                self.started += 1
+                if item.ticket is not None:
+                    item.ticket.started = True
+                if isinstance(item.source, AudioStream):
+                    item.source.mark_first_sound(start)
+                print(f"Playing: {item.source}")
+                registry.observe('playback.queue_wait_ms', (start - item.enqueued_at) * 1000)
+        if first and item.trace is not None:
+            # 声道中还有内容时，排在后面的片段要等前面的播完才出声
+            item.trace.lap('mixer_start')
+            item.trace.finish(ahead=item.started_at - now)
+        return True
+
+    @staticmethod
+    def _report_stream(stream):
+        if stream.first_sound_at is None:
+            print(f"Stream ended before playback: {stream.name}")
+            return
+        print(f"Finished streaming: {stream.name} "
+              f"(first byte: {stream.time_to_first_byte:.0f} ms, first sound: {stream.time_to_first_sound:.0f} ms)")
+
+    def _shutdown(self):
+        with self._cond:
+            for lane in (self._main, self._duck):
+                if lane is not None:
+                    self._cut(lane)
+            while self._pending:
+                item = heapq.heappop(self._pending)[1]
+                item.interrupted = True
+                item.done.set()
+
+
+def _same_source(a, b):
+    """两个播放来源是否是同一段音频。流式来源每次都不同。"""
+    if isinstance(a, AudioStream) or isinstance(b, AudioStream):
+        return False
+    if isinstance(a, PackedClip) or isinstance(b, PackedClip):
+        return isinstance(a, PackedClip) and isinstance(b, PackedClip) and a.key == b.key
+    if isinstance(a, pygame.mixer.Sound) or isinstance(b, pygame.mixer.Sound):
+        return a is b
+    return Path(a) == Path(b)
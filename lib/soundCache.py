@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pygame
+
+
+class SoundCache:
+    """
+    已解码音频的内存缓存。
+
+    以文件路径为键保存 pygame.mixer.Sound 对象，常用的短语（快捷键、缩写词）再次播放时
+    直接从内存播放，不再读盘和解码 MP3。超出内存预算时按 LRU 淘汰。
+    必须在 pygame mixer 初始化之后使用。
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_clip_bytes=256 * 1024):
+        """
+        Args:
+            max_bytes (int): 解码后 PCM 数据的内存预算（字节），0 表示禁用内存缓存。
+            max_clip_bytes (int): 超过该大小的 MP3 文件播放后不保留在内存中。
+        """
+        self.max_bytes = max_bytes
+        self.max_clip_bytes = max_clip_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sounds = OrderedDict()  # {key: (sound, size)}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes, max_clip_bytes):
+        """调整内存预算，超出部分立即淘汰。"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.max_clip_bytes = max_clip_bytes
+            self._evict()
+
+    def get(self, key):
+        """返回内存中的 Sound，未命中返回 None。"""
+        with self._lock:
+            item = self._sounds.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._sounds.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, sound):
+        """放入一个已解码的 Sound。"""
+        size = self._sound_size(sound)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            old = self._sounds.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._sounds[key] = (sound, size)
+            self._total_bytes += size
+            self._evict()
+
+    @staticmethod
+    def _sound_size(sound):
+        # 按 mixer 格式估算 PCM 字节数，避免 get_raw() 复制整段数据
+        frequency, size, channels = pygame.mixer.get_init()
+        return int(sound.get_length() * frequency) * channels * (abs(size) // 8)
+
+    def load(self, file_path):
+        """
+        获取文件对应的 Sound：命中内存缓存直接返回，否则解码文件。
+        只有不超过 max_clip_bytes 的文件才会放入缓存。
+
+        Returns:
+            pygame.mixer.Sound: 解码后的音频。
+        """
+        key = str(file_path)
+        sound = self.get(key)
+        if sound is not None:
+            return sound
+        sound = pygame.mixer.Sound(file_path)
+        if self.max_bytes and os.path.getsize(file_path) <= self.max_clip_bytes:
+            self.put(key, sound)
+        return sound
+
+    def load_clip(self, clip):
+        """
+        与 load() 相同，但来源是打包存储中的 PackedClip，直接从内存映射解码。
+
+        Returns:
+            pygame.mixer.Sound: 解码后的音频。
+        """
+        key = f'pack:{clip.key}'
+        sound = self.get(key)
+        if sound is not None:
+            return sound
+        sound = pygame.mixer.Sound(file=clip.open())
+        if self.max_bytes and len(clip) <= self.max_clip_bytes:
+            self.put(key, sound)
+        return sound
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._sounds:
+            _, (_, size) = self._sounds.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._sounds.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        返回内存缓存统计信息。
+
+        Returns:
+            dict: 包含 entries、bytes、hits、misses、hit_rate、evictions。
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._sounds),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
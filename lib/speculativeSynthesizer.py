@@ -0,0 +1,186 @@
+import threading
+
+from lib.metrics import registry
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.tokenBucket import TokenBucket
+from lib.ttsEngine import (dispatch, get_audio_cache, get_cache_key, get_phrase_index, get_synthesis_executor,
+                           normalize_text, preload_audio, synthesize_to_cache, utterance_parts, voice_scope)
+
+
+class SpeculativeSynthesizer:
+    """
+    输入过程中的推测合成。
+
+    输入框内容停止变化一小段时间后（由调用方做去抖），guess() 按与 text_to_speech 相同的方式
+    规范化、切分当前文本，把缓存中缺失的片段以 SPECULATIVE 优先级提交到共享的合成线程池，
+    合成完成后提前解码进内存缓存。文本继续变化时，不再属于当前文本的猜测如果还在排队就撤回；
+    已经开始的请求无法撤回，结果留在缓存中并计为浪费。按下回车时 commit() 统计这次推测是否命中，
+    随后的 text_to_speech 会直接命中缓存，或者合并到仍在进行中的推测请求上（并提升其优先级）。
+
+    推测请求受令牌桶限速：平均每秒不超过 max_rate 个，短时间内最多连续 burst 个；
+    超出限速时等到有令牌后再用最新的文本重新猜测一次，而不是排队发出所有中间状态。
+
+    guess() 和 commit() 由界面线程调用，查缓存、规范化和写短语索引都放到 ttsEngine 的分派线程中按顺序执行，
+    不阻塞界面；commit() 因此总在随后的 text_to_speech 之前完成统计。
+    """
+
+    def __init__(self, config, max_rate=1.0, burst=2, min_length=2):
+        """
+        Args:
+            config: TTS 配置对象。
+            max_rate (float): 每秒最多发出的推测请求数。
+            burst (int): 令牌桶容量，即允许连续发出的推测请求数。
+            min_length (int): 文本（去掉首尾空白后）短于该长度时不做推测。
+        """
+        self.config = config
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_length = min_length
+
+        self.guesses = 0
+        self.requests = 0
+        self.cancelled = 0
+        self.throttled = 0
+        self.wasted = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._issued = {}  # {缓存键: Future}，自上次 commit() 以来发出的推测请求
+        self._bucket = TokenBucket(max_rate, burst)
+        self._latest = None
+        self._retry = None
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 Config 对象创建推测合成器。"""
+        return cls(config, config.SPECULATIVE_MAX_RATE)
+
+    @staticmethod
+    def _parts(text, config):
+        return [(part, get_cache_key(part, config)) for part in utterance_parts(normalize_text(text, config), config)]
+
+    def guess(self, text):
+        """
+        以当前输入框的内容作为猜测，开始在后台合成。
+
+        Args:
+            text (str): 输入框中的原始文本。
+        """
+        dispatch(self._guess, text, self.config.snapshot())
+
+    def _guess(self, text, config):
+        text = text.strip()
+        parts = self._parts(text, config) if len(text) >= self.min_length else []
+        cache = get_audio_cache(config)
+        executor = get_synthesis_executor(config)
+        with self._lock:
+            self.guesses += 1
+            self._latest = text
+            # 撤回不再属于当前文本的猜测
+            live = {key for _, key in parts}
+            for key in [key for key in self._issued if key not in live]:
+                future = self._issued[key]
+                if future.done():
+                    # 已经合成完（或失败）的不再需要撤回，结果没有被当前文本用到
+                    del self._issued[key]
+                    if not future.cancelled():
+                        self.wasted += 1
+                elif executor.cancel(key, future):
+                    self.cancelled += 1
+                    del self._issued[key]
+
+            for part, key in parts:
+                if key in self._issued or key in cache:
+                    continue
+                if not self._bucket.try_take():
+                    self.throttled += 1
+                    self._schedule_retry()
+                    break
+                future, created = executor.submit_or_join(synthesize_to_cache, part, config, key,
+                                                          priority=SynthesisExecutor.SPECULATIVE, key=key)
+                if not created:
+                    continue  # 已经有其他请求在合成
+                self.requests += 1
+                registry.incr('speculative_requests')
+                self._issued[key] = future
+                future.add_done_callback(lambda f, k=key: self._synthesized(k, f, config))
+
+    def _schedule_retry(self):
+        if self._retry is None:
+            self._retry = threading.Timer(self._bucket.wait_time(), dispatch, (self._retry_latest,))
+            self._retry.daemon = True
+            self._retry.start()
+
+    def _retry_latest(self):
+        with self._lock:
+            self._retry = None
+            text = self._latest
+        if text is not None:
+            self._guess(text, self.config.snapshot())
+
+    def _synthesized(self, key, future, config):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if key in get_audio_cache(config):
+            # 结果是实际会播放的来源（启用后处理时为处理过的 WAV）
+            preload_audio(future.result(), config)
+
+    def commit(self, text):
+        """
+        输入框提交时调用（在 text_to_speech 之前）：统计这次推测是否命中，并结束本轮推测。
+
+        所有需要合成的片段都已经由推测请求发出时计为命中；本来就全部在缓存中的文本不计入命中率。
+        本轮发出、但不属于最终文本的推测请求计为浪费。
+
+        Args:
+            text (str): 提交的原始文本。
+        """
+        dispatch(self._commit, text, self.config.snapshot())
+
+    def _commit(self, text, config):
+        parts = self._parts(text.strip(), config)
+        keys = [key for _, key in parts]
+        cache = get_audio_cache(config)
+        with self._lock:
+            speculated = [key for key in keys if key in self._issued]
+            if speculated:
+                if all(key in self._issued or key in cache for key in keys):
+                    self.hits += 1
+                    registry.incr('speculative_hit')
+                    # 命中时 text_to_speech 不会再记录原文，由这里补上
+                    get_phrase_index(config).record(text.strip(), keys, voice_scope(config))
+                else:
+                    self.misses += 1
+                    registry.incr('speculative_miss')
+            elif not all(key in cache for key in keys):
+                self.misses += 1
+                registry.incr('speculative_miss')
+            wasted = [key for key, future in self._issued.items() if key not in keys and not future.cancelled()]
+            self.wasted += len(wasted)
+            self._issued.clear()
+            self._latest = None
+            if self._retry is not None:
+                self._retry.cancel()
+                self._retry = None
+
+    def stats(self):
+        """
+        返回推测合成的统计信息。
+
+        Returns:
+            dict: guesses（猜测次数）、requests（发出的推测请求数）、cancelled（排队中被撤回的请求数）、
+                  throttled（因限速推迟的次数）、wasted（结果没有被用到的请求数）、hits、misses、hit_rate。
+        """
+        with self._lock:
+            commits = self.hits + self.misses
+            return {
+                'guesses': self.guesses,
+                'requests': self.requests,
+                'cancelled': self.cancelled,
+                'throttled': self.throttled,
+                'wasted': self.wasted,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / commits if commits else 0.0,
+            }
@@ -0,0 +1,368 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from lib.metrics import RollingHistogram, registry
+from lib.ttsClient import TTSClient, TTSClientError
+
+# 一个静音 MP3 帧（MPEG-1 Layer III, 32kbps, 44.1kHz, 帧长 104 字节）
+SILENT_MP3_FRAME = bytes.fromhex('fffb1004') + bytes(100)
+
+
+class LocalBackend:
+    """
+    进程内的桩后端，不发出网络请求，返回固定的音频。
+
+    用于在没有 TTS 服务的环境下测试路由、对冲和故障切换：可以模拟合成耗时（latency）、
+    按比例出现的长尾延迟（tail_rate、tail_latency）和按比例失败（error_rate）。
+    """
+
+    def __init__(self, name='local', audio=SILENT_MP3_FRAME * 20, latency=0.0, tail_rate=0.0, tail_latency=0.0,
+                 error_rate=0.0, seed=None):
+        """
+        Args:
+            name (str): 后端名称，用于统计。
+            audio (bytes): 每次合成返回的音频。
+            latency (float): 每次合成的耗时（秒）。
+            tail_rate (float): 出现长尾延迟的请求比例。
+            tail_latency (float): 长尾请求额外的耗时（秒）。
+            error_rate (float): 失败的请求比例。
+            seed (int): 随机数种子，便于复现。
+        """
+        self.name = name
+        self.audio = audio
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def synthesize(self, ssml, headers, timings=None):
+        with self._lock:
+            delay = self.latency
+            if self.tail_rate and self._random.random() < self.tail_rate:
+                delay += self.tail_latency
+            failed = self.error_rate and self._random.random() < self.error_rate
+        time.sleep(delay)
+        if timings is not None:
+            timings.update(connect=0.0, server=delay * 1000, download=0.0)
+        if failed:
+            raise TTSClientError(f"Local backend {self.name} failed.")
+        return self.audio
+
+    def synthesize_stream(self, ssml, headers, chunk_size=4096, timings=None):
+        audio = self.synthesize(ssml, headers, timings)
+        for offset in range(0, len(audio), chunk_size):
+            yield audio[offset:offset + chunk_size]
+
+    def warm_up(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _BackendStats:
+    """单个后端最近的延迟分布和错误率。"""
+
+    # 错误率的指数滑动平均系数
+    ALPHA = 0.2
+
+    def __init__(self, window):
+        self.latency = RollingHistogram(window)
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+        self.hedge_wins = 0
+
+    def record(self, ms, ok):
+        self.requests += 1
+        if ok:
+            self.latency.observe(ms)
+        else:
+            self.failures += 1
+        self.error_ewma += self.ALPHA * ((0.0 if ok else 1.0) - self.error_ewma)
+
+
+class BackendRouter:
+    """
+    在多个合成后端（主服务、镜像、本地桩）之间路由请求。
+
+    每次请求按各后端的得分排序：得分是最近成功请求延迟的中位数（不受偶尔的长尾影响）按错误率放大，
+    熔断中（冷却时间未过）的后端排在最后，还没有数据的后端按配置顺序排在有数据的健康后端之后。
+    请求先发给排在第一的后端；超过它最近成功请求延迟的 p95（样本不足时为 hedge_initial_ms）
+    仍未返回时，向下一个后端发出一个对冲请求，取先返回的结果，另一个请求在后台完成并计入统计。
+    某个请求失败时立即切换到下一个还没有试过的后端。
+
+    流式请求只做故障切换：数据一旦开始送去播放就不能再换后端，因此只在收到第一个数据块之前切换。
+    """
+
+    def __init__(self, backends, hedge=True, hedge_percentile=0.95, hedge_min_ms=50.0, hedge_initial_ms=1000.0,
+                 window=128, min_samples=20, workers=32):
+        """
+        Args:
+            backends (list): (名称, 后端) 列表，后端需要提供 synthesize、synthesize_stream、warm_up、close，
+                             顺序即没有统计数据时的优先顺序。
+            hedge (bool): 是否发出对冲请求。
+            hedge_percentile (float): 按第一个后端最近延迟的哪个分位数决定何时对冲。
+            hedge_min_ms (float): 对冲等待时间的下限（毫秒）。
+            hedge_initial_ms (float): 样本不足 min_samples 时的对冲等待时间（毫秒）。
+            window (int): 每个后端保留的延迟样本数。
+            min_samples (int): 按分位数计算对冲等待时间所需的最少样本数。
+            workers (int): 发出请求的线程数上限。被对冲掉的慢请求会继续占用线程直到返回或超时，因此要留有余量。
+        """
+        if not backends:
+            raise ValueError("At least one backend is required.")
+        self.backends = list(backends)
+        self.hedge = hedge and len(self.backends) > 1
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_ms = hedge_min_ms
+        self.hedge_initial_ms = hedge_initial_ms
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.failed = 0
+        self._stats = {name: _BackendStats(window) for name, _ in self.backends}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts-backend') if self.hedge else None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        根据 Config 对象创建路由：第一个后端是 BASE_URL，其后是 BACKENDS 中配置的镜像和本地桩。
+
+        BACKENDS 的每一项是一个字典："url" 为镜像的基址（与 BASE_URL 相同，接口路径沿用 API_ENDPOINT），
+        "type": "local" 表示本地桩（可选 latency、tail_rate、tail_latency、error_rate，单位为秒）；
+        "name" 可选，默认为 url 或 "local-<序号>"。
+        """
+        backends = [('primary', TTSClient.from_config(config))]
+        for i, spec in enumerate(config.BACKENDS):
+            if spec.get('type', 'http') == 'local':
+                name = spec.get('name', f'local-{i}')
+                backend = LocalBackend(name, latency=spec.get('latency', 0.0),
+                                       tail_rate=spec.get('tail_rate', 0.0),
+                                       tail_latency=spec.get('tail_latency', 0.0),
+                                       error_rate=spec.get('error_rate', 0.0))
+            else:
+                name = spec.get('name', spec['url'])
+                backend = TTSClient.from_config(config, spec['url'] + config.API_ENDPOINT)
+            backends.append((name, backend))
+        return cls(backends, hedge=config.HEDGE_REQUESTS, hedge_percentile=config.HEDGE_PERCENTILE / 100,
+                   hedge_min_ms=config.HEDGE_MIN_MS, workers=max(32, 8 * config.SYNTHESIS_WORKERS))
+
+    def _ranked(self):
+        def score(item):
+            index, (name, backend) = item
+            stats = self._stats[name]
+            breaker = getattr(backend, 'breaker', None)
+            # 冷却时间已过的后端照常排序，这样才会有请求发给它进入半开状态试探
+            if breaker is not None and not breaker.ready():
+                return 2, 0.0, index
+            median = stats.latency.percentile(0.5)
+            if median is None:
+                return 1, 0.0, index
+            return 0, median / max(0.05, 1.0 - stats.error_ewma), index
+
+        with self._lock:
+            return [item for _, item in sorted(enumerate(self.backends), key=score)]
+
+    def hedge_delay(self, name):
+        """返回对 name 发出请求后，等待多少秒再发出对冲请求。"""
+        with self._lock:
+            stats = self._stats[name]
+            if stats.latency.count < self.min_samples:
+                ms = self.hedge_initial_ms
+            else:
+                ms = stats.latency.percentile(self.hedge_percentile)
+        return max(ms, self.hedge_min_ms) / 1000
+
+    def _attempt(self, name, backend, ssml, headers):
+        timings = {}
+        start = time.perf_counter()
+        try:
+            audio = backend.synthesize(ssml, headers, timings)
+        except TTSClientError:
+            self._record(name, (time.perf_counter() - start) * 1000, False)
+            raise
+        self._record(name, (time.perf_counter() - start) * 1000, True)
+        return audio, timings
+
+    def _record(self, name, ms, ok):
+        with self._lock:
+            self._stats[name].record(ms, ok)
+        registry.observe(f'backend.{name}_ms' if ok else f'backend.{name}_failed_ms', ms)
+
+    def synthesize(self, ssml, headers, timings=None):
+        """
+        发送一次合成请求，必要时对冲或切换后端。
+
+        Args:
+            ssml (str): SSML 文本。
+            headers (dict): 请求头。
+            timings (dict): 不为 None 时写入最终采用的那个请求的 connect、server、download 耗时（毫秒）。
+
+        Returns:
+            bytes: 音频数据。
+
+        Raises:
+            TTSClientError: 所有后端都失败。
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+        try:
+            if self.hedge:
+                audio, used = self._synthesize_hedged(ssml, headers)
+            else:
+                audio, used = self._synthesize_sequential(ssml, headers)
+        except TTSClientError:
+            with self._lock:
+                self.failed += 1
+            raise
+        registry.observe('backend.request_ms', (time.perf_counter() - start) * 1000)
+        if timings is not None:
+            timings.update(used)
+        return audio
+
+    def _synthesize_sequential(self, ssml, headers):
+        error = None
+        for i, (name, backend) in enumerate(self._ranked()):
+            if i:
+                with self._lock:
+                    self.failovers += 1
+            try:
+                audio, timings = self._attempt(name, backend, ssml, headers)
+            except TTSClientError as e:
+                error = e
+                continue
+            with self._lock:
+                self._stats[name].wins += 1
+            return audio, timings
+        raise TTSClientError(f"All backends failed, last error: {error}") from error
+
+    def _synthesize_hedged(self, ssml, headers):
+        ranked = self._ranked()
+        pending = {}
+        launched = 0
+        hedged = False
+        error = None
+
+        def launch():
+            nonlocal launched
+            name, backend = ranked[launched]
+            launched += 1
+            pending[self._pool.submit(self._attempt, name, backend, ssml, headers)] = name
+
+        launch()
+        timeout = self.hedge_delay(ranked[0][0])
+        while pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 第一个请求超过了 p95 仍未返回，向下一个后端对冲；之后只在失败时再切换
+                timeout = None
+                if launched < len(ranked):
+                    with self._lock:
+                        self.hedged += 1
+                    hedged = True
+                    launch()
+                continue
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    audio, timings = future.result()
+                except TTSClientError as e:
+                    error = e
+                    if launched < len(ranked):
+                        with self._lock:
+                            self.failovers += 1
+                        launch()
+                    continue
+                with self._lock:
+                    self._stats[name].wins += 1
+                    if hedged and name != ranked[0][0]:
+                        self._stats[name].hedge_wins += 1
+                return audio, timings
+        raise TTSClientError(f"All backends failed, last error: {error}") from error
+
+    def synthesize_stream(self, ssml, headers, chunk_size=4096, timings=None):
+        """
+        以流式方式发送合成请求。在收到第一个数据块之前失败时切换到下一个后端。
+
+        Yields:
+            bytes: 音频数据块。
+
+        Raises:
+            TTSClientError: 所有后端都失败，或者传输中断。
+        """
+        with self._lock:
+            self.requests += 1
+        error = None
+        for i, (name, backend) in enumerate(self._ranked()):
+            if i:
+                with self._lock:
+                    self.failovers += 1
+            start = time.perf_counter()
+            chunks = backend.synthesize_stream(ssml, headers, chunk_size, timings)
+            try:
+                first = next(chunks, b'')
+            except TTSClientError as e:
+                self._record(name, (time.perf_counter() - start) * 1000, False)
+                error = e
+                continue
+            # 流式请求只统计到第一个数据块的时间，与完整请求的延迟分开
+            registry.observe(f'backend.{name}_first_chunk_ms', (time.perf_counter() - start) * 1000)
+            with self._lock:
+                self._stats[name].wins += 1
+            yield first
+            yield from chunks
+            return
+        with self._lock:
+            self.failed += 1
+        raise TTSClientError(f"All backends failed, last error: {error}") from error
+
+    def warm_up(self):
+        """预先建立到各个后端的连接。"""
+        for _, backend in self.backends:
+            backend.warm_up()
+
+    def stats(self):
+        """
+        返回路由统计信息。
+
+        Returns:
+            dict: requests、hedged（发出的对冲请求数）、failovers（失败后切换的次数）、failed（所有后端都失败的次数），
+                  以及 backends：每个后端的请求数、失败数、错误率（滑动平均）、被采用次数、
+                  对冲胜出次数和延迟的 p50/p95/p99（毫秒）。
+        """
+        with self._lock:
+            backends = {}
+            for name, _ in self.backends:
+                stats = self._stats[name]
+                summary = stats.latency.summary()
+                backends[name] = {
+                    'requests': stats.requests,
+                    'failures': stats.failures,
+                    'error_rate': round(stats.error_ewma, 3),
+                    'wins': stats.wins,
+                    'hedge_wins': stats.hedge_wins,
+                    'p50': summary.get('p50'),
+                    'p95': summary.get('p95'),
+                    'p99': summary.get('p99'),
+                }
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'failovers': self.failovers,
+                'failed': self.failed,
+                'backends': backends,
+            }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        for _, backend in self.backends:
+            backend.close()
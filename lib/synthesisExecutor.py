@@ -0,0 +1,217 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Task:
+    def __init__(self, fn, args, priority, key):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.key = key
+        self.future = Future()
+        self.started = False
+        self.joined = 0
+
+
+class SynthesisExecutor:
+    """
+    固定大小的合成线程池。
+
+    任务按优先级排队（用户输入 > 快捷键 > 输入中的推测合成 > 预取），同一优先级内先进先出。
+    带 key 提交的任务会合并：同一个 key 已经在排队或执行时，新的请求直接共享同一个 Future，
+    不再发出第二次网络请求；如果新请求的优先级更高，排队中的任务会被提前。
+    推测合成和预取任务最多同时占用 max_background 个线程，保证总有线程留给用户请求。
+    """
+
+    INTERACTIVE = 0
+    HOTKEY = 1
+    SPECULATIVE = 2
+    PREFETCH = 3
+
+    def __init__(self, workers=4, max_background=2):
+        """
+        Args:
+            workers (int): 线程数。
+            max_background (int): 同时执行的后台任务（推测合成和预取）数上限，会被限制在 workers - 1 以内。
+        """
+        self.workers = workers
+        self.max_background = max(1, min(max_background, workers - 1)) if workers > 1 else 1
+        self.submitted = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+
+        self._cond = threading.Condition()
+        self._heap = []  # [(优先级, 序号, _Task)]
+        self._seq = itertools.count()
+        self._in_flight = {}  # {key: _Task}
+        self._active = 0
+        self._active_background = 0
+        self._busy_seconds = 0.0
+        self._started_at = time.monotonic()
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._worker, name=f'tts-synth-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=INTERACTIVE, key=None):
+        """
+        提交任务。
+
+        Args:
+            fn (callable): 要执行的函数。
+            *args: 函数参数。
+            priority (int): INTERACTIVE / HOTKEY / SPECULATIVE / PREFETCH。
+            key (str): 合并用的键（通常是缓存键），None 表示不合并。
+
+        Returns:
+            concurrent.futures.Future: 任务结果。
+        """
+        return self.submit_or_join(fn, *args, priority=priority, key=key)[0]
+
+    def submit_or_join(self, fn, *args, priority=INTERACTIVE, key=None):
+        """
+        与 submit 相同，但同时返回这次调用是否新建了任务。
+
+        Returns:
+            tuple: (Future, 是否新建)。为 False 时表示合并到了已有的任务上。
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError('SynthesisExecutor has been shut down')
+            if key is not None:
+                task = self._in_flight.get(key)
+                if task is not None:
+                    self.coalesced += 1
+                    task.joined += 1
+                    if priority < task.priority and not task.started:
+                        # 提高排队中任务的优先级，旧的堆条目在弹出时会被跳过
+                        task.priority = priority
+                        heapq.heappush(self._heap, (priority, next(self._seq), task))
+                        self._cond.notify()
+                    return task.future, False
+            task = _Task(fn, args, priority, key)
+            self.submitted += 1
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            if key is not None:
+                self._in_flight[key] = task
+            self._cond.notify()
+            return task.future, True
+
+    def cancel(self, key, future=None):
+        """
+        撤回以 key 提交的任务。只有尚未开始执行、且没有其他请求合并进来的任务才能撤回，
+        因此不会影响等待同一结果的其他调用方。
+
+        Args:
+            key (str): 提交时的合并键。
+            future (Future): 可选，只有 key 对应的仍是这个任务时才撤回（同一个键可能已经被其他请求重新提交）。
+
+        Returns:
+            bool: 是否撤回成功。
+        """
+        with self._cond:
+            task = self._in_flight.get(key)
+            if task is None or task.started or task.joined or (future is not None and task.future is not future):
+                return False
+            del self._in_flight[key]
+            task.future.cancel()
+            self.cancelled += 1
+            return True
+
+    def _pop_runnable(self):
+        while self._heap:
+            priority, _, task = self._heap[0]
+            if task.started or priority != task.priority or task.future.cancelled():
+                heapq.heappop(self._heap)  # 已经执行过、已被提前或已撤回的旧条目
+                continue
+            if priority >= self.SPECULATIVE and self._active_background >= self.max_background:
+                return None
+            heapq.heappop(self._heap)
+            return task
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopping:
+                    task = self._pop_runnable()
+                    if task is not None:
+                        break
+                    self._cond.wait()
+                if task is None:
+                    return
+                task.started = True
+                background = task.priority >= self.SPECULATIVE
+                self._active += 1
+                if background:
+                    self._active_background += 1
+
+            start = time.monotonic()
+            ok = task.future.set_running_or_notify_cancel()
+            if ok:
+                try:
+                    task.future.set_result(task.fn(*task.args))
+                except BaseException as e:
+                    task.future.set_exception(e)
+
+            with self._cond:
+                self._active -= 1
+                if background:
+                    self._active_background -= 1
+                if task.key is not None and self._in_flight.get(task.key) is task:
+                    del self._in_flight[task.key]
+                self._busy_seconds += time.monotonic() - start
+                if ok and task.future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def queue_depth(self):
+        """排队中（尚未开始执行）的任务数。"""
+        with self._cond:
+            return sum(1 for priority, _, task in self._heap
+                       if not task.started and priority == task.priority and not task.future.cancelled())
+
+    def stats(self):
+        """
+        返回线程池统计信息。
+
+        Returns:
+            dict: workers、active（正在执行）、queue_depth、submitted、coalesced（被合并的请求数）、
+                  cancelled（被撤回的任务数）、completed、failed、utilization（线程忙碌时间占比）。
+        """
+        depth = self.queue_depth()
+        with self._cond:
+            elapsed = time.monotonic() - self._started_at
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queue_depth': depth,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'cancelled': self.cancelled,
+                'completed': self.completed,
+                'failed': self.failed,
+                'utilization': self._busy_seconds / (elapsed * self.workers) if elapsed else 0.0,
+            }
+
+    def shutdown(self, wait=False):
+        """停止线程池，排队中的任务会被取消。"""
+        with self._cond:
+            self._stopping = True
+            for _, _, task in self._heap:
+                task.future.cancel()
+            self._heap.clear()
+            self._in_flight.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,150 @@
+import copy
+import re
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 自动机，一次扫描找出文本中出现的所有模式串（包括互相重叠的）。
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (iterable): 非空的模式串。
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = nxt
+        self._output[node] = (pattern,)
+
+    def _build(self):
+        # 广度优先计算失败指针，并把失败指针上的输出合并进来
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] += self._output[self._fail[child]]
+
+    def find_all(self, text):
+        """
+        Returns:
+            set: 在 text 中出现过的模式串。
+        """
+        found = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+class TextNormalizer:
+    """
+    预编译的文本规范化规则。
+
+    缩写词编译为字典，一次查找；文本替换规则中的正则在加载时预编译，
+    普通文本替换则用 Aho-Corasick 自动机一次扫描出文本中实际出现的规则，只执行这些规则。
+    文本每被某条规则改变一次，就重新扫描并从下一条规则继续，因此结果与按顺序逐条执行完全一致。
+    对象创建后不再修改，规则变化时用 with_fixed_collocation / with_word_replacement 生成新对象，
+    只重新编译变化的那一组规则。
+    """
+
+    def __init__(self, fixed_collocation, word_replacement):
+        """
+        Args:
+            fixed_collocation (list): fixed_collocation.json 的内容。
+            word_replacement (list): word_replacement.json 的内容。
+        """
+        self._compile_fixed_collocation(fixed_collocation)
+        self._compile_word_replacement(word_replacement)
+
+    def with_fixed_collocation(self, fixed_collocation):
+        """返回替换了缩写词、沿用已编译的文本替换规则的新对象。"""
+        normalizer = copy.copy(self)
+        normalizer._compile_fixed_collocation(fixed_collocation)
+        return normalizer
+
+    def with_word_replacement(self, word_replacement):
+        """返回替换了文本替换规则、沿用缩写词的新对象。"""
+        normalizer = copy.copy(self)
+        normalizer._compile_word_replacement(word_replacement)
+        return normalizer
+
+    def _compile_fixed_collocation(self, fixed_collocation):
+        # 与逐条查找一致：相同的缩写词以第一条为准
+        self.collocations = {}
+        for collocation in fixed_collocation:
+            self.collocations.setdefault(collocation["before"], collocation["after"])
+
+    def _compile_word_replacement(self, word_replacement):
+        self._rules = []  # [(是否正则, 模式, 替换文本)]
+        self._always = []  # 每次都要执行的规则下标：正则规则和空模式的普通替换
+        self._literal_indices = {}  # {模式串: [规则下标]}
+        for index, replacement in enumerate(word_replacement):
+            before, after = replacement["before"], replacement["after"]
+            if replacement["re"]:
+                self._rules.append((True, re.compile(before), after))
+                self._always.append(index)
+            else:
+                self._rules.append((False, before, after))
+                if before:
+                    self._literal_indices.setdefault(before, []).append(index)
+                else:
+                    self._always.append(index)
+        self._automaton = AhoCorasick(self._literal_indices)
+
+    def apply_fixed_collocation(self, text):
+        return self.collocations.get(text, text)
+
+    def _candidates(self, text, after_index):
+        """返回下标大于 after_index 且可能改变 text 的规则下标（升序）。"""
+        indices = [index for index in self._always if index > after_index]
+        for pattern in self._automaton.find_all(text):
+            indices.extend(index for index in self._literal_indices[pattern] if index > after_index)
+        indices.sort()
+        return indices
+
+    def apply_word_replacement(self, text):
+        candidates = self._candidates(text, -1)
+        position = 0
+        while position < len(candidates):
+            index = candidates[position]
+            is_regex, before, after = self._rules[index]
+            new_text = before.sub(after, text) if is_regex else text.replace(before, after)
+            if new_text != text:
+                text = new_text
+                # 文本变了，之前没有出现的模式可能出现了，重新扫描
+                candidates = self._candidates(text, index)
+                position = 0
+            else:
+                position += 1
+        return text
+
+    def normalize(self, text):
+        """依次应用缩写词和文本替换规则。"""
+        return self.apply_word_replacement(self.apply_fixed_collocation(text))
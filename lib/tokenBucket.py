@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限速：平均每秒 rate 个令牌，最多积累 burst 个，即允许短时间内连续发出 burst 个请求。
+    线程安全。
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate (float): 每秒补充的令牌数，0 或负数表示不限速。
+            burst (int): 桶的容量。
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def try_take(self):
+        """有令牌时取走一个并返回 True，否则返回 False。"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def wait_time(self):
+        """返回还要等待多少秒才会有下一个令牌。"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def take(self, stop=None):
+        """
+        阻塞直到取得一个令牌。
+
+        Args:
+            stop (threading.Event): 可选，被设置时放弃等待。
+
+        Returns:
+            bool: 取得令牌返回 True，因 stop 被设置而放弃时返回 False。
+        """
+        while not self.try_take():
+            delay = self.wait_time()
+            if stop is not None:
+                if stop.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+        return True
@@ -0,0 +1,309 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+class TTSClientError(Exception):
+    """TTS 请求失败（网络错误或服务端返回非 200）。"""
+
+
+class CircuitOpenError(TTSClientError):
+    """熔断器处于打开状态，请求被直接拒绝。"""
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器：连续失败达到阈值后打开，在冷却时间内直接拒绝请求；
+    冷却结束后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """返回当前是否允许发出请求。"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # 半开状态只放行一个试探请求
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def ready(self):
+        """
+        返回现在是否会放行请求，但不改变状态（不占用半开状态的试探名额）。
+        打开状态下冷却时间已过时返回 True，下一次 allow() 会进入半开状态。
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_timeout
+            return not self._trial_in_flight
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        """
+        请求没有得到结果就被放弃（例如流式下载被调用方中途关闭）。半开状态下的试探请求按失败处理，
+        重新打开后等待下一次试探；其他状态不计入连续失败次数，服务端并没有出错。
+        """
+        with self._lock:
+            if self.state != self.HALF_OPEN:
+                return
+        self.record_failure()
+
+
+# 当前线程中建立连接（DNS、TCP、TLS）累计花费的秒数，由 _TimedAdapter 创建的连接写入
+_connect_time = threading.local()
+
+
+def _timed_connection(base):
+    class TimedConnection(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                _connect_time.seconds = getattr(_connect_time, 'seconds', 0.0) + time.perf_counter() - start
+    TimedConnection.__name__ = f'Timed{base.__name__}'
+    return TimedConnection
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _timed_connection(HTTPConnection)
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _timed_connection(HTTPSConnection)
+
+
+class _TimedAdapter(HTTPAdapter):
+    """记录建连耗时的 HTTPAdapter，复用已有连接时耗时为 0。"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class TTSClient:
+    """
+    长连接的 TTS 客户端。
+
+    内部持有一个 requests.Session 和连接池，复用到 BASE_URL 的 TCP/TLS 连接，
+    并提供分段超时、带退避的重试以及熔断。
+    """
+
+    # 这些状态码视为服务端的暂时性错误，会重试并计入熔断
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, url, pool_size=4, connect_timeout=3.0, read_timeout=10.0,
+                 max_retries=2, retry_backoff=0.3, failure_threshold=3, reset_timeout=15.0):
+        """
+        Args:
+            url (str): 完整的 API 地址。
+            pool_size (int): 连接池大小。
+            connect_timeout (float): 建立连接的超时（秒）。
+            read_timeout (float): 读取响应的超时（秒）。
+            max_retries (int): 暂时性错误的最大重试次数。
+            retry_backoff (float): 重试退避系数，第 n 次重试前等待 backoff * 2^(n-1) 秒。
+            failure_threshold (int): 连续失败多少次后打开熔断器。
+            reset_timeout (float): 熔断器打开后的冷却时间（秒）。
+        """
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=frozenset(['HEAD', 'GET', 'POST']),
+            raise_on_status=False,
+        )
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config, url=None):
+        """根据 Config 对象创建客户端，url 为 None 时使用 FULL_API_URL。"""
+        return cls(
+            url or config.FULL_API_URL,
+            pool_size=config.POOL_SIZE,
+            connect_timeout=config.CONNECT_TIMEOUT,
+            read_timeout=config.READ_TIMEOUT,
+            max_retries=config.MAX_RETRIES,
+            retry_backoff=config.RETRY_BACKOFF,
+            failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=config.CIRCUIT_RESET_TIMEOUT,
+        )
+
+    def synthesize(self, ssml, headers, timings=None):
+        """
+        发送一次合成请求。
+
+        Args:
+            ssml (str): SSML 文本。
+            headers (dict): 请求头。
+            timings (dict): 不为 None 时写入各阶段耗时（毫秒）：connect（建立连接）、
+                            server（发出请求到收到响应头）、download（接收响应体）。
+
+        Returns:
+            bytes: 音频数据。
+
+        Raises:
+            CircuitOpenError: 熔断器打开，请求未发出。
+            TTSClientError: 请求失败。
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.url}, request rejected.")
+
+        _connect_time.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                url=self.url,
+                headers=headers,
+                data=ssml.encode('utf-8'),
+                timeout=self.timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            raise TTSClientError(f"Request failed: {e}") from e
+        if timings is not None:
+            self._fill_timings(timings, response, time.perf_counter() - start)
+
+        if response.status_code == 200:
+            self.breaker.record_success()
+            return response.content
+
+        # 4xx（如鉴权失败）说明端点仍然存活，不计入熔断
+        if response.status_code in self.RETRY_STATUS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        raise TTSClientError(f"TTS API Error: {response.status_code} - {response.text}")
+
+    def synthesize_stream(self, ssml, headers, chunk_size=4096, timings=None):
+        """
+        以流式方式发送合成请求，边接收边返回音频数据块。
+
+        Args:
+            ssml (str): SSML 文本。
+            headers (dict): 请求头。
+            chunk_size (int): 每次读取的字节数。
+            timings (dict): 同 synthesize()，connect 和 server 在返回第一个数据块之前写入，
+                            download 在数据全部接收后写入。
+
+        Yields:
+            bytes: 音频数据块。
+
+        Raises:
+            CircuitOpenError: 熔断器打开，请求未发出。
+            TTSClientError: 请求失败或传输中断。
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.url}, request rejected.")
+
+        _connect_time.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                url=self.url,
+                headers=headers,
+                data=ssml.encode('utf-8'),
+                timeout=self.timeout,
+                stream=True,
+            )
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            raise TTSClientError(f"Request failed: {e}") from e
+        if timings is not None:
+            self._fill_timings(timings, response, time.perf_counter() - start)
+
+        recorded = False
+        try:
+            with response:
+                if response.status_code != 200:
+                    recorded = True
+                    if response.status_code in self.RETRY_STATUS:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    raise TTSClientError(f"TTS API Error: {response.status_code} - {response.text}")
+
+                start = time.perf_counter()
+                try:
+                    yield from response.iter_content(chunk_size=chunk_size)
+                except requests.exceptions.RequestException as e:
+                    recorded = True
+                    self.breaker.record_failure()
+                    raise TTSClientError(f"Stream interrupted: {e}") from e
+                recorded = True
+                self.breaker.record_success()
+                if timings is not None:
+                    timings['download'] = (time.perf_counter() - start) * 1000
+        finally:
+            # 调用方中途关闭生成器（GeneratorExit）或处理数据块时出错：结果没有记录，
+            # 半开状态的试探请求不能一直留在进行中，否则熔断器再也不会放行请求
+            if not recorded:
+                self.breaker.record_abandoned()
+
+    @staticmethod
+    def _fill_timings(timings, response, total):
+        # response.elapsed 从发出请求算到解析完响应头，包括建立连接和重试
+        elapsed = response.elapsed.total_seconds()
+        connect = min(getattr(_connect_time, 'seconds', 0.0), elapsed)
+        timings['connect'] = connect * 1000
+        timings['server'] = (elapsed - connect) * 1000
+        timings['download'] = max(total - elapsed, 0.0) * 1000
+
+    def warm_up(self):
+        """预先建立到服务端的连接，使第一次合成不必再握手。失败时静默忽略。"""
+        try:
+            self.session.head(self.url, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            pass
+
+    def close(self):
+        """关闭连接池。"""
+        self.session.close()
@@ -1,14 +1,27 @@
+import copy
 import hashlib
 import json
+import os
+import queue
 import re
-
-import requests
-import pygame
+import sys
 import time
 import threading
-import queue
 from pathlib import Path
 
+from lib.audioCache import AudioCache
+from lib.audioPostProcessor import AudioPostProcessor
+from lib.packedAudioCache import PackedAudioCache
+from lib.audioStream import AudioStream, mixer_settings_for
+from lib.keyLocks import KeyLocks
+from lib.metrics import Trace, registry
+from lib.phraseIndex import PhraseIndex
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.textNormalizer import TextNormalizer
+
+# pygame（播放）和 requests（网络）加载较慢，分别在第一次调用 get_playback_engine() 和
+# get_tts_client() 时才导入，import 本模块本身不加载它们，也不启动任何线程。
+
 
 # --- 配置 ---
 class Config:
@@ -18,139 +31,430 @@ class Config:
         self.API_ENDPOINT = None
         self.BASE_URL = None
         self.FULL_API_URL = None
+        self.NORMALIZER = None
+        # 网络相关的可选配置，可在 sound_model.json 中覆盖
+        self.POOL_SIZE = 4
+        self.CONNECT_TIMEOUT = 3.0
+        self.READ_TIMEOUT = 10.0
+        self.MAX_RETRIES = 2
+        self.RETRY_BACKOFF = 0.3
+        self.CIRCUIT_FAILURE_THRESHOLD = 3
+        self.CIRCUIT_RESET_TIMEOUT = 15.0
+        # 除 BASE_URL 外的其他合成后端（镜像或本地桩），以及超过第一个后端延迟的 p95 时是否向下一个后端对冲
+        self.BACKENDS = []
+        self.HEDGE_REQUESTS = True
+        self.HEDGE_PERCENTILE = 95
+        self.HEDGE_MIN_MS = 50.0
+        # 流式合成：缓存未命中时边下载边播放
+        self.STREAMING = False
+        self.STREAM_PREBUFFER_MS = 300
+        # 长文本分句：按标点切分后并行合成、按顺序播放
+        self.CHUNKING = False
+        self.CHUNK_MIN_LENGTH = 8
+        # 缓存的存储方式：files（每条语音一个 MP3 文件）或 pack（所有语音追加到一个文件中，通过 mmap 读取）
+        self.CACHE_BACKEND = 'files'
+        # 缓存容量上限（0 表示不限制）与淘汰策略（lru / lfu）
+        self.CACHE_MAX_BYTES = 0
+        self.CACHE_MAX_ENTRIES = 0
+        self.CACHE_POLICY = 'lru'
+        # 多个进程共用缓存目录时，同一条语音只由一个进程合成；持有者崩溃后锁在多少秒后过期
+        self.CACHE_LOCK_LEASE = 60.0
+        # 播放队列：等待中的请求数上限（0 表示不限制）、超出时丢弃最旧（oldest）还是最新（newest）的请求，
+        # 以及是否合并连续的重复请求
+        self.PLAYBACK_QUEUE_MAX_DEPTH = 0
+        self.PLAYBACK_QUEUE_DROP = 'oldest'
+        self.PLAYBACK_COALESCE = True
+        # 快捷键：按下后超过 HOTKEY_TTL 秒仍未开始播放就丢弃（0 表示不丢弃），
+        # 每秒最多触发 HOTKEY_MAX_RATE 次、允许连续触发 HOTKEY_BURST 次（0 表示不限制）
+        self.HOTKEY_TTL = 5.0
+        self.HOTKEY_MAX_RATE = 5.0
+        self.HOTKEY_BURST = 3
+        # 已解码音频的内存缓存预算，以及可以放进内存的单个 MP3 文件大小上限
+        self.MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+        self.MEMORY_CACHE_MAX_CLIP_BYTES = 256 * 1024
+        # 合成线程数，以及其中最多可以被后台预热/预取占用的线程数
+        self.SYNTHESIS_WORKERS = 4
+        self.PREWARM_WORKERS = 2
+        # 指标导出：每条语音的分阶段耗时写入 JSON Lines 文件（空字符串表示不写），
+        # 以及本机 HTTP 查询端口（0 表示不启动）
+        self.METRICS_JSONL_PATH = ''
+        self.METRICS_PORT = 0
+        # 无界面服务模式（server.py）的监听地址和端口
+        self.SERVER_HOST = '127.0.0.1'
+        self.SERVER_PORT = 8765
+        # 监视配置文件并自动重新加载；重新加载后是否删除过期的缓存条目、是否按新配置重新合成用过的文本
+        self.CONFIG_WATCH = True
+        self.CONFIG_WATCH_INTERVAL = 1.0
+        self.CACHE_GC_STALE = False
+        self.CACHE_REWARM_STALE = True
+        # 输入框中的推测合成：停止输入 SPECULATIVE_DEBOUNCE_MS 毫秒后在后台合成当前文本，
+        # 每秒最多向服务发出 SPECULATIVE_MAX_RATE 个推测请求
+        self.SPECULATIVE_SYNTHESIS = False
+        self.SPECULATIVE_DEBOUNCE_MS = 400
+        self.SPECULATIVE_MAX_RATE = 1.0
+        # 按使用频率预先合成常用短语：记录的短语数上限、频率的半衰期（天），
+        # 保持合成的短语数（0 表示不预取）和重新检查的间隔（秒）
+        self.PHRASE_HISTORY_MAX = 5000
+        self.PHRASE_HISTORY_HALF_LIFE_DAYS = 7
+        # 缓存键与原文的对应记录（用于配置变化后找出过期条目）的条数上限
+        self.PHRASE_INDEX_MAX = 20000
+        self.PREFETCH_TOP_PHRASES = 100
+        self.PREFETCH_INTERVAL = 600
+        # 后处理：去掉合成结果首尾的静音并统一响度，处理结果以 WAV 缓存（需要 numpy）
+        self.POSTPROCESS = False
+        self.SILENCE_THRESHOLD_DB = -45.0
+        self.LOUDNESS_TARGET_DB = -20.0
+        self.LOUDNESS_MAX_GAIN_DB = 12.0
+        self.config_paths = ()
+        self._reload_listeners = []
+        self._lock = threading.Lock()
         self.load(*config_path)
 
     def load(self, *config_path):
+        """重新读取全部三个配置文件。文件全部解析成功后才一次性替换当前配置。"""
         with open(config_path[0], 'r', encoding='utf-8') as f:
             data = json.load(f)
-            # 直接将字典的键值对作为实例属性
-            self.__dict__.update(data)
-        # 计算派生属性
-        self.FULL_API_URL = self.BASE_URL + self.API_ENDPOINT
 
         with open(config_path[1], 'r', encoding='utf-8') as f:
-            self.FIXED_COLLOCATION = json.loads(f.read())
+            fixed_collocation = json.loads(f.read())
 
         with open(config_path[2], 'r', encoding='utf-8') as f:
-            self.WORD_REPLACEMENT = json.loads(f.read())
+            word_replacement = json.loads(f.read())
 
+        # 规则在加载时一次性编译
+        normalizer = TextNormalizer(fixed_collocation, word_replacement)
 
-def search_fixed_collocation(text, config):
-    for collocation in config.FIXED_COLLOCATION:
-        if collocation["before"] == text:
-            return collocation["after"]
-    return text
+        with self._lock:
+            # 直接将字典的键值对作为实例属性
+            self.__dict__.update(data)
+            # 计算派生属性
+            self.FULL_API_URL = self.BASE_URL + self.API_ENDPOINT
+            self.FIXED_COLLOCATION = fixed_collocation
+            self.WORD_REPLACEMENT = word_replacement
+            self.NORMALIZER = normalizer
+            self.config_paths = config_path
+
+        for listener in self._reload_listeners:
+            listener(self)
+
+    def reload_file(self, path):
+        """
+        只重新读取一个配置文件，并只重新编译它对应的规则。
 
+        Args:
+            path (str): config_paths 中的某个文件。
 
-def re_search_word_replacement(text, replacement):
-    return re.sub(replacement["before"], replacement["after"], text)
+        Returns:
+            str: 重新加载的部分："sound_model"、"fixed_collocation" 或 "word_replacement"。
+
+        Raises:
+            ValueError: path 不是当前使用的配置文件。
+            OSError, json.JSONDecodeError: 读取或解析失败，此时配置保持不变。
+        """
+        paths = [os.path.abspath(p) for p in self.config_paths]
+        try:
+            index = paths.index(os.path.abspath(path))
+        except ValueError:
+            raise ValueError(f"Not a config file: {path}") from None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if index == 0:
+            part = 'sound_model'
+            updates = dict(data, FULL_API_URL=data.get('BASE_URL', self.BASE_URL) +
+                           data.get('API_ENDPOINT', self.API_ENDPOINT))
+        elif index == 1:
+            part = 'fixed_collocation'
+            updates = {'FIXED_COLLOCATION': data, 'NORMALIZER': self.NORMALIZER.with_fixed_collocation(data)}
+        else:
+            part = 'word_replacement'
+            updates = {'WORD_REPLACEMENT': data, 'NORMALIZER': self.NORMALIZER.with_word_replacement(data)}
+        with self._lock:
+            self.__dict__.update(updates)
+
+        for listener in self._reload_listeners:
+            listener(self)
+        return part
+
+    def snapshot(self):
+        """
+        返回当前配置的一份浅拷贝。一次请求从头到尾使用同一份快照，
+        处理过程中配置被重新加载也不会混用新旧两套设置。
+        """
+        with self._lock:
+            return copy.copy(self)
+
+    def add_reload_listener(self, listener):
+        """注册一个回调，在每次 load() 或 reload_file() 完成后以 config 为参数调用。"""
+        self._reload_listeners.append(listener)
+
+
+def search_fixed_collocation(text, config):
+    return config.NORMALIZER.apply_fixed_collocation(text)
 
 
 def search_word_replacement(text, config):
-    for replacement in config.WORD_REPLACEMENT:
-        if replacement["re"]:
-            text = re_search_word_replacement(text, replacement)
+    return config.NORMALIZER.apply_word_replacement(text)
+
+
+# 分句用的正则：中文标点后直接切分；英文标点只在后面跟空白时切分，避免切开 "1,000"、"3.5" 之类的数字
+_SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[。！？，；…\n])|(?<=[.!?,;])(?=\s)')
+
+
+def split_sentences(text, min_length=8):
+    """
+    按句子和分句标点切分文本，标点保留在所在片段的末尾。
+
+    过短的片段会与后一个片段合并，避免产生大量只有一两个字的请求。
+
+    Args:
+        text (str): 要切分的文本。
+        min_length (int): 每个片段的最少字符数（最后一个片段除外）。
+
+    Returns:
+        list: 切分后的文本片段。
+    """
+    chunks = []
+    current = ''
+    for piece in _SENTENCE_SPLIT_PATTERN.split(text):
+        current += piece
+        if len(current.strip()) >= min_length:
+            chunks.append(current.strip())
+            current = ''
+    if current.strip():
+        if chunks and len(current.strip()) < min_length:
+            chunks[-1] += current.rstrip()
         else:
-            text = text.replace(replacement["before"], replacement["after"])
-    return text
+            chunks.append(current.strip())
+    return chunks
+
+
+def normalize_text(text, config):
+    """依次应用缩写词和文本替换规则，得到实际送去合成的文本。"""
+    return config.NORMALIZER.normalize(text)
+
+
+def utterance_parts(text, config):
+    """
+    返回一段已规范化的文本实际会被拆成的合成单元，每个单元对应一个缓存条目。
+
+    Returns:
+        list: 启用分句且文本可以切分时为各个片段，否则为只含原文本的列表。
+    """
+    if config.CHUNKING:
+        chunks = split_sentences(text, config.CHUNK_MIN_LENGTH)
+        if len(chunks) > 1:
+            return chunks
+    return [text]
 
 
 # --- 配置结束 ---
 
-# 创建一个全局的播放队列
-_playback_queue = queue.Queue()
+# 共享的音频缓存，缓存配置变化时重建
+_cache = None
+_cache_settings = None
+_cache_lock = threading.Lock()
 
-# 播放线程的控制事件
-_stop_playback = threading.Event()
 
+def get_audio_cache(config):
+    """获取与当前配置对应的音频缓存。"""
+    global _cache, _cache_settings
+    settings = (config.CACHE_BACKEND, config.STORED_FILEPATH, config.CACHE_MAX_BYTES, config.CACHE_MAX_ENTRIES,
+                config.CACHE_POLICY)
+    with _cache_lock:
+        if _cache is None or _cache_settings != settings:
+            if _cache is not None:
+                _cache.close()
+            if config.CACHE_BACKEND == 'pack':
+                _cache = PackedAudioCache.from_config(config)
+            elif config.CACHE_BACKEND == 'files':
+                _cache = AudioCache.from_config(config)
+            else:
+                raise ValueError(f"Unknown cache backend: {config.CACHE_BACKEND}")
+            _cache_settings = settings
+        return _cache
 
-def _playback_worker():
-    """播放队列中的音频文件的工作线程。"""
-    while not _stop_playback.is_set():
-        try:
-            # 从队列中获取下一个要播放的文件路径
-            # block=True, timeout=1.0 避免无限阻塞，允许检查 _stop_playback
-            mp3_file_path = _playback_queue.get(timeout=1.0)
-
-            # 处理获取到的路径
-            file_path = Path(mp3_file_path)
-            if not file_path.exists() or not file_path.is_file():
-                print(f"Playback Error: File not found or invalid: {file_path}")
-                _playback_queue.task_done()  # 标记此任务完成
-                continue
-
-            # 初始化 mixer (如果需要)
-            if not pygame.mixer.get_init():
-                try:
-                    pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
-                    print("Pygame mixer initialized by worker.")
-                except pygame.error as e:
-                    print(f"Failed to initialize pygame mixer: {e}")
-                    _playback_queue.task_done()
-                    continue
 
-            try:
-                print(f"Playing: {file_path}")
-                pygame.mixer.music.load(file_path)
-                pygame.mixer.music.play()
+# 缓存键与原始文本的对应记录，缓存目录变化时重建
+_phrases = None
+_phrases_settings = None
+_phrases_lock = threading.Lock()
 
-                # 等待播放完成
-                while pygame.mixer.music.get_busy() and not _stop_playback.is_set():
-                    time.sleep(0.1)
 
-                # 如果是因为停止信号中断的，可能需要停止音乐
-                if _stop_playback.is_set():
-                    pygame.mixer.music.stop()
-                    print("Playback stopped by shutdown signal.")
+# 跨进程的按键锁，缓存目录变化时重建
+_locks = None
+_locks_settings = None
 
-                print(f"Finished playing: {file_path}")
 
-            except pygame.error as e:
-                print(f"Pygame error playing {file_path}: {e}")
-            except Exception as e:
-                print(f"Unexpected error in playback worker: {e}")
+def get_key_locks(config):
+    """获取缓存目录对应的按键锁。"""
+    global _locks, _locks_settings
+    settings = (config.STORED_FILEPATH, config.CACHE_LOCK_LEASE)
+    with _cache_lock:
+        if _locks is None or _locks_settings != settings:
+            _locks = KeyLocks(config.STORED_FILEPATH, config.CACHE_LOCK_LEASE)
+            _locks_settings = settings
+        return _locks
 
-            finally:
-                # 标记队列中的这个任务已完成
-                _playback_queue.task_done()
 
-        except queue.Empty:
-            # 队列为空，继续循环（等待新任务）
-            continue
-        except Exception as e:
-            print(f"Unexpected error in playback worker loop: {e}")
-            # 即使出错，也尽量继续循环
-            time.sleep(0.1)
+def get_phrase_index(config):
+    """获取与当前缓存目录对应的 PhraseIndex。"""
+    global _phrases, _phrases_settings
+    settings = (config.STORED_FILEPATH, config.PHRASE_HISTORY_MAX, config.PHRASE_HISTORY_HALF_LIFE_DAYS,
+                config.PHRASE_INDEX_MAX)
+    with _phrases_lock:
+        if _phrases is None or _phrases_settings != settings:
+            if _phrases is not None:
+                _phrases.close()
+            _phrases = PhraseIndex(config.STORED_FILEPATH, config.PHRASE_HISTORY_MAX,
+                                   config.PHRASE_HISTORY_HALF_LIFE_DAYS * 24 * 3600, config.PHRASE_INDEX_MAX)
+            _phrases_settings = settings
+        return _phrases
+
+
+# 合成结果的后处理，缓存目录或处理参数变化时重建
+_postprocessor = None
+_postprocessor_settings = None
+_postprocessor_lock = threading.Lock()
 
 
-# 启动播放工作线程
-_playback_thread = threading.Thread(target=_playback_worker, daemon=True)
-_playback_thread.start()
+def get_postprocessor(config):
+    """获取与当前配置对应的 AudioPostProcessor，并把处理结果登记到当前的音频缓存（音频缓存重建时重新登记）。"""
+    global _postprocessor, _postprocessor_settings
+    settings = (config.STORED_FILEPATH, config.SILENCE_THRESHOLD_DB, config.LOUDNESS_TARGET_DB,
+                config.LOUDNESS_MAX_GAIN_DB)
+    cache = get_audio_cache(config)
+    with _postprocessor_lock:
+        if _postprocessor is None or _postprocessor_settings != settings:
+            _postprocessor = AudioPostProcessor.from_config(config)
+            _postprocessor_settings = settings
+        if _postprocessor.cache is not cache:
+            _postprocessor.attach(cache)
+        return _postprocessor
 
 
-def text_to_speech_web_api(text, config):
+def _postprocessed(config, key, source, trace=None):
     """
-    模拟网页行为，通过POST请求调用TTS API生成语音。
+    返回缓存条目处理过的 WAV，还没有处理过时现在处理。
+
+    解码借用播放引擎的 mixer，因此只在本进程播放声音时处理：不播放声音的服务和批量合成不会为此启动 pygame，
+    mixer 还没就绪时也不等待，这一次先用原始音频，下次播放时再在后台处理。
+
+    Returns:
+        处理过的 WAV 路径；没有播放引擎、mixer 未就绪或处理失败时返回原来的 source。
+    """
+    engine = _player
+    if engine is None:
+        return source
+    processor = get_postprocessor(config)
+    path = processor.get(key)
+    if path is None and engine.wait_ready(0):
+        path = processor.process(key, source)
+    if trace is not None:
+        trace.lap('postprocess')
+    return path if path is not None else source
+
+
+# 共享的合成后端路由（BASE_URL 及其镜像），网络配置变化时重建
+_client = None
+_client_settings = None
+_client_lock = threading.Lock()
+
+
+def get_tts_client(config):
+    """获取与当前配置对应的合成后端路由，其中每个 HTTP 后端是一个长连接 TTSClient。"""
+    global _client, _client_settings
+    settings = (config.FULL_API_URL, config.POOL_SIZE, config.CONNECT_TIMEOUT, config.READ_TIMEOUT,
+                config.MAX_RETRIES, config.RETRY_BACKOFF, config.CIRCUIT_FAILURE_THRESHOLD,
+                config.CIRCUIT_RESET_TIMEOUT, json.dumps(config.BACKENDS, sort_keys=True), config.HEDGE_REQUESTS,
+                config.HEDGE_PERCENTILE, config.HEDGE_MIN_MS, config.SYNTHESIS_WORKERS)
+    with _client_lock:
+        if _client is None or _client_settings != settings:
+            from lib.synthesisBackends import BackendRouter
+            if _client is not None:
+                _client.close()
+            _client = BackendRouter.from_config(config)
+            _client_settings = settings
+        return _client
+
+
+# 事件驱动的播放引擎（带已解码音频的内存缓存），mixer 格式变化时重建
+_player = None
+_player_settings = None
+_player_lock = threading.Lock()
+# 播放引擎创建之前请求预加载的 PreparedSpeech，创建引擎之后再预加载
+_deferred_preload = []
+
+
+def get_playback_engine(config=None):
+    """
+    获取播放引擎。第一次调用时加载 pygame、启动播放线程，并在播放线程中立即初始化 mixer；
+    mixer 的采样率和声道数与 OUTPUT_FORMAT 一致。
 
     Args:
-        text (str): 要合成的文本。
-        config: 配置文件,包含以下内容：
-            BASE_URL: API网址基址
-            API_ENDPOINT: API位置
-            API_KEY: 字面意思
-            OUTPUT_FORMAT: "audio-24khz-48kbitrate-mono-mp3", 不建议更改
-            VOICE: 微软的讲述人模型
-            VOICE_STYLE: 讲述人的情感配置
-            SPEED: 百分比语速
-            PITCH: 百分比语调
+        config: TTS 配置对象；为 None 时返回已有的引擎，还没有时按默认设置创建。
+    """
+    global _player, _player_settings
+    with _player_lock:
+        if config is None:
+            if _player is not None:
+                return _player
+            settings = mixer_settings_for('')
+        else:
+            settings = mixer_settings_for(config.OUTPUT_FORMAT)
+        if _player is None or _player_settings != settings:
+            from lib.playbackEngine import PlaybackEngine
+            from lib.soundCache import SoundCache
+            if _player is not None:
+                # 已解码的 Sound 与 mixer 格式绑定，换格式时连同内存缓存一起重建
+                _player.stop()
+                cleanup_pygame()
+            _player = PlaybackEngine(SoundCache(), settings)
+            _player.start()
+            _player_settings = settings
+            deferred = _deferred_preload[:]
+            del _deferred_preload[:]
+            _submit_preload(_player, deferred)
+        if config is not None:
+            _player.sound_cache.configure(config.MEMORY_CACHE_BYTES, config.MEMORY_CACHE_MAX_CLIP_BYTES)
+            _player.configure_queue(config.PLAYBACK_QUEUE_MAX_DEPTH, config.PLAYBACK_QUEUE_DROP,
+                                    config.PLAYBACK_COALESCE)
+        return _player
+
+
+def warm_up(config, playback=True):
+    """
+    在后台加载播放和网络模块、初始化音频设备并预先建立到 TTS 服务的连接，
+    应在窗口显示之后尽早调用，使第一条语音不必承担这些启动开销。
+
+    Args:
+        config: TTS 配置对象。
+        playback (bool): 是否初始化播放引擎；不播放声音的服务模式传入 False。
 
     Returns:
-        bytes: 返回的音频数据 (MP3 bytes)，如果成功。
-               返回 None 如果请求失败。
-               :param text:
-               :param config:
+        threading.Thread: 执行预热的后台线程。
     """
-    # 1. 构造 SSML
+    def run():
+        if playback:
+            get_playback_engine(config)
+        get_tts_client(config).warm_up()
+
+    thread = threading.Thread(target=run, name='tts-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+registry.add_provider('memory_cache', lambda: _player.sound_cache.stats() if _player is not None else {})
+registry.add_provider('disk_cache', lambda: _cache.stats() if _cache is not None else {})
+registry.add_provider('cache_locks', lambda: _locks.stats() if _locks is not None else {})
+registry.add_provider('postprocess', lambda: _postprocessor.stats() if _postprocessor is not None else {})
+registry.add_provider('backends', lambda: _client.stats() if _client is not None else {})
+registry.add_provider('executor', lambda: _executor.stats() if _executor is not None else {})
+registry.add_provider('playback', lambda: _player.stats() if _player is not None else {})
+
+
+def build_ssml(text, config):
+    """根据配置构造 SSML。"""
     # 根据 voice_style 决定是否添加 <mstts:express-as> 标签
     vs_start = f'<mstts:express-as style="{config.VOICE_STYLE}">' if config.VOICE_STYLE.lower() != 'general' else ''
     vs_end = '</mstts:express-as>' if config.VOICE_STYLE.lower() != 'general' else ''
@@ -166,53 +470,115 @@ def text_to_speech_web_api(text, config):
                   {vs_end}
                 </voice>
               </speak>'''
+    return ssml
 
-    # 2. 准备 Headers
+
+def build_headers(config):
+    """根据配置构造请求头。"""
     headers = {
         'Output-Format': config.OUTPUT_FORMAT,
         'Content-Type': 'application/ssml+xml',
         'FFCafe-Access-Token': config.API_KEY,  # 使用您的 API Key
         'Voice-Variant': config.VOICE.lower(),  # 语音变体，小写
     }
+    return headers
 
-    # 3. 发送 POST 请求
-    try:
-        response = requests.post(
-            url=config.FULL_API_URL,
-            headers=headers,
-            data=ssml.encode('utf-8'),  # 确保 SSML 字符串以 UTF-8 编码发送
-            timeout=30  # 设置超时，避免请求挂起
-        )
-
-        # 4. 检查响应状态
-        if response.status_code == 200:
-            # 成功，返回音频数据 (bytes)
-            return response.content
-        else:
-            print(f"TTS API Error: {response.status_code} - {response.text}")
-            return None
 
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
+def text_to_speech_web_api(text, config, timings=None):
+    """
+    模拟网页行为，通过POST请求调用TTS API生成语音。
+    请求经由共享的后端路由发出：复用连接池，带有重试和熔断，并在主服务响应慢或失败时对冲或切换到镜像。
+
+    Args:
+        text (str): 要合成的文本。
+        config: 配置文件,包含以下内容：
+            BASE_URL: API网址基址
+            API_ENDPOINT: API位置
+            API_KEY: 字面意思
+            OUTPUT_FORMAT: "audio-24khz-48kbitrate-mono-mp3", 不建议更改
+            VOICE: 微软的讲述人模型
+            VOICE_STYLE: 讲述人的情感配置
+            SPEED: 百分比语速
+            PITCH: 百分比语调
+        timings (dict): 不为 None 时写入 connect、server、download 三个阶段的耗时（毫秒）。
+
+    Returns:
+        bytes: 返回的音频数据 (MP3 bytes)，如果成功。
+               返回 None 如果请求失败。
+               :param text:
+               :param config:
+    """
+    from lib.ttsClient import TTSClientError
+
+    # 1. 构造 SSML 和 Headers
+    ssml = build_ssml(text, config)
+    headers = build_headers(config)
+
+    # 2. 通过共享的长连接客户端发送 POST 请求
+    try:
+        return get_tts_client(config).synthesize(ssml, headers, timings)
+    except TTSClientError as e:
+        print(e)
         return None
 
 
+def text_to_speech_web_api_stream(text, config, stream, file_path, timings=None):
+    """
+    以流式方式调用 TTS API，把收到的数据同时交给播放流和写入缓存文件。
+
+    数据先写入临时文件，下载完整并校验通过后才登记为正式的缓存条目，避免留下半截的 MP3。
+
+    Args:
+        text (str): 要合成的文本。
+        config: 配置文件。
+        stream (AudioStream): 接收数据的播放流。
+        file_path (Path): 缓存文件路径。
+        timings (dict): 同 text_to_speech_web_api()。
+
+    Returns:
+        bool: 下载成功返回 True，失败返回 False。
+    """
+    from lib.ttsClient import TTSClientError
+
+    temp_path = file_path.with_name(file_path.name + f'.{os.getpid()}.{threading.get_ident()}.part')
+    try:
+        with open(temp_path, 'wb') as f:
+            chunks = get_tts_client(config).synthesize_stream(build_ssml(text, config), build_headers(config),
+                                                              timings=timings)
+            for chunk in chunks:
+                stream.feed(chunk)
+                f.write(chunk)
+        stream.finish()
+        if get_audio_cache(config).commit_file(file_path.stem, temp_path) is None:
+            return False
+        print(f"Audio saved to {file_path.stem}")
+        return True
+    except (TTSClientError, OSError) as e:
+        print(e)
+        stream.fail()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+
 def save_audio_to_file(audio_bytes, config, filename):
     """将音频字节数据保存为文件"""
     if audio_bytes:
-        with open(file=f'{config.STORED_FILEPATH}/{filename}.mp3', mode='wb') as f:
-            f.write(audio_bytes)
-        print(f"Audio saved to {filename}")
+        if get_audio_cache(config).put(filename, audio_bytes) is not None:
+            print(f"Audio saved to {filename}")
     else:
         print("No audio data to save.")
 
 
-def play_mp3_file(mp3_file_path):
+def play_mp3_file(mp3_file_path, wait_timeout=30.0):
     """
-    播放指定的 MP3 文件。
+    播放指定的 MP3 文件，并阻塞直到播放结束。
 
     Args:
         mp3_file_path (str or Path): MP3 文件的路径。
+        wait_timeout (float): 文件尚未生成时最多等待的秒数。
 
     Returns:
         bool: 播放成功返回 True，失败返回 False。
@@ -220,92 +586,492 @@ def play_mp3_file(mp3_file_path):
     # 确保路径是 Path 对象以便检查
     file_path = Path(mp3_file_path)
 
-    # 1. 等待文件出现
+    # 1. 等待文件出现，超时则放弃（合成失败时文件永远不会出现）
+    deadline = time.monotonic() + wait_timeout
     while not file_path.exists():
-        pass
+        if time.monotonic() >= deadline:
+            print(f"Error: File did not appear in time: {file_path}")
+            return False
+        time.sleep(0.05)
 
     if not file_path.is_file():
         print(f"Error: Path is not a file: {file_path}")
         return False
 
-    # 2. 初始化 pygame mixer (如果尚未初始化)
-    # 这通常只需要在整个程序启动时做一次
-    # 如果 mixer 已经初始化，再次调用 init() 通常无害，但最好检查一下
-    if not pygame.mixer.get_init():
-        try:
-            # 根据您的音频文件调整参数 (可选，通常不指定也能工作)
-            # frequency: 音频采样率, size: 位深度, channels: 声道数
-            pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
-            print("Pygame mixer initialized.")
-        except pygame.error as e:
-            print(f"Failed to initialize pygame mixer: {e}")
-            return False
+    # 2. 交给播放引擎，等待播放结束
+    item = play_in_background_queued(file_path)
+    item.wait()
+    return item.error is None and not item.interrupted and item.dropped is None
 
-    try:
-        # 3. 加载 MP3 文件
-        pygame.mixer.music.load(file_path)
 
-        # 4. 播放音频
-        pygame.mixer.music.play()
+# 合成线程池的优先级数值越小越重要，播放引擎则是数值越大越先播放；按这张表换算
+PLAYBACK_PRIORITY = {
+    SynthesisExecutor.INTERACTIVE: 3,
+    SynthesisExecutor.HOTKEY: 2,
+    SynthesisExecutor.SPECULATIVE: 1,
+    SynthesisExecutor.PREFETCH: 0,
+}
 
-        # 5. 等待播放完成 (阻塞当前线程)
-        # 这个循环检查 mixer 是否还在忙于播放
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)  # 小休一下，避免占用过多CPU
 
-        print(f"Playback finished: {file_path}")
-        return True
+def play_in_background_queued(mp3_path, priority=0, mode='queue', trace=None, ticket=None):
+    """
+    将播放请求添加到队列中。
 
-    except pygame.error as e:
-        print(f"Pygame error playing {file_path}: {e}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error playing {file_path}: {e}")
-        return False
+    Args:
+        mp3_path: 文件路径或 AudioStream。
+        priority (int): 播放优先级，数值越大越先播放；合成线程池的优先级要先经 PLAYBACK_PRIORITY 换算。
+        mode (str): queue（排队）、interrupt（打断当前播放）或 duck（压低当前播放的音量同时播放）。
+        trace (Trace): 可选的分阶段计时，开始出声时结束。
+        ticket (PlaybackTicket): 可选的播放凭据（过期丢弃、latest-wins），见 PlaybackEngine.ticket()。
+
+    Returns:
+        PlaybackItem: 可以用来等待播放结束。
+    """
+    item = get_playback_engine().enqueue(mp3_path, priority, mode, trace, ticket)
+    if item.dropped is None:
+        print(f"Queued for playback: {mp3_path}")
+    return item
 
 
-def play_in_background_queued(mp3_path):
-    """将播放请求添加到队列中。"""
-    _playback_queue.put(mp3_path)
-    print(f"Queued for playback: {mp3_path}")
+def preload_audio(source, config):
+    """把缓存中的音频提前解码进内存缓存，稍后播放时立即出声。"""
+    get_playback_engine(config).preload(source)
 
 
 def cleanup_pygame():
-    """清理 pygame 资源。"""
-    if pygame.mixer.get_init():
+    """清理 pygame 资源。pygame 从未加载时什么也不做。"""
+    pygame = sys.modules.get('pygame')
+    if pygame is not None and pygame.mixer.get_init():
         pygame.mixer.quit()
 
 
-def text_to_speech(text, config):
-    def target(text, config):
-        text = search_fixed_collocation(text, config)
-        text = search_word_replacement(text, config)
-        hashed_text = hashlib.md5(
-            f'{config.VOICE}{config.VOICE_STYLE}{config.SPEED}{config.PITCH}{text}'.encode('utf-8')).hexdigest()
-        cache_dir = Path(config.STORED_FILEPATH)
-        cache_file_path = cache_dir / f"{hashed_text}.mp3"
+def get_cache_key(text, config):
+    """根据语音配置和（已规范化的）文本计算缓存键。"""
+    return hashlib.md5(
+        f'{config.VOICE}{config.VOICE_STYLE}{config.SPEED}{config.PITCH}{text}'.encode('utf-8')).hexdigest()
 
-        # 如果缓存文件存在，将其加入播放队列
-        if cache_file_path.exists():
-            play_in_background_queued(cache_file_path)
-            return
 
-        # 缓存不存在，生成音频
-        audio_data = text_to_speech_web_api(text, config)
-        if audio_data:
-            save_audio_to_file(audio_data, config, hashed_text)
+def voice_scope(config):
+    """参与计算缓存键的语音设置，PhraseIndex 用它区分不同音色下的记录。"""
+    return f'{config.VOICE}|{config.VOICE_STYLE}|{config.SPEED}|{config.PITCH}'
+
+
+def synthesize_to_cache(text, config, hashed_text=None, trace=None):
+    """
+    确保文本对应的音频已在缓存中，未命中则合成并写入缓存。
+
+    共用缓存目录的其他进程正在合成同一个键时，等它写入缓存后直接使用，不再重复请求。
+
+    Args:
+        trace (Trace): 可选的分阶段计时，记录 synthesis_queue、connect、server、download、disk_write。
+
+    Returns:
+        缓存条目的播放来源（文件路径或 PackedClip，合成失败时条目不存在）。
+    """
+    if trace is not None:
+        trace.lap('synthesis_queue')
+    if hashed_text is None:
+        hashed_text = get_cache_key(text, config)
+    cache = get_audio_cache(config)
+    if hashed_text not in cache:
+        lease = get_key_locks(config).acquire(hashed_text, ready=lambda: hashed_text in cache)
+        if lease is not None:
+            with lease:
+                _synthesize_locked(text, config, hashed_text, cache, trace)
+    if config.POSTPROCESS and hashed_text in cache:
+        return _postprocessed(config, hashed_text, cache.source_for(hashed_text), trace)
+    return cache.source_for(hashed_text)
+
+
+def _synthesize_locked(text, config, hashed_text, cache, trace=None):
+    # 取得锁之前其他进程可能刚好写完
+    if cache.check(hashed_text):
+        return
+    timings = {}
+    audio_data = text_to_speech_web_api(text, config, timings)
+    if trace is not None:
+        for stage, ms in timings.items():
+            trace.add(stage, ms)
+        trace.lap()
+    if audio_data:
+        save_audio_to_file(audio_data, config, hashed_text)
+        if trace is not None:
+            trace.lap('disk_write')
+
+
+def _stream_to_cache(text, config, hashed_text, priority, trace=None, ticket=None):
+    """流式合成：把 AudioStream 立即加入播放队列，同时下载并写入缓存。"""
+    if trace is not None:
+        trace.lap('synthesis_queue')
+    cache = get_audio_cache(config)
+    lease = get_key_locks(config).acquire(hashed_text, ready=lambda: hashed_text in cache)
+    if lease is None or cache.check(hashed_text):
+        # 另一个进程已经合成好了，直接播放缓存
+        if lease is not None:
+            lease.release()
+        source = synthesize_to_cache(text, config, hashed_text)
+        play_in_background_queued(source, PLAYBACK_PRIORITY[priority], trace=trace, ticket=ticket)
+        return source
+    with lease:
+        return _stream_locked(text, config, hashed_text, priority, cache, trace, ticket)
+
+
+def _stream_locked(text, config, hashed_text, priority, cache, trace=None, ticket=None):
+    cache_file_path = cache.path_for(hashed_text)
+    stream = AudioStream(cache_file_path.name, config.STREAM_PREBUFFER_MS)
+    play_in_background_queued(stream, PLAYBACK_PRIORITY[priority], trace=trace, ticket=ticket)
+    timings = {}
+    text_to_speech_web_api_stream(text, config, stream, cache_file_path, timings)
+    # 边下载边播放时 trace 已在开始出声时结束，网络各阶段直接计入直方图
+    for stage, ms in timings.items():
+        registry.observe(f'stage.stream_{stage}', ms)
+    if config.POSTPROCESS and hashed_text in cache:
+        # 这一次已经边下载边播放了，处理结果留给下一次
+        return _postprocessed(config, hashed_text, cache.source_for(hashed_text))
+    return cache.source_for(hashed_text)
+
+
+# 共享的合成线程池
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_synthesis_executor(config):
+    """获取共享的合成线程池（第一次调用时按配置创建）。"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = SynthesisExecutor(config.SYNTHESIS_WORKERS, config.PREWARM_WORKERS)
+        return _executor
+
+
+# 规范化、查缓存、加入播放队列这一步很快，在单独的分派线程中按调用顺序执行，
+# 不与网络合成排在同一个优先级队列里；只有缓存未命中时才向合成线程池提交合成
+_dispatch_queue = queue.Queue()
+_dispatch_thread = None
+
+
+def dispatch(fn, *args):
+    """
+    在分派线程中执行 fn(*args)，第一次调用时启动分派线程。
+
+    text_to_speech 的分派步骤也在这个线程中执行。界面线程上需要查缓存或数据库、
+    又要与随后的 text_to_speech 保持先后顺序的轻量工作（例如推测合成）也交给它。
+    """
+    global _dispatch_thread
+    with _executor_lock:
+        if _dispatch_thread is None:
+            _dispatch_thread = threading.Thread(target=_run_dispatch, name='tts-dispatch', daemon=True)
+            _dispatch_thread.start()
+    _dispatch_queue.put((fn, args))
+
+
+def _run_dispatch():
+    while True:
+        fn, args = _dispatch_queue.get()
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"TTS dispatch failed: {e}")
+
+
+def synthesize_async(text, config, priority=SynthesisExecutor.INTERACTIVE, trace=None):
+    """
+    在合成线程池中确保文本对应的音频已在缓存中，同一缓存键的并发请求只会合成一次。
+
+    Returns:
+        Future: 结果为缓存条目的播放来源。
+    """
+    hashed_text = get_cache_key(text, config)
+    return get_synthesis_executor(config).submit(synthesize_to_cache, text, config, hashed_text, trace,
+                                                 priority=priority, key=hashed_text)
+
+
+def _play_when_ready(futures, priority, trace=None, ticket=None):
+    """
+    按原顺序把已完成的合成结果加入播放队列，前面的片段没好时后面的片段先等着。
+    trace 跟随第一个片段，ticket 由所有片段共用。
+    """
+    lock = threading.Lock()
+    next_index = [0]
+
+    def flush(_future):
+        with lock:
+            while next_index[0] < len(futures) and futures[next_index[0]].done():
+                future = futures[next_index[0]]
+                item_trace = trace if next_index[0] == 0 else None
+                next_index[0] += 1
+                if future.cancelled() or future.exception() is not None:
+                    error = future.exception() if not future.cancelled() else 'cancelled'
+                    print(f"Synthesis failed: {error}")
+                    if item_trace is not None:
+                        item_trace.finish(error=str(error))
+                    continue
+                if item_trace is not None:
+                    item_trace.lap('synthesis_wait')
+                play_in_background_queued(future.result(), PLAYBACK_PRIORITY[priority], trace=item_trace,
+                                          ticket=ticket)
+
+    for future in futures:
+        future.add_done_callback(flush)
+
+
+def speak_chunks(chunks, config, priority=SynthesisExecutor.INTERACTIVE, trace=None, ticket=None):
+    """
+    并行合成多个文本片段，并严格按原顺序加入播放队列。
+
+    每个片段单独缓存；第一个片段一就绪就开始播放，不必等待后面的片段。
+    """
+    futures = [synthesize_async(chunk, config, priority, trace if index == 0 else None)
+               for index, chunk in enumerate(chunks)]
+    _play_when_ready(futures, priority, trace, ticket)
+
+
+def _speak(text, config, priority, trace, ttl=0.0, replace=None):
+    trace.lap('queue_wait')
+    # 第一次播放前创建播放引擎（没有预热时会在这里加载 pygame），之后只是按配置调整内存缓存
+    engine = get_playback_engine(config)
+    # 每次请求一个凭据，同一请求的片段不会被当作重复请求合并
+    ticket = engine.ticket(replace, ttl)
+    trace.lap('engine_start')
+    raw_text = text
+    text = normalize_text(text, config)
+    trace.lap('normalize')
+
+    # 长文本按句切分，并行合成后按顺序播放
+    parts = utterance_parts(text, config)
+    if len(parts) > 1:
+        trace.attrs['chunks'] = len(parts)
+        keys = [get_cache_key(part, config) for part in parts]
+        cache = get_audio_cache(config)
+        missing = [key for key in keys if key not in cache]
+        speak_chunks(parts, config, priority, trace, ticket)
+        if missing:
+            get_phrase_index(config).record(raw_text, keys, voice_scope(config))
+        return
+
+    hashed_text = get_cache_key(text, config)
+    cache = get_audio_cache(config)
+
+    # 如果命中缓存，将其加入播放队列
+    cached_path = cache.get(hashed_text)
+    trace.lap('cache_lookup')
+    trace.attrs['cache_hit'] = cached_path is not None
+    registry.incr('cache_hit' if cached_path is not None else 'cache_miss')
+    if cached_path is not None:
+        if config.POSTPROCESS:
+            processed = get_postprocessor(config).get(hashed_text)
+            if processed is not None:
+                cached_path = processed
+            else:
+                # 这一次先播放原始音频，在后台处理好留给下一次
+                get_synthesis_executor(config).submit(_postprocessed, config, hashed_text, cached_path,
+                                                      priority=SynthesisExecutor.PREFETCH, key=f'post:{hashed_text}')
+        play_in_background_queued(cached_path, PLAYBACK_PRIORITY[priority], trace=trace, ticket=ticket)
+        return
+
+    executor = get_synthesis_executor(config)
+    if config.STREAMING:
+        # 缓存不存在，流式模式下边下载边播放；同一缓存键已在合成时等待其完成后再播放
+        future, created = executor.submit_or_join(_stream_to_cache, text, config, hashed_text, priority, trace,
+                                                  ticket, priority=priority, key=hashed_text)
+    else:
+        future = executor.submit(synthesize_to_cache, text, config, hashed_text, trace,
+                                 priority=priority, key=hashed_text)
+        created = False
+    if not created:
         # 将（可能刚创建的）文件加入播放队列
-        play_in_background_queued(cache_file_path)
+        _play_when_ready([future], priority, trace, ticket)
+    # 记下新条目对应的原文，配置变化后可以据此找出失效的缓存
+    get_phrase_index(config).record(raw_text, [hashed_text], voice_scope(config))
 
-    thread = threading.Thread(target=target, args=(text, config), daemon=True)
-    thread.start()
+
+def _speak_and_record(text, config, priority, trace, ttl=0.0, replace=None):
+    _speak(text, config, priority, trace, ttl, replace)
+    # 播放请求发出之后再记录使用频率，不占用出声之前的时间
+    get_phrase_index(config).use(text)
+
+
+_TRACE_SOURCES = {
+    SynthesisExecutor.INTERACTIVE: 'interactive',
+    SynthesisExecutor.HOTKEY: 'hotkey',
+    SynthesisExecutor.SPECULATIVE: 'speculative',
+    SynthesisExecutor.PREFETCH: 'prefetch',
+}
+
+
+def text_to_speech(text, config, priority=SynthesisExecutor.INTERACTIVE, trace=None, ttl=0.0, replace=None):
+    """
+    异步合成并播放一段文本。
+
+    每次调用都会记录一条从调用到开始出声的分阶段计时（见 lib.metrics）。
+
+    Args:
+        text (str): 原始文本。
+        config: 配置文件。
+        priority (int): SynthesisExecutor.INTERACTIVE / HOTKEY / PREFETCH。
+        trace (Trace): 调用方已经开始的计时（例如从按下快捷键算起），None 时从这里开始计时。
+        ttl (float): 超过该秒数仍未开始播放就丢弃，0 表示不丢弃。
+        replace (str): 非空时，同一 replace 值的新请求取代还没开始播放的旧请求（latest-wins）。
+    """
+    if trace is None:
+        trace = Trace(_TRACE_SOURCES.get(priority, str(priority)))
+    # 整个请求使用同一份配置快照，期间配置被热重载也不受影响
+    config = config.snapshot()
+    trace.lap('dispatch')
+    dispatch(_speak_and_record, text, config, priority, trace, ttl, replace)
+
+
+class PreparedSpeech:
+    """
+    一段固定文本（例如快捷键文本）预先完成的准备工作：规范化、切分和缓存键。
+
+    各片段的播放来源在合成线程池中查好保存在 ready 中（refresh()），播放时直接交给播放引擎，
+    不再经过合成线程池，也不再查询缓存、重复规范化和计算哈希。
+    配置中影响结果的设置变化后应重新创建，见 is_current()。
+    """
+
+    def __init__(self, text, config):
+        """
+        Args:
+            text (str): 原始文本。
+            config: TTS 配置对象，使用它的一份快照。
+        """
+        self.text = text
+        self.config = config.snapshot()
+        self.settings = self._settings_for(self.config)
+        self.parts = utterance_parts(normalize_text(text, self.config), self.config)
+        self.keys = [get_cache_key(part, self.config) for part in self.parts]
+        self.ready = None  # 上一次 refresh() 查到的播放来源，片段不全在缓存中时为 None
+
+    @staticmethod
+    def _settings_for(config):
+        # 按规则内容比较：重新加载出同样的规则时不必重新准备
+        return (config.FIXED_COLLOCATION, config.WORD_REPLACEMENT, config.VOICE, config.VOICE_STYLE,
+                config.SPEED, config.PITCH, config.CHUNKING, config.CHUNK_MIN_LENGTH, config.CACHE_BACKEND,
+                config.STORED_FILEPATH, config.OUTPUT_FORMAT, config.POSTPROCESS, config.SILENCE_THRESHOLD_DB,
+                config.LOUDNESS_TARGET_DB, config.LOUDNESS_MAX_GAIN_DB)
+
+    def is_current(self, config):
+        """准备结果是否仍然适用于 config。"""
+        return self.settings == self._settings_for(config)
+
+    def sources(self):
+        """
+        Returns:
+            list: 所有片段都在缓存中时返回各片段的播放来源（启用后处理且已经处理过时为 WAV），否则返回 None。
+        """
+        cache = get_audio_cache(self.config)
+        sources = []
+        for key in self.keys:
+            if key not in cache:
+                return None
+            # 处理结果可能随缓存条目一起被淘汰，每次都重新查询（只查内存中的表）
+            source = get_postprocessor(self.config).get(key) if self.config.POSTPROCESS else None
+            sources.append(source if source is not None else cache.source_for(key))
+        return sources
+
+    def refresh(self):
+        """重新查询各片段的播放来源并保存到 ready 中。会访问缓存索引，应在合成线程池中调用。"""
+        self.ready = self.sources()
+        return self.ready
+
+
+def speak_prepared(prepared, priority=SynthesisExecutor.HOTKEY, trace=None, ttl=0.0, replace=None):
+    """
+    快速路径：PreparedSpeech 已经查好播放来源（ready）时，在调用线程中直接加入播放队列，不访问缓存。
+    命中统计、使用频率记录、后处理和重新查询播放来源在合成线程池中随后完成。
+
+    Args:
+        prepared (PreparedSpeech): 预先准备好的文本。
+        priority, trace, ttl, replace: 与 text_to_speech 相同。
+
+    Returns:
+        bool: 已经加入播放队列时返回 True；还没有查好播放来源或播放引擎还没创建时返回 False，
+              调用方应改用 text_to_speech（此时会在后台重新查询，合成完成之后的按键可以走快速路径）。
+    """
+    engine = _player
+    sources = prepared.ready
+    if engine is None or sources is None:
+        get_synthesis_executor(prepared.config).submit(prepared.refresh, priority=SynthesisExecutor.PREFETCH)
+        return False
+    if trace is None:
+        trace = Trace(_TRACE_SOURCES.get(priority, str(priority)))
+    trace.lap('cache_lookup')
+    trace.attrs['cache_hit'] = True
+    trace.attrs['fast_path'] = True
+    ticket = engine.ticket(replace, ttl)
+    for index, source in enumerate(sources):
+        engine.enqueue(source, PLAYBACK_PRIORITY[priority], trace=trace if index == 0 else None, ticket=ticket)
+    get_synthesis_executor(prepared.config).submit(_record_prepared, prepared, priority=SynthesisExecutor.PREFETCH)
+    return True
+
+
+def _record_prepared(prepared):
+    """
+    快速路径播放之后的记录工作：更新缓存的访问时间和命中统计、补做后处理、记录使用频率，
+    并重新查询播放来源（条目可能已被淘汰，或者有了后处理结果）。
+    """
+    config = prepared.config
+    cache = get_audio_cache(config)
+    registry.incr('cache_hit')
+    for key in prepared.keys:
+        source = cache.get(key)
+        if source is not None and config.POSTPROCESS and get_postprocessor(config).get(key) is None:
+            get_synthesis_executor(config).submit(_postprocessed, config, key, source,
+                                                  priority=SynthesisExecutor.PREFETCH, key=f'post:{key}')
+    get_phrase_index(config).use(prepared.text)
+    prepared.refresh()
+
+
+def preload_prepared(items):
+    """
+    在后台查好 PreparedSpeech 的播放来源，并把已经在缓存中的提前解码进内存缓存。
+    播放引擎还没创建时推迟到 get_playback_engine() 创建引擎之后。
+    """
+    with _player_lock:
+        engine = _player
+        if engine is None:
+            _deferred_preload.extend(items)
+            return
+    _submit_preload(engine, items)
+
+
+def _submit_preload(engine, items):
+    if not items:
+        return
+    executor = get_synthesis_executor(items[0].config)
+    for prepared in items:
+        executor.submit(_preload_prepared, engine, prepared, priority=SynthesisExecutor.PREFETCH)
+
+
+def _preload_prepared(engine, prepared):
+    for source in prepared.refresh() or ():
+        engine.preload(source)
 
 
 # --- 清理函数 ---
 def cleanup_tts_engine():
-    """清理 TTS 引擎资源。"""
-    global _stop_playback
-    _stop_playback.set()  # 通知播放线程停止
-    # 等待播放线程结束 (可选，daemon=True 线程会随主程序结束)
-    # _playback_thread.join(timeout=2.0)
+    """
+    清理 TTS 引擎资源。之后再次使用时会重新创建。
+
+    先停止合成线程池（排队中的任务被取消），再把批量记录的缓存访问和短语统计写回并关闭。
+    """
+    global _executor, _player, _client, _cache, _phrases
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+    if _player is not None:
+        _player.stop()  # 停止播放线程
+        _player = None
     cleanup_pygame()  # 清理 pygame
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+    if _phrases is not None:
+        _phrases.close()
+        _phrases = None
@@ -0,0 +1,347 @@
+import base64
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.metrics import registry
+from lib.synthesisExecutor import SynthesisExecutor
+from lib.ttsEngine import (get_audio_cache, get_cache_key, get_key_locks, get_phrase_index, get_synthesis_executor,
+                           normalize_text, synthesize_to_cache, text_to_speech_web_api_stream, utterance_parts)
+
+PRIORITIES = {
+    'interactive': SynthesisExecutor.INTERACTIVE,
+    'hotkey': SynthesisExecutor.HOTKEY,
+    'prefetch': SynthesisExecutor.PREFETCH,
+}
+
+
+class _ChunkSink:
+    """text_to_speech_web_api_stream 的接收端，把收到的数据块转交给 HTTP 响应线程。"""
+
+    def __init__(self):
+        self._chunks = queue.Queue()
+        self.failed = False
+        self._closed = False
+
+    def feed(self, chunk):
+        self._chunks.put(chunk)
+
+    def finish(self):
+        self._closed = True
+        self._chunks.put(None)
+
+    def fail(self):
+        self.failed = True
+        self._closed = True
+        self._chunks.put(None)
+
+    def close(self):
+        """没有正常结束（例如合成中抛出了意料之外的异常）时视为失败，保证读取端不会一直等待。"""
+        if not self._closed:
+            self.fail()
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+def _stream_to_sink(part, config, key, sink):
+    """
+    在合成线程池中执行：取得缓存键的跨进程锁后流式合成，把数据交给 sink 并写入缓存。
+    其他进程已经合成好时直接把缓存的数据交给 sink。
+    """
+    try:
+        cache = get_audio_cache(config)
+        lease = get_key_locks(config).acquire(key, ready=lambda: key in cache)
+        if lease is None or cache.check(key):
+            if lease is not None:
+                lease.release()
+            data = cache.read(key)
+            if data is None:
+                sink.fail()
+            else:
+                sink.feed(data)
+                sink.finish()
+            return
+        with lease:
+            text_to_speech_web_api_stream(part, config, sink, cache.path_for(key))
+    finally:
+        sink.close()
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    # --- 路由 ---
+
+    def do_GET(self):
+        # 每个请求使用同一份配置快照
+        self.config = self.server.config.snapshot()
+        try:
+            if self.path == '/v1/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/metrics':
+                self._send_json(200, registry.snapshot())
+            elif self.path.startswith('/v1/audio/'):
+                self._get_audio(self.path[len('/v1/audio/'):])
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except _BadRequest as e:
+            self._send_json(e.status, {'error': str(e)})
+
+    def do_POST(self):
+        self.config = self.server.config.snapshot()
+        try:
+            body = self._read_json()
+            if self.path == '/v1/speech':
+                self._post_speech(body)
+            elif self.path == '/v1/batch':
+                self._post_batch(body)
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except _BadRequest as e:
+            self._send_json(e.status, {'error': str(e)})
+
+    # --- 接口 ---
+
+    def _get_audio(self, key):
+        data = get_audio_cache(self.config).read(key)
+        if data is None:
+            raise _BadRequest(404, f'no cached audio for {key}')
+        self._send_audio(data, key, True)
+
+    def _post_speech(self, body):
+        """
+        POST /v1/speech {"text": "...", "stream": false, "priority": "interactive"}
+
+        返回整段 MP3；stream 为 true 时以分块传输的方式边合成边返回。
+        """
+        config = self.config
+        start = time.perf_counter()
+        text = self._require_text(body.get('text'))
+        priority = self._priority(body, 'interactive')
+        parts = [(part, get_cache_key(part, config)) for part in utterance_parts(normalize_text(text, config), config)]
+        cache = get_audio_cache(config)
+        hit = all(key in cache for _, key in parts)
+        registry.incr('server_cache_hit' if hit else 'server_cache_miss')
+
+        if body.get('stream'):
+            self._stream_parts(parts, priority, hit)
+        else:
+            futures = [(key, self._synthesize(part, key, priority)) for part, key in parts]
+            chunks = [self._result_bytes(key, future) for key, future in futures]
+            if any(chunk is None for chunk in chunks):
+                raise _BadRequest(502, 'synthesis failed')
+            self._send_audio(b''.join(chunks), parts[0][1] if len(parts) == 1 else None, hit)
+        registry.observe('server.speech', (time.perf_counter() - start) * 1000)
+        get_phrase_index(config).use(text)
+
+    def _post_batch(self, body):
+        """
+        POST /v1/batch {"texts": ["...", ...], "include_audio": false, "priority": "interactive"}
+
+        并行合成所有文本，返回每条文本的缓存键（可用 GET /v1/audio/<key> 取回音频），
+        include_audio 为 true 时同时返回 base64 编码的音频。
+        """
+        config = self.config
+        texts = body.get('texts')
+        if not isinstance(texts, list) or not texts:
+            raise _BadRequest(400, '"texts" must be a non-empty list')
+        texts = [self._require_text(text) for text in texts]
+        priority = self._priority(body, 'interactive')
+        cache = get_audio_cache(config)
+
+        jobs = []
+        for text in texts:
+            parts = [(part, get_cache_key(part, config))
+                     for part in utterance_parts(normalize_text(text, config), config)]
+            hit = all(key in cache for _, key in parts)
+            registry.incr('server_cache_hit' if hit else 'server_cache_miss')
+            jobs.append((text, parts, hit, [(key, self._synthesize(part, key, priority)) for part, key in parts]))
+
+        results = []
+        for text, parts, hit, futures in jobs:
+            chunks = [self._result_bytes(key, future) for key, future in futures]
+            ok = all(chunk is not None for chunk in chunks)
+            result = {'text': text, 'keys': [key for _, key in parts], 'cached': hit, 'ok': ok}
+            if ok:
+                result['bytes'] = sum(len(chunk) for chunk in chunks)
+                if body.get('include_audio'):
+                    result['audio'] = base64.b64encode(b''.join(chunks)).decode('ascii')
+            results.append(result)
+        self._send_json(200, {'results': results})
+        phrases = get_phrase_index(config)
+        for text in texts:
+            phrases.use(text)
+
+    # --- 合成 ---
+
+    def _synthesize(self, part, key, priority):
+        # 经由共享线程池合成，同一缓存键的并发请求（无论来自哪个客户端）只会合成一次
+        return get_synthesis_executor(self.config).submit(
+            synthesize_to_cache, part, self.config, key, priority=priority, key=key)
+
+    def _result_bytes(self, key, future):
+        try:
+            future.result(self.server.timeout_seconds)
+        except Exception as e:
+            print(f"Synthesis failed: {e}")
+            return None
+        return get_audio_cache(self.config).read(key)
+
+    def _stream_parts(self, parts, priority, hit):
+        config = self.config
+        cache = get_audio_cache(config)
+        executor = get_synthesis_executor(config)
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        self.end_headers()
+        for part, key in parts:
+            data = cache.read(key)
+            if data is not None:
+                self._write_chunk(data)
+                continue
+            sink = _ChunkSink()
+            future, created = executor.submit_or_join(_stream_to_sink, part, config, key, sink,
+                                                      priority=priority, key=key)
+            if created:
+                # 任务在开始之前被撤回时也要让下面的循环结束
+                future.add_done_callback(lambda _future, s=sink: s.close())
+                for chunk in sink:
+                    self._write_chunk(chunk)
+                if not sink.failed:
+                    continue
+            else:
+                # 其他请求正在合成同一段语音，等它写入缓存
+                data = self._result_bytes(key, future)
+                if data is not None:
+                    self._write_chunk(data)
+                    continue
+            # 响应头已经发出，只能中断连接让客户端知道数据不完整
+            self.close_connection = True
+            return
+        self.wfile.write(b'0\r\n\r\n')
+
+    # --- 工具 ---
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 不知道请求体有多长，连接上剩下的数据无法解析
+            self.close_connection = True
+            raise _BadRequest(400, 'invalid Content-Length')
+        if length > self.server.max_request_bytes:
+            raise _BadRequest(413, 'request too large')
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise _BadRequest(400, 'invalid JSON')
+        if not isinstance(body, dict):
+            raise _BadRequest(400, 'request body must be a JSON object')
+        return body
+
+    @staticmethod
+    def _require_text(text):
+        if not isinstance(text, str) or not text.strip():
+            raise _BadRequest(400, '"text" must be a non-empty string')
+        return text
+
+    @staticmethod
+    def _priority(body, default):
+        name = body.get('priority', default)
+        if not isinstance(name, str) or name not in PRIORITIES:
+            raise _BadRequest(400, f'unknown priority: {name}')
+        return PRIORITIES[name]
+
+    def _write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+
+    def _send_audio(self, data, key, hit):
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        if key is not None:
+            self.send_header('X-Cache-Key', key)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SynthesisServer(ThreadingHTTPServer):
+    """
+    无界面的合成服务。
+
+    通过 HTTP 提供与 text_to_speech 相同的 规范化 → 缓存 → 合成 流程，但不播放，而是把 MP3 返回给客户端。
+    所有客户端共享同一个进程内的音频缓存、合成线程池和到上游的连接池：
+    任何客户端合成过的语音，其他客户端再请求时直接从缓存返回；同时请求同一段语音只会合成一次。
+
+    接口：
+        POST /v1/speech  {"text", "stream", "priority"} → audio/mpeg
+        POST /v1/batch   {"texts", "include_audio", "priority"} → JSON
+        GET  /v1/audio/<缓存键> → audio/mpeg
+        GET  /v1/health, GET /metrics → JSON
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config, host='127.0.0.1', port=8765, timeout_seconds=60.0, max_request_bytes=1024 * 1024):
+        """
+        Args:
+            config: TTS 配置对象。
+            host (str): 监听地址，局域网共享时使用 "0.0.0.0"。
+            port (int): 监听端口，0 表示随机端口。
+            timeout_seconds (float): 等待一次合成的最长时间。
+            max_request_bytes (int): 请求体大小上限。
+        """
+        super().__init__((host, port), _Handler)
+        self.config = config
+        self.timeout_seconds = timeout_seconds
+        self.max_request_bytes = max_request_bytes
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config, config.SERVER_HOST, config.SERVER_PORT)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """在后台线程中开始服务。"""
+        self._thread = threading.Thread(target=self.serve_forever, name='tts-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,56 @@
+import argparse
+
+import lib.cachePrewarmer
+import lib.configWatcher
+import lib.metrics
+import lib.phrasePrefetcher
+import lib.ttsEngine
+import lib.ttsServer
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='无界面的 TTS 合成服务')
+    parser.add_argument('--host', help='监听地址，默认使用 sound_model.json 中的 SERVER_HOST')
+    parser.add_argument('--port', type=int, help='监听端口，默认使用 sound_model.json 中的 SERVER_PORT')
+    args = parser.parse_args()
+
+    config = lib.ttsEngine.Config("./config/sound_model.json",
+                                  "./config/fixed_collocation.json",
+                                  "./config/word_replacement.json")
+    if args.host is not None:
+        config.SERVER_HOST = args.host
+    if args.port is not None:
+        config.SERVER_PORT = args.port
+    lib.metrics.registry.configure(config)
+    # 后台预先建立到 TTS 服务的连接，并预先合成所有缩写词
+    lib.ttsEngine.warm_up(config, playback=False)
+    prewarmer = lib.cachePrewarmer.CachePrewarmer(
+        config, lambda: lib.cachePrewarmer.collect_prewarm_texts(config))
+    prewarmer.attach(config)
+    prewarmer.start()
+    # 按使用频率在后台保持常用短语的缓存，更换音色后立即重新合成
+    prefetcher = None
+    if config.PREFETCH_TOP_PHRASES:
+        prefetcher = lib.phrasePrefetcher.PhrasePrefetcher.from_config(config)
+        prefetcher.attach(config)
+        prefetcher.start()
+        lib.metrics.registry.add_provider('phrase_prefetch', prefetcher.stats)
+    watcher = None
+    if config.CONFIG_WATCH:
+        watcher = lib.configWatcher.ConfigWatcher.from_config(
+            config, texts_provider=lambda: lib.cachePrewarmer.collect_prewarm_texts(config)).start()
+
+    server = lib.ttsServer.SynthesisServer.from_config(config)
+    print(f"TTS server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if watcher is not None:
+            watcher.stop()
+        prewarmer.shutdown()
+        if prefetcher is not None:
+            prefetcher.shutdown()
+        lib.metrics.registry.close()
+        lib.ttsEngine.cleanup_tts_engine()